@@ -1,6 +1,7 @@
 from eth_utils.address import is_hex_address as is_valid_eth_address
 from flask import request, jsonify
 
+from api.proposal_index import proposal_index, is_bounty_registration
 from models import db, Identity, IdentityRegistration
 from request_helpers import validate_json, recover_identity
 
@@ -133,13 +134,16 @@ def register_endpoints(app):
         record = IdentityRegistration.query.get(caller_identity)
         if record:
             record.update(payout_eth_address)
-            db.session.add(record)
         else:
-            new_record = IdentityRegistration(
+            record = IdentityRegistration(
                 caller_identity,
                 payout_eth_address
             )
-            db.session.add(new_record)
+        db.session.add(record)
 
         db.session.commit()
+        proposal_index.set_bounty_identity(
+            caller_identity,
+            is_bounty_registration(record)
+        )
         return jsonify({})
@@ -0,0 +1,41 @@
+from api import settings
+
+RANKINGS = ['hours_available', 'unique_users', 'sessions', 'data_transferred']
+
+
+# LeaderboardConfig describes one leaderboard: which nodes take part and
+# by which column they are ranked. Every leaderboard covers the current
+# month.
+class LeaderboardConfig:
+    def __init__(self, name, service_type, node_type=None, countries=None,
+                 size=1000, ranking='hours_available'):
+        if ranking not in RANKINGS:
+            raise Exception('Not supported leaderboard ranking')
+        self.name = name
+        self.service_type = service_type
+        self.node_type = node_type
+        self.countries = countries or None
+        self.size = size
+        self.ranking = ranking
+
+
+leaderboard_configs = [
+    LeaderboardConfig(**config) for config in settings.LEADERBOARDS
+]
+
+
+def get_leaderboard_config(name):
+    for config in leaderboard_configs:
+        if config.name == name:
+            return config
+    return None
+
+
+def default_leaderboard_name():
+    return leaderboard_configs[0].name if leaderboard_configs else None
+
+
+# refreshed_at_state names the dwh_leaderboard_state row holding when the
+# leaderboard was last materialized.
+def refreshed_at_state(name):
+    return 'leaderboard:{}'.format(name)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from api import settings
+from api.stats.db_queries.leaderboard import (
+    get_leaderboard_page,
+    get_leaderboard_refreshed_at
+)
+
+COLUMNS = [
+    'provider_id',
+    'service_type',
+    'country',
+    'hours_available',
+    'unique_users',
+    'sessions',
+    'data_transferred',
+    'tokens',
+]
+
+
+# parse_cursor reads a "<ranking value>:<provider id>" cursor returned as
+# next_cursor of the previous page. It raises ValueError when the cursor
+# is malformed.
+def parse_cursor(cursor):
+    value, provider_id = cursor.split(':', 1)
+    if not provider_id:
+        raise ValueError('cursor has no provider id')
+    return int(value), provider_id
+
+
+def format_cursor(value, provider_id):
+    return '{}:{}'.format(value, provider_id)
+
+
+class LeaderboardPage:
+    __slots__ = ('body', 'etag', 'refreshed_at')
+
+    def __init__(self, body, etag, refreshed_at):
+        self.body = body
+        self.etag = etag
+        self.refreshed_at = refreshed_at
+
+
+# LeaderboardResponseCache keeps encoded leaderboard pages until the
+# leaderboard worker materializes the leaderboard again. The refresh time
+# is read from db at most once per check_interval seconds per leaderboard.
+class LeaderboardResponseCache:
+    def __init__(self, load_refreshed_at, load_page, max_entries,
+                 check_interval, clock=time.monotonic):
+        self._load_refreshed_at = load_refreshed_at
+        self._load_page = load_page
+        self._max_entries = max_entries
+        self._check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._refreshed_at = {}
+
+    def refreshed_at(self, leaderboard):
+        now = self._clock()
+        with self._lock:
+            checked = self._refreshed_at.get(leaderboard)
+            if checked is not None and now < checked[1]:
+                return checked[0]
+
+        refreshed_at = self._load_refreshed_at(leaderboard)
+        with self._lock:
+            self._refreshed_at[leaderboard] = (
+                refreshed_at, now + self._check_interval
+            )
+        return refreshed_at
+
+    def get(self, config, limit, after=None):
+        refreshed_at = self.refreshed_at(config.name)
+        key = (config.name, limit, after)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refreshed_at == refreshed_at:
+                self._entries.move_to_end(key)
+                return entry
+
+        rows = self._load_page(config, limit, after)
+        entry = build_leaderboard_page(config, rows, limit, refreshed_at)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._refreshed_at.clear()
+
+
+# build_leaderboard_page encodes rows as lists in COLUMNS order. A full
+# page gets a next_cursor pointing after its last row.
+def build_leaderboard_page(config, rows, limit, refreshed_at):
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = format_cursor(last[config.ranking], last['provider_id'])
+
+    body = json.dumps({
+        'leaderboard': config.name,
+        'ranking': config.ranking,
+        'refreshed_at': refreshed_at.isoformat() if refreshed_at else None,
+        'columns': COLUMNS,
+        'rows': [[row[column] for column in COLUMNS] for row in rows],
+        'next_cursor': next_cursor,
+    }).encode('utf-8')
+    return LeaderboardPage(body, hashlib.md5(body).hexdigest(), refreshed_at)
+
+
+leaderboard_response_cache = LeaderboardResponseCache(
+    get_leaderboard_refreshed_at,
+    get_leaderboard_page,
+    settings.LEADERBOARD_RESPONSE_CACHE_SIZE,
+    settings.LEADERBOARD_RESPONSE_CHECK_INTERVAL
+)
@@ -0,0 +1,342 @@
+import datetime
+import logging
+import time
+import threading
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import sessionmaker
+
+from api import settings
+from api.leaderboard_config import leaderboard_configs, refreshed_at_state
+from models import truncate_to_hour
+
+logger = logging.getLogger('leaderboard_worker')
+
+STATE_MONTH = 'month'
+STATE_AVAILABILITY = 'availability_sealed_until'
+STATE_SESSIONS = 'sessions_updated_until'
+
+# session stats are committed a little after client_updated_at is set
+SESSIONS_UPDATE_DELAY = datetime.timedelta(minutes=1)
+SESSIONS_PROVIDERS_CHUNK = 500
+
+
+def get_month_range(now):
+    first_day = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (first_day + datetime.timedelta(days=32)).replace(day=1)
+    return first_day, next_month - datetime.timedelta(seconds=1)
+
+
+# refresh_leaderboard updates the leaderboards of the current month.
+# Availability and session stats are aggregated once per service type
+# from rows changed since the previous refresh:
+#  - ping counts of hours older than LEADERBOARD_SEAL_DELAY hours are
+#    added to dwh_leaderboard_availability once, recent hours are read on
+#    each run, so pings written late still count while they are recent,
+#  - session stats are recomputed only for providers whose sessions were
+#    updated since the previous refresh.
+# Every leaderboard is then materialized into dwh_leaderboard from those
+# aggregates and its refresh time is recorded. Watermarks are kept in
+# dwh_leaderboard_state, whose rows are locked for the refresh, so
+# concurrent refreshes run one after the other.
+def refresh_leaderboard(db_session, now=None, configs=None):
+    now = now or datetime.datetime.utcnow()
+    configs = leaderboard_configs if configs is None else configs
+    date_from, date_to = get_month_range(now)
+
+    result = {
+        'sealed_availability_rows': 0,
+        'updated_session_providers': 0,
+    }
+    service_types = sorted(set(config.service_type for config in configs))
+    states = _lock_state(db_session, service_types)
+    sealed = {}
+    for service_type in service_types:
+        params = {
+            'service_type': service_type,
+            'date_from': date_from,
+            'date_to': date_to,
+        }
+        state = states[service_type]
+        if state.get(STATE_MONTH) != date_from:
+            _reset_aggregates(db_session, params)
+            state = {
+                STATE_MONTH: date_from,
+                STATE_AVAILABILITY: date_from,
+                STATE_SESSIONS: date_from,
+            }
+
+        seal_delay = datetime.timedelta(hours=settings.LEADERBOARD_SEAL_DELAY)
+        sealed_until = max(truncate_to_hour(now) - seal_delay, date_from)
+        if state[STATE_AVAILABILITY] < sealed_until:
+            result['sealed_availability_rows'] += _seal_availability(
+                db_session, params, state[STATE_AVAILABILITY], sealed_until
+            )
+            state[STATE_AVAILABILITY] = sealed_until
+
+        providers = _updated_session_providers(
+            db_session, params, state[STATE_SESSIONS] - SESSIONS_UPDATE_DELAY
+        )
+        _refresh_session_stats(db_session, params, providers)
+        result['updated_session_providers'] += len(providers)
+        state[STATE_SESSIONS] = now
+
+        _save_state(db_session, service_type, state)
+        sealed[service_type] = state[STATE_AVAILABILITY]
+
+    for config in configs:
+        params = {
+            'leaderboard': config.name,
+            'service_type': config.service_type,
+            'date_from': date_from,
+            'date_to': date_to,
+            'sealed_until': sealed[config.service_type],
+        }
+        _refresh_nodes(db_session, config, params)
+        _refresh_leaderboard_rows(db_session, config, params)
+        db_session.execute(text("""
+            INSERT INTO dwh_leaderboard_state(name, value) VALUES (:name, :value)
+            ON DUPLICATE KEY UPDATE value = VALUES(value)
+            """), {'name': refreshed_at_state(config.name), 'value': now})
+
+    db_session.commit()
+    return result
+
+
+def _state_name(service_type, name):
+    return '{}:{}'.format(service_type, name)
+
+
+def _lock_state(db_session, service_types):
+    for service_type in service_types:
+        for name in [STATE_MONTH, STATE_AVAILABILITY, STATE_SESSIONS]:
+            db_session.execute(
+                text('INSERT IGNORE INTO dwh_leaderboard_state(name) VALUES (:name)'),
+                {'name': _state_name(service_type, name)}
+            )
+    rows = db_session.execute(text(
+        'SELECT name, value FROM dwh_leaderboard_state FOR UPDATE'
+    ))
+    values = {name: value for name, value in rows if value is not None}
+
+    states = {}
+    for service_type in service_types:
+        states[service_type] = {}
+        for name in [STATE_MONTH, STATE_AVAILABILITY, STATE_SESSIONS]:
+            value = values.get(_state_name(service_type, name))
+            if value is not None:
+                states[service_type][name] = value
+    return states
+
+
+def _save_state(db_session, service_type, state):
+    for name, value in state.items():
+        db_session.execute(
+            text('UPDATE dwh_leaderboard_state SET value = :value WHERE name = :name'),
+            {'name': _state_name(service_type, name), 'value': value}
+        )
+
+
+def _reset_aggregates(db_session, params):
+    db_session.execute(text("""
+        DELETE FROM dwh_leaderboard_availability
+        WHERE service_type = :service_type
+        """), params)
+    db_session.execute(text("""
+        DELETE FROM dwh_leaderboard_session_stats
+        WHERE service_type = :service_type
+        """), params)
+
+
+def _seal_availability(db_session, params, hour_from, hour_to):
+    result = db_session.execute(text("""
+        INSERT INTO
+            dwh_leaderboard_availability(service_type, provider_id, pings, hours_available)
+        SELECT
+            av.service_type,
+            av.node_key,
+            SUM(av.pings),
+            0
+        FROM
+            node_availability_hourly av
+        WHERE
+              av.service_type = :service_type
+          AND av.hour >= :hour_from
+          AND av.hour < :hour_to
+        GROUP BY av.node_key
+        ON DUPLICATE KEY UPDATE
+            pings = pings + VALUES(pings)
+        """), dict(params, hour_from=hour_from, hour_to=hour_to))
+    db_session.execute(text("""
+        UPDATE dwh_leaderboard_availability
+        SET hours_available = LEAST(ROUND(pings / 60), 65535)
+        WHERE service_type = :service_type
+        """), params)
+    return result.rowcount
+
+
+def _updated_session_providers(db_session, params, since):
+    rows = db_session.execute(text("""
+        SELECT DISTINCT
+            s.node_key
+        FROM
+            session s
+        WHERE
+              s.client_updated_at >= :since
+          AND s.service_type = :service_type
+          AND s.node_key IS NOT NULL
+        """), dict(params, since=since))
+    return [row[0] for row in rows]
+
+
+def _refresh_session_stats(db_session, params, providers):
+    statement = text("""
+        REPLACE INTO
+            dwh_leaderboard_session_stats(service_type, provider_id, unique_users, sessions, data_transferred)
+        SELECT
+            s.service_type,
+            s.node_key                                              AS provider_id,
+            COUNT(DISTINCT (s.consumer_id))                         AS unique_users,
+            COUNT(s.session_key)                                    AS sessions,
+            SUM(s.client_bytes_sent) + SUM(s.client_bytes_received) AS data_transferred
+        FROM
+            session s
+        WHERE
+              s.node_key IN :providers
+          AND s.client_updated_at BETWEEN :date_from AND :date_to
+          AND s.service_type = :service_type
+        GROUP BY s.node_key
+        """).bindparams(bindparam('providers', expanding=True))
+    for i in range(0, len(providers), SESSIONS_PROVIDERS_CHUNK):
+        db_session.execute(statement, dict(
+            params, providers=providers[i:i + SESSIONS_PROVIDERS_CHUNK]
+        ))
+
+
+def _refresh_nodes(db_session, config, params):
+    db_session.execute(text("""
+        DELETE FROM dwh_leaderboard_nodes
+        WHERE leaderboard = :leaderboard
+        """), params)
+
+    country = "JSON_UNQUOTE(JSON_EXTRACT(n.proposal, '$.service_definition.location.country'))"
+    filters = []
+    params = dict(params)
+    if config.node_type is not None:
+        filters.append('AND n.node_type = :node_type')
+        params['node_type'] = config.node_type
+    if config.countries is not None:
+        filters.append('AND {} IN :countries'.format(country))
+        params['countries'] = config.countries
+
+    statement = text("""
+        INSERT INTO
+            dwh_leaderboard_nodes(leaderboard, provider_id, updated_at, service_type, node_type, country)
+        SELECT
+            :leaderboard,
+            ir.identity,
+            n.updated_at,
+            n.service_type,
+            n.node_type,
+            {country}
+        FROM
+            identity_registration ir
+                INNER JOIN node n ON n.node_key = ir.identity
+        WHERE
+              n.service_type = :service_type
+          AND n.updated_at BETWEEN :date_from AND :date_to
+          {filters}
+        """.format(country=country, filters='\n          '.join(filters)))
+    if config.countries is not None:
+        statement = statement.bindparams(bindparam('countries', expanding=True))
+    db_session.execute(statement, params)
+
+
+def _refresh_leaderboard_rows(db_session, config, params):
+    db_session.execute(text("""
+        DELETE FROM dwh_leaderboard
+        WHERE leaderboard = :leaderboard
+        """), params)
+    db_session.execute(text("""
+        INSERT INTO
+            dwh_leaderboard (leaderboard,
+                             provider_id,
+                             updated_at,
+                             service_type,
+                             node_type,
+                             country,
+                             hours_available,
+                             unique_users,
+                             sessions,
+                             data_transferred)
+        SELECT
+            *
+        FROM (
+            SELECT
+                n.leaderboard,
+                n.provider_id,
+                n.updated_at,
+                n.service_type,
+                n.node_type,
+                n.country,
+                LEAST(ROUND((COALESCE(av.pings, 0) + COALESCE(recent.pings, 0)) / 60), 65535)
+                    AS hours_available,
+                COALESCE(s.unique_users, 0)     AS unique_users,
+                COALESCE(s.sessions, 0)         AS sessions,
+                COALESCE(s.data_transferred, 0) AS data_transferred
+            FROM
+                dwh_leaderboard_nodes n
+                    LEFT JOIN dwh_leaderboard_availability av
+                        ON av.service_type = n.service_type AND av.provider_id = n.provider_id
+                    LEFT JOIN (
+                        SELECT
+                            node_key,
+                            SUM(pings) AS pings
+                        FROM
+                            node_availability_hourly
+                        WHERE
+                              service_type = :service_type
+                          AND hour >= :sealed_until
+                          AND hour <= :date_to
+                        GROUP BY node_key
+                    ) recent ON recent.node_key = n.provider_id
+                    LEFT JOIN dwh_leaderboard_session_stats s
+                        ON s.service_type = n.service_type AND s.provider_id = n.provider_id
+            WHERE
+                n.leaderboard = :leaderboard
+        ) ranked
+        ORDER BY ranked.{ranking} DESC, ranked.provider_id
+        LIMIT :size
+        """.format(ranking=config.ranking)), dict(params, size=config.size))
+
+
+# process_leaderboard refreshes the leaderboards every
+# LEADERBOARD_REFRESH_INTERVAL seconds. This work happens in a separate
+# thread.
+def process_leaderboard(db_engine):
+    session_factory = sessionmaker(bind=db_engine)
+
+    while True:
+        db_session = session_factory()
+        try:
+            started = time.monotonic()
+            result = refresh_leaderboard(db_session)
+            logger.info(
+                "Refreshed leaderboards in {:.3f}s, sealed {} availability "
+                "rows, updated {} session providers".format(
+                    time.monotonic() - started,
+                    result['sealed_availability_rows'],
+                    result['updated_session_providers']
+                )
+            )
+        except Exception:
+            logger.error("Failed to refresh leaderboards:", exc_info=True)
+            db_session.rollback()
+        finally:
+            db_session.close()
+
+        time.sleep(settings.LEADERBOARD_REFRESH_INTERVAL)
+
+
+def start_leaderboard_worker(db_engine):
+    x = threading.Thread(target=process_leaderboard, args=(db_engine,), daemon=True)
+    x.start()
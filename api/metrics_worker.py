@@ -0,0 +1,34 @@
+import json
+import logging
+import time
+import threading
+
+from api import settings
+
+logger = logging.getLogger('metrics_worker')
+
+
+# log_metrics logs the stats of every (name, stats) reporter as JSON.
+def log_metrics(reporters):
+    for name, stats in reporters:
+        try:
+            logger.info("{}: {}".format(
+                name, json.dumps(stats(), sort_keys=True)
+            ))
+        except Exception:
+            logger.error("Failed to collect {}:".format(name), exc_info=True)
+
+
+# process_metrics logs metrics each METRICS_LOG_INTERVAL seconds. This
+# work happens in a separate thread.
+def process_metrics(reporters):
+    while True:
+        time.sleep(settings.METRICS_LOG_INTERVAL)
+        log_metrics(reporters)
+
+
+def start_metrics_worker(reporters):
+    if settings.METRICS_LOG_INTERVAL <= 0:
+        return
+    x = threading.Thread(target=process_metrics, args=(reporters,), daemon=True)
+    x.start()
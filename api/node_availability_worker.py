@@ -1,39 +1,318 @@
+import json
+import os
 import threading
+import time
 import queue
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.orm import sessionmaker
 import logging
 
+from api import settings
+from models import NodeAvailability, NodeAvailabilityHourly, truncate_to_hour
+
 logger = logging.getLogger('node_availability_worker')
-node_availability_queue = queue.Queue()
+
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_SPILL = 'spill'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+# NodeAvailabilityQueue is a bounded queue which never blocks a request
+# for long. When it is full, depending on overflow_policy, it drops the
+# oldest queued item, waits up to block_timeout seconds before dropping
+# the new one, or appends the new one to the spill_path file. Spilled
+# items are written to db once the queue has drained.
+class NodeAvailabilityQueue(queue.Queue):
+    def __init__(self, maxsize, overflow_policy=OVERFLOW_DROP_OLDEST,
+                 block_timeout=0.05, spill_path=None):
+        super().__init__(maxsize)
+        if overflow_policy == OVERFLOW_SPILL and not spill_path:
+            raise Exception('spill overflow policy requires a spill path')
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.dropped = 0
+        self.spilled = 0
+        self._spill_lock = threading.Lock()
+
+    def put(self, item, block=True, timeout=None):
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            try:
+                super().put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+            return
+
+        while True:
+            try:
+                super().put(item, block=False)
+                return
+            except queue.Full:
+                if self.overflow_policy == OVERFLOW_SPILL:
+                    self._spill(item)
+                    return
+            try:
+                self.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def _spill(self, item):
+        with self._spill_lock:
+            with open(self.spill_path, 'a') as f:
+                f.write(_spill_line(item))
+            self.spilled += 1
+
+    def write_spilled(self, path, items):
+        with open(path, 'w') as f:
+            for item in items:
+                f.write(_spill_line(item))
+
+    # take_spilled returns spilled items and the file holding them, which
+    # the caller removes once the items are stored.
+    def take_spilled(self):
+        if not self.spill_path:
+            return [], None
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return [], None
+                os.rename(self.spill_path, replay_path)
+
+        items = []
+        with open(replay_path) as f:
+            for line in f:
+                data = json.loads(line)
+                item = NodeAvailability(data['node_key'])
+                item.service_type = data['service_type']
+                item.date = datetime.strptime(data['date'], DATE_FORMAT)
+                items.append(item)
+        return items, replay_path
+
+
+def _spill_line(item):
+    return json.dumps({
+        'node_key': item.node_key,
+        'service_type': item.service_type,
+        'date': item.date.strftime(DATE_FORMAT),
+    }) + '\n'
+
+
+node_availability_queue = NodeAvailabilityQueue(
+    settings.NODE_AVAILABILITY_QUEUE_SIZE,
+    settings.NODE_AVAILABILITY_OVERFLOW_POLICY,
+    settings.NODE_AVAILABILITY_BLOCK_TIMEOUT,
+    settings.NODE_AVAILABILITY_SPILL_PATH
+)
 node_availability_batch_size = 20
+node_availability_stop = threading.Event()
+node_availability_stopped = threading.Event()
+
+
+# AdaptiveBatchSize grows the batch size while commits stay well under
+# target_seconds and shrinks it when they take longer.
+class AdaptiveBatchSize:
+    def __init__(self, initial, minimum, maximum, target_seconds):
+        self.value = initial
+        self._minimum = minimum
+        self._maximum = maximum
+        self._target_seconds = target_seconds
+
+    def update(self, batch_length, commit_seconds):
+        if commit_seconds > self._target_seconds:
+            self.value = max(self._minimum, self.value // 2)
+        elif commit_seconds < self._target_seconds / 2 and \
+                batch_length >= self.value:
+            self.value = min(self._maximum, self.value * 2)
+
+
+# NodeAvailabilityStats reports how the availability worker keeps up.
+class NodeAvailabilityStats:
+    def __init__(self, availabilities_queue):
+        self._queue = availabilities_queue
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.failures = 0
+        self.rows = 0
+        self.batch_size = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def record_flush(self, rows, seconds, batch_size, failed=False):
+        with self._lock:
+            self.flushes += 1
+            if failed:
+                self.failures += 1
+            else:
+                self.rows += rows
+            self.batch_size = batch_size
+            self.last_flush_rows = rows
+            self.last_flush_seconds = seconds
+            self.max_flush_seconds = max(self.max_flush_seconds, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'dropped': self._queue.dropped,
+                'spilled': self._queue.spilled,
+                'flushes': self.flushes,
+                'failures': self.failures,
+                'rows': self.rows,
+                'batch_size': self.batch_size,
+                'last_flush_rows': self.last_flush_rows,
+                'last_flush_seconds': self.last_flush_seconds,
+                'max_flush_seconds': self.max_flush_seconds,
+            }
+
+
+node_availability_stats = NodeAvailabilityStats(node_availability_queue)
+
+
+# insert_node_availabilities adds a batch of pings to the hourly ping
+# counts with one multi-row INSERT ... ON DUPLICATE KEY UPDATE.
+def insert_node_availabilities(db_session, batch):
+    counts = Counter(
+        (item.node_key, item.service_type, truncate_to_hour(item.date))
+        for item in batch
+    )
+    table = NodeAvailabilityHourly.__table__
+    statement = insert(table).values([
+        {
+            'node_key': node_key,
+            'service_type': service_type,
+            'hour': hour,
+            'pings': pings,
+        }
+        for (node_key, service_type, hour), pings in counts.items()
+    ])
+    statement = statement.on_duplicate_key_update(
+        pings=table.c.pings + statement.inserted.pings
+    )
+    db_session.execute(statement)
+    db_session.commit()
 
 
 # process_node_availabilities processes node availability data
-# in batches and inserts to db. This work happens in a separate thread.
-def process_node_availabilities(db_engine, availabilities_queue):
+# in batches and inserts to db. A batch is written once it is full or
+# once its oldest item waited flush_interval seconds. When stop is set
+# the queue is drained and the worker exits. This work happens in a
+# separate thread.
+def process_node_availabilities(db_engine, availabilities_queue,
+                                flush_interval=None, batch_size=None,
+                                stats=None, stop=None, stopped=None):
     session_factory = sessionmaker(bind=db_engine)
+    if flush_interval is None:
+        flush_interval = settings.NODE_AVAILABILITY_FLUSH_INTERVAL
+    if batch_size is None:
+        batch_size = AdaptiveBatchSize(
+            node_availability_batch_size,
+            node_availability_batch_size,
+            settings.NODE_AVAILABILITY_MAX_BATCH_SIZE,
+            settings.NODE_AVAILABILITY_TARGET_COMMIT_SECONDS
+        )
+    if stats is None:
+        stats = node_availability_stats
+    if stop is None:
+        stop = node_availability_stop
+    if stopped is None:
+        stopped = node_availability_stopped
 
     batch = []
-    db_session = None
+    deadline = None
     while True:
+        stopping = stop.is_set()
+        if stopping:
+            timeout = 0
+        elif deadline is None:
+            # wake up now and then to notice a stop request
+            timeout = 0.5
+        else:
+            timeout = max(deadline - time.monotonic(), 0)
         try:
-            item = availabilities_queue.get()
-            batch.append(item)
-            if len(batch) >= node_availability_batch_size:
-                db_session = session_factory()
-                db_session.bulk_save_objects(batch)
-                db_session.commit()
-                batch = []
-                logger.info("Committed node availability batch")
-        except Exception:
-            logger.error("Failed to process node availabilities:", exc_info=True)
-            if db_session is not None:
-                db_session.rollback()
-        finally:
-            if db_session is not None:
-                db_session.close()
+            batch.append(availabilities_queue.get(timeout=timeout))
+            if deadline is None:
+                deadline = time.monotonic() + flush_interval
+        except queue.Empty:
+            if stopping:
+                if batch:
+                    _flush(session_factory, batch, batch_size, stats,
+                           availabilities_queue)
+                stopped.set()
+                return
+            if deadline is None:
+                continue
+
+        # while draining, batches are filled from the queue without waiting
+        if len(batch) < batch_size.value and \
+                (stopping or time.monotonic() < deadline):
+            continue
+
+        if _flush(session_factory, batch, batch_size, stats,
+                  availabilities_queue) and not stopping and \
+                availabilities_queue.empty():
+            _replay_spilled(session_factory, batch_size, stats,
+                            availabilities_queue)
+        batch = []
+        deadline = None
+
+
+def _flush(session_factory, batch, batch_size, stats, availabilities_queue):
+    db_session = session_factory()
+    started = time.monotonic()
+    failed = False
+    try:
+        insert_node_availabilities(db_session, batch)
+    except Exception:
+        failed = True
+        logger.error("Failed to process node availabilities:", exc_info=True)
+        db_session.rollback()
+    finally:
+        db_session.close()
+
+    elapsed = time.monotonic() - started
+    if not failed:
+        batch_size.update(len(batch), elapsed)
+        logger.info(
+            "Committed {} node availabilities in {:.3f}s, {} queued".format(
+                len(batch), elapsed, availabilities_queue.qsize()
+            )
+        )
+    stats.record_flush(len(batch), elapsed, batch_size.value, failed)
+    return not failed
+
+
+def _replay_spilled(session_factory, batch_size, stats, availabilities_queue):
+    if not isinstance(availabilities_queue, NodeAvailabilityQueue):
+        return
+    items, path = availabilities_queue.take_spilled()
+    if not items:
+        return
+    for i in range(0, len(items), batch_size.value):
+        if not _flush(session_factory, items[i:i + batch_size.value],
+                      batch_size, stats, availabilities_queue):
+            # keep what is left, it is replayed again after the next flush
+            availabilities_queue.write_spilled(path, items[i:])
+            return
+    os.remove(path)
+    logger.info("Replayed {} spilled node availabilities".format(len(items)))
 
 
 def start_node_availability_worker(db_engine, availabilities_queue):
     x = threading.Thread(target=process_node_availabilities, args=(db_engine, availabilities_queue), daemon=True)
     x.start()
+
+
+# stop_node_availability_worker asks the worker to write everything that
+# is queued and waits up to timeout seconds for it to finish.
+def stop_node_availability_worker(timeout):
+    node_availability_stop.set()
+    if not node_availability_stopped.wait(timeout):
+        logger.error("Node availability worker did not drain in time")
+        return False
+    return True
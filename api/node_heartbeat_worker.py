@@ -0,0 +1,127 @@
+import threading
+import time
+import logging
+from datetime import datetime
+from sqlalchemy import and_, or_, case
+from sqlalchemy.orm import sessionmaker
+
+from api import settings
+from models import Node, AVAILABILITY_TIMEOUT
+
+logger = logging.getLogger('node_heartbeat_worker')
+
+
+# HeartbeatBuffer keeps the last time each node pinged until the heartbeat
+# worker writes it to node.updated_at. Repeated pings of a node between
+# two flushes end up as a single row update.
+#
+# Unregistered nodes leave a tombstone, so heartbeats seen before the node
+# unregistered are not written over its inactive state. A flush holds
+# flush_lock from checking tombstones until it commits, which makes
+# unregistering wait for a flush of heartbeats drained before it.
+class HeartbeatBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._unregistered = {}
+        self.flush_lock = threading.Lock()
+        self.started = False
+
+    def record(self, node_key, service_type, seen_at):
+        with self._lock:
+            self._last_seen[(node_key, service_type)] = seen_at
+
+    def discard(self, node_key, service_type, unregistered_at):
+        with self.flush_lock, self._lock:
+            self._last_seen.pop((node_key, service_type), None)
+            self._unregistered[(node_key, service_type)] = unregistered_at
+
+    # drop_unregistered removes heartbeats seen before their node was
+    # unregistered. Tombstones older than AVAILABILITY_TIMEOUT are dropped
+    # too, such heartbeats can not make a node active anymore.
+    def drop_unregistered(self, heartbeats, now):
+        with self._lock:
+            for key, unregistered_at in list(self._unregistered.items()):
+                if key in heartbeats and heartbeats[key] <= unregistered_at:
+                    del heartbeats[key]
+                if unregistered_at < now - AVAILABILITY_TIMEOUT:
+                    del self._unregistered[key]
+
+    def drain(self):
+        with self._lock:
+            last_seen = self._last_seen
+            self._last_seen = {}
+        return last_seen
+
+    def __len__(self):
+        return len(self._last_seen)
+
+
+node_heartbeats = HeartbeatBuffer()
+
+
+# flush_heartbeats writes buffered heartbeats with one UPDATE statement
+# per batch_size nodes. A heartbeat never moves updated_at backwards, so
+# a newer registration or an older flush can not be overwritten.
+def flush_heartbeats(db_session, heartbeats, batch_size):
+    items = sorted(heartbeats.items())
+    for i in range(0, len(items), batch_size):
+        whens = []
+        conditions = []
+        for (node_key, service_type), seen_at in items[i:i + batch_size]:
+            condition = and_(
+                Node.node_key == node_key,
+                Node.service_type == service_type,
+                or_(Node.updated_at.is_(None), Node.updated_at < seen_at)
+            )
+            whens.append((condition, seen_at))
+            conditions.append(condition)
+
+        db_session.execute(
+            Node.__table__.update()
+            .where(or_(*conditions))
+            .values(updated_at=case(whens, else_=Node.updated_at))
+        )
+    db_session.commit()
+
+
+# process_node_heartbeats flushes buffered heartbeats to db every
+# flush_interval seconds. This work happens in a separate thread.
+# Heartbeats of a failed flush are dropped, nodes ping again within a
+# minute which is well inside AVAILABILITY_TIMEOUT.
+def process_node_heartbeats(db_engine, heartbeats, flush_interval, batch_size):
+    session_factory = sessionmaker(bind=db_engine)
+
+    while True:
+        time.sleep(flush_interval)
+
+        pending = heartbeats.drain()
+        if not pending:
+            continue
+
+        db_session = session_factory()
+        try:
+            with heartbeats.flush_lock:
+                heartbeats.drop_unregistered(pending, datetime.utcnow())
+                flush_heartbeats(db_session, pending, batch_size)
+            logger.info("Committed {} node heartbeats".format(len(pending)))
+        except Exception:
+            logger.error("Failed to flush node heartbeats:", exc_info=True)
+            db_session.rollback()
+        finally:
+            db_session.close()
+
+
+def start_node_heartbeat_worker(db_engine, heartbeats):
+    heartbeats.started = True
+    x = threading.Thread(
+        target=process_node_heartbeats,
+        args=(
+            db_engine,
+            heartbeats,
+            settings.HEARTBEAT_FLUSH_INTERVAL,
+            settings.HEARTBEAT_FLUSH_BATCH_SIZE
+        ),
+        daemon=True
+    )
+    x.start()
@@ -3,6 +3,7 @@ import json
 import logging
 import time
 import threading
+from api.proposal_index import proposal_index
 from models import MonitoringFailed
 from sqlalchemy.orm import sessionmaker
 from prometheus_http_client import Prometheus
@@ -24,10 +25,13 @@ def process_node_monitoring(db_engine):
 
             data = json.loads(prometheus.query(metric='ALERTS{alertname="provider_down", alertstate="firing"}'))
             db_session.query(MonitoringFailed).delete()
+            failed = []
             for r in data["data"]["result"]:
-                db_session.add(MonitoringFailed(r["metric"]["provider"], r["metric"]["service_type"]))
+                failed.append((r["metric"]["provider"], r["metric"]["service_type"]))
+                db_session.add(MonitoringFailed(*failed[-1]))
 
             db_session.commit()
+            proposal_index.set_monitoring_failed(failed)
             logger.info("Committed node monitoring batch")
         except Exception:
             logger.error("Failed to process node monitoring status:", exc_info=True)
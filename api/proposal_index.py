@@ -0,0 +1,534 @@
+import logging
+import threading
+import uuid
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from api import settings
+from models import (
+    Node, ProposalAccessPolicy, IdentityRegistration, MonitoringFailed,
+    AVAILABILITY_TIMEOUT
+)
+
+logger = logging.getLogger('proposal_index')
+
+CHANGE_ADDED = 'added'
+CHANGE_UPDATED = 'updated'
+CHANGE_REMOVED = 'removed'
+
+# how often expire_stale prunes long inactive proposals
+PRUNE_INTERVAL = timedelta(minutes=1)
+
+ProposalChange = namedtuple('ProposalChange', [
+    'version', 'kind', 'node_key', 'service_type'
+])
+
+
+class IndexedProposal:
+    __slots__ = (
+        'node_key', 'service_type', 'node_type', 'updated_at', 'proposals'
+    )
+
+    def __init__(self, node_key, service_type, node_type, updated_at,
+                 proposals):
+        self.node_key = node_key
+        self.service_type = service_type
+        self.node_type = node_type
+        self.updated_at = updated_at
+        self.proposals = proposals
+
+    @property
+    def key(self):
+        return index_key(self.node_key, self.service_type)
+
+    def is_active(self, now):
+        if self.updated_at is None:
+            return False
+        return now - self.updated_at < AVAILABILITY_TIMEOUT
+
+
+# ProposalIndex is a process-local copy of the active proposal set.
+# It mirrors what the filter_* functions in queries.py select from MySQL,
+# so GET /v1/proposals can be answered without a database round trip.
+# Writes of this process are applied as they happen, those of other server
+# processes every PROPOSALS_SYNC_INTERVAL seconds by proposal_index_worker.
+#
+# Every change that can alter a query result bumps a generation counter:
+# the per service type one for proposal changes, the shared one for access
+# policy, bounty and monitoring changes which span service types.
+#
+# Proposals which are active and not failing monitoring are "visible".
+# Every visibility or content change is appended to a bounded change log
+# under the monotonically increasing index version, which is what the
+# delta feed is served from.
+class ProposalIndex:
+    def __init__(self, change_log_size=10000):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._proposals = {}
+        self._by_service_type = {}
+        self._access_policies = {}
+        self._bounty_identities = set()
+        self._monitoring_failed = set()
+        self._epoch = uuid.uuid4().hex[:12]
+        self._version = 0
+        self._shared_version = 0
+        self._service_versions = {}
+        self._visible = set()
+        self._changes = deque(maxlen=change_log_size)
+        self._changes_floor = 0
+        self._listeners = []
+        self._pruned_at = datetime.utcnow()
+
+    def is_loaded(self):
+        return self._loaded
+
+    def version(self):
+        return self._version
+
+    # version_token returns a version as "<epoch>-<version>" for clients.
+    # The epoch is new for every index, so a version handed out by another
+    # process or before a restart is not taken for one of this index.
+    def version_token(self, version=None):
+        if version is None:
+            version = self._version
+        return '{}-{}'.format(self._epoch, version)
+
+    # parse_version returns the version of a version_token, or None when
+    # the token is of another epoch. It raises ValueError when the token
+    # is malformed.
+    def parse_version(self, token):
+        epoch, version = token.split('-', 1)
+        version = int(version)
+        if epoch != self._epoch:
+            return None
+        return version
+
+    # add_listener registers a callable which is invoked, with the index
+    # lock held, whenever a change is recorded. It must not block.
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def generation(self, service_type):
+        with self._lock:
+            if service_type == 'all':
+                return self._version
+            return (
+                self._shared_version,
+                self._service_versions.get(service_type, 0)
+            )
+
+    def load(self, nodes, access_policies, bounty_identities,
+             monitoring_failed):
+        with self._lock:
+            self._proposals = {}
+            self._by_service_type = {}
+            self._access_policies = {}
+            for node in nodes:
+                self._put(_index_node(node))
+            self._access_policies = _policies_by_node(access_policies)
+            self._bounty_identities = {i.lower() for i in bounty_identities}
+            self._monitoring_failed = {
+                index_key(provider_id, service_type)
+                for provider_id, service_type in monitoring_failed
+            }
+            now = datetime.utcnow()
+            self._visible = {
+                k for k in self._proposals if self._is_visible(k, now)
+            }
+            self._loaded = True
+            self._reset_changes()
+
+    # sync applies what other processes wrote to db since the last sync:
+    # nodes updated since then, and the access policies, bounty identities
+    # and monitoring failures read whole as for load. Proposals visible
+    # here which are not among the active_keys of db were unregistered
+    # elsewhere, unless this process refreshed them after synced_from.
+    # Only what differs from the index is recorded as a change.
+    def sync(self, nodes, active_keys, access_policies, bounty_identities,
+             monitoring_failed, synced_from):
+        with self._lock:
+            for node in nodes:
+                self.put_node(node)
+
+            active_keys = {
+                index_key(node_key, service_type)
+                for node_key, service_type in active_keys
+            }
+            inactive_at = synced_from - AVAILABILITY_TIMEOUT - \
+                timedelta(seconds=1)
+            for key in list(self._visible):
+                indexed = self._proposals[key]
+                if key not in active_keys and \
+                        indexed.updated_at < synced_from:
+                    self.touch(
+                        indexed.node_key, indexed.service_type, inactive_at
+                    )
+
+            access_policies = _policies_by_node(access_policies)
+            if access_policies != self._access_policies:
+                self._access_policies = access_policies
+                self._changed()
+            bounty_identities = {i.lower() for i in bounty_identities}
+            if bounty_identities != self._bounty_identities:
+                self._bounty_identities = bounty_identities
+                self._changed()
+            self.set_monitoring_failed(monitoring_failed)
+
+    def clear(self):
+        with self._lock:
+            self._proposals = {}
+            self._by_service_type = {}
+            self._access_policies = {}
+            self._bounty_identities = set()
+            self._monitoring_failed = set()
+            self._visible = set()
+            self._loaded = False
+            self._reset_changes()
+
+    # put_node indexes a registered node. When its node type and proposals
+    # are what is indexed already, only updated_at is moved forward like
+    # touch does, so re-registering keeps cached responses.
+    def put_node(self, node, access_policies=None):
+        indexed = _index_node(node)
+        with self._lock:
+            current = self._proposals.get(indexed.key)
+            if current is not None and \
+                    current.node_type == indexed.node_type and \
+                    current.proposals == indexed.proposals:
+                if indexed.updated_at is not None and (
+                        current.updated_at is None or
+                        current.updated_at < indexed.updated_at):
+                    self.touch(
+                        node.node_key, node.service_type, indexed.updated_at
+                    )
+            else:
+                self._put(indexed)
+                self._changed(indexed.service_type)
+                self._sync_visibility(
+                    indexed.key, datetime.utcnow(), content_changed=True
+                )
+            if access_policies is None:
+                return
+            policies = set(access_policies)
+            node_key = indexed.key[0]
+            if self._access_policies.get(node_key, set()) != policies:
+                self._access_policies[node_key] = policies
+                self._changed()
+
+    def touch(self, node_key, service_type, updated_at):
+        now = datetime.utcnow()
+        with self._lock:
+            indexed = self._proposals.get(index_key(node_key, service_type))
+            if indexed is None:
+                return False
+            was_active = indexed.is_active(now)
+            indexed.updated_at = updated_at
+            if indexed.is_active(now) != was_active:
+                self._changed(service_type)
+                self._sync_visibility(indexed.key, now)
+            return True
+
+    def contains(self, node_key, service_type):
+        return index_key(node_key, service_type) in self._proposals
+
+    def set_bounty_identity(self, identity, in_bounty_programme):
+        identity = identity.lower()
+        with self._lock:
+            if in_bounty_programme == (identity in self._bounty_identities):
+                return
+            if in_bounty_programme:
+                self._bounty_identities.add(identity)
+            else:
+                self._bounty_identities.discard(identity)
+            self._changed()
+
+    def set_monitoring_failed(self, failed):
+        failed = {
+            index_key(provider_id, service_type)
+            for provider_id, service_type in failed
+        }
+        with self._lock:
+            if failed == self._monitoring_failed:
+                return
+            flipped = failed ^ self._monitoring_failed
+            self._monitoring_failed = failed
+            self._changed()
+            now = datetime.utcnow()
+            for key in flipped:
+                if key in self._proposals:
+                    self._sync_visibility(key, now)
+
+    # expire_stale records removals for proposals which ran out of
+    # AVAILABILITY_TIMEOUT since the last sweep.
+    # Once every PRUNE_INTERVAL it also prunes long inactive proposals.
+    def expire_stale(self):
+        now = datetime.utcnow()
+        with self._lock:
+            for key in list(self._visible):
+                if not self._proposals[key].is_active(now):
+                    self._changed(key[1])
+                    self._sync_visibility(key, now)
+            if now - self._pruned_at >= PRUNE_INTERVAL:
+                self.prune(now)
+
+    # prune drops proposals inactive for more than PROPOSALS_PRUNE_AFTER
+    # hours, so nodes which went away do not stay in memory for good.
+    # Their removal was recorded when they became invisible, proposals
+    # still referenced by the change log are kept until it moves on.
+    def prune(self, now):
+        horizon = now - timedelta(hours=settings.PROPOSALS_PRUNE_AFTER)
+        with self._lock:
+            self._pruned_at = now
+            logged = {
+                index_key(change.node_key, change.service_type)
+                for change in self._changes
+            }
+            for key, indexed in list(self._proposals.items()):
+                if key in self._visible or key in logged:
+                    continue
+                if indexed.updated_at is not None and \
+                        indexed.updated_at >= horizon:
+                    continue
+                del self._proposals[key]
+                self._by_service_type[key[1]].discard(key)
+
+    # changes_since returns the current version and the net changes of
+    # visible proposals after the given version, as (kind, IndexedProposal)
+    # pairs. Changes are None when the version is no longer in the log.
+    def changes_since(self, since, service_type='all'):
+        self.expire_stale()
+        with self._lock:
+            if since < self._changes_floor or since > self._version:
+                return self._version, None
+
+            first_kinds = {}
+            last_kinds = {}
+            for change in self._changes:
+                if change.version <= since:
+                    continue
+                if service_type != 'all' and \
+                        change.service_type != service_type:
+                    continue
+                key = index_key(change.node_key, change.service_type)
+                first_kinds.setdefault(key, change.kind)
+                last_kinds[key] = change.kind
+
+            changes = []
+            for key, kind in last_kinds.items():
+                seen_before = first_kinds[key] != CHANGE_ADDED
+                if kind == CHANGE_REMOVED:
+                    if seen_before:
+                        changes.append((CHANGE_REMOVED, self._proposals[key]))
+                elif seen_before:
+                    changes.append((CHANGE_UPDATED, self._proposals[key]))
+                else:
+                    changes.append((CHANGE_ADDED, self._proposals[key]))
+
+            return self._version, changes
+
+    def find(self, service_type='openvpn', node_key=None,
+             access_policy=None, bounty_only=False, node_type=None,
+             include_failed=False):
+        # access_policy is '*' to skip policy filtering, a tuple of
+        # (id, source) to require a matching policy, or None to only
+        # return proposals without access policies.
+        now = datetime.utcnow()
+        with self._lock:
+            if service_type == 'all':
+                candidates = self._proposals.values()
+            else:
+                keys = self._by_service_type.get(service_type, ())
+                candidates = [self._proposals[k] for k in keys]
+
+            matched = [
+                p for p in candidates
+                if p.is_active(now) and self._matches(
+                    p, node_key, access_policy, bounty_only, node_type,
+                    include_failed
+                )
+            ]
+
+        matched.sort(key=lambda p: p.key)
+        return matched
+
+    def _matches(self, indexed, node_key, access_policy, bounty_only,
+                 node_type, include_failed):
+        if node_key and indexed.key[0] != node_key.lower():
+            return False
+
+        if access_policy != '*':
+            policies = self._access_policies.get(indexed.key[0])
+            if access_policy is None:
+                if policies:
+                    return False
+            elif not _has_policy(policies, *access_policy):
+                return False
+
+        if bounty_only and indexed.key[0] not in self._bounty_identities:
+            return False
+
+        if node_type and indexed.node_type != node_type:
+            return False
+
+        if not include_failed and indexed.key in self._monitoring_failed:
+            return False
+
+        return True
+
+    def _is_visible(self, key, now):
+        return self._proposals[key].is_active(now) and \
+            key not in self._monitoring_failed
+
+    def _sync_visibility(self, key, now, content_changed=False):
+        visible = self._is_visible(key, now)
+        if visible and key not in self._visible:
+            self._visible.add(key)
+            self._record(CHANGE_ADDED, key)
+        elif not visible and key in self._visible:
+            self._visible.discard(key)
+            self._record(CHANGE_REMOVED, key)
+        elif visible and content_changed:
+            self._record(CHANGE_UPDATED, key)
+
+    def _record(self, kind, key):
+        indexed = self._proposals[key]
+        if len(self._changes) == self._changes.maxlen:
+            self._changes_floor = self._changes[0].version
+        self._changes.append(ProposalChange(
+            self._version, kind, indexed.node_key, indexed.service_type
+        ))
+        self._notify()
+
+    def _reset_changes(self):
+        self._changed()
+        self._changes.clear()
+        self._changes_floor = self._version
+        self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception:
+                logger.error("Proposal index listener failed:", exc_info=True)
+
+    def _changed(self, service_type=None):
+        self._version += 1
+        if service_type is None:
+            self._shared_version = self._version
+        else:
+            self._service_versions[service_type] = self._version
+
+    def _put(self, indexed):
+        self._proposals[indexed.key] = indexed
+        self._by_service_type.setdefault(
+            indexed.service_type, set()
+        ).add(indexed.key)
+
+
+# MySQL compares identities case-insensitively, so the index does too.
+def index_key(node_key, service_type):
+    return node_key.lower(), service_type
+
+
+def _has_policy(policies, policy_id, source):
+    if not policies:
+        return False
+    for p_id, p_source in policies:
+        if policy_id and p_id != policy_id:
+            continue
+        if source and p_source != source:
+            continue
+        return True
+    return False
+
+
+def _policies_by_node(access_policies):
+    policies = {}
+    for node_key, policy_id, source in access_policies:
+        policies.setdefault(node_key.lower(), set()).add((policy_id, source))
+    return policies
+
+
+def _index_node(node):
+    return IndexedProposal(
+        node.node_key,
+        node.service_type,
+        node.node_type,
+        node.updated_at,
+        node.get_service_proposals(),
+    )
+
+
+def is_bounty_registration(registration):
+    return bool(registration.payout_eth_address)
+
+
+proposal_index = ProposalIndex(settings.PROPOSALS_CHANGE_LOG_SIZE)
+
+
+# load_proposal_index fills the index with nodes that are currently active.
+# Inactive nodes are added back by register_proposal or ping_proposal.
+# It returns the time to sync the index from with sync_proposal_index.
+def load_proposal_index(db_engine, index=proposal_index):
+    session_factory = sessionmaker(bind=db_engine)
+    db_session = session_factory()
+    try:
+        loaded_from = datetime.utcnow()
+        nodes = db_session.query(Node).filter(
+            Node.updated_at >= loaded_from - AVAILABILITY_TIMEOUT
+        ).all()
+        index.load(nodes, *_query_shared_state(db_session))
+        logger.info("Loaded {} proposals into index".format(len(nodes)))
+        return loaded_from
+    finally:
+        db_session.close()
+
+
+# sync_proposal_index brings the index up to date with what other
+# processes wrote since synced_from. It returns the time to sync from next.
+def sync_proposal_index(db_engine, synced_from, index=proposal_index):
+    session_factory = sessionmaker(bind=db_engine)
+    db_session = session_factory()
+    try:
+        # rows are committed a while after their updated_at is set, so one
+        # more interval is read again; nodes which did not change are skipped
+        next_from = datetime.utcnow()
+        overlap = timedelta(seconds=settings.PROPOSALS_SYNC_INTERVAL)
+        nodes = db_session.query(Node).filter(
+            Node.updated_at > synced_from - overlap
+        ).all()
+        active_keys = db_session.query(Node.node_key, Node.service_type).filter(
+            Node.updated_at >= next_from - AVAILABILITY_TIMEOUT
+        ).all()
+        index.sync(
+            nodes, active_keys, *_query_shared_state(db_session),
+            synced_from=next_from
+        )
+        return next_from
+    finally:
+        db_session.close()
+
+
+def _query_shared_state(db_session):
+    access_policies = db_session.query(
+        ProposalAccessPolicy.node_key,
+        ProposalAccessPolicy.id,
+        ProposalAccessPolicy.source
+    ).all()
+    bounty_identities = db_session.query(
+        IdentityRegistration.identity
+    ).filter(IdentityRegistration.payout_eth_address != "").all()
+    monitoring_failed = db_session.query(
+        MonitoringFailed.provider_id,
+        MonitoringFailed.service_type
+    ).all()
+    return (
+        access_policies,
+        [r.identity for r in bounty_identities],
+        monitoring_failed
+    )
@@ -0,0 +1,31 @@
+import logging
+import time
+import threading
+
+from api import settings
+from api.proposal_index import sync_proposal_index, proposal_index
+
+logger = logging.getLogger('proposal_index_worker')
+
+
+# process_proposal_index_sync keeps the proposal index of this process up
+# to date with what other server processes write to db, each
+# PROPOSALS_SYNC_INTERVAL seconds. This work happens in a separate thread.
+def process_proposal_index_sync(db_engine, synced_from, index):
+    while True:
+        time.sleep(settings.PROPOSALS_SYNC_INTERVAL)
+        try:
+            synced_from = sync_proposal_index(db_engine, synced_from, index)
+        except Exception:
+            logger.error("Failed to sync proposal index:", exc_info=True)
+
+
+def start_proposal_index_worker(db_engine, synced_from, index=proposal_index):
+    if settings.PROPOSALS_SYNC_INTERVAL <= 0:
+        return
+    x = threading.Thread(
+        target=process_proposal_index_sync,
+        args=(db_engine, synced_from, index),
+        daemon=True
+    )
+    x.start()
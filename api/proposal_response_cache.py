@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+
+from api import settings
+from api.proposal_index import proposal_index
+from models import AVAILABILITY_TIMEOUT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_COMPRESS_LEVEL = 6
+BROTLI_QUALITY = 5
+
+ProposalQuery = namedtuple('ProposalQuery', [
+    'service_type',
+    'node_key',
+    'access_policy',
+    'bounty_only',
+    'node_type',
+    'include_failed',
+])
+
+
+def parse_proposal_query(args):
+    access_policy = None
+    if args.get('access_policy') == '*':
+        access_policy = '*'
+    else:
+        id = args.get('access_policy[id]')
+        source = args.get('access_policy[source]')
+        if id or source:
+            access_policy = (id, source)
+
+    node_key = args.get('node_key')
+    return ProposalQuery(
+        service_type=args.get('service_type', 'openvpn'),
+        node_key=node_key.lower() if node_key else None,
+        access_policy=access_policy,
+        bounty_only=args.get('bounty_only') == 'true',
+        node_type=args.get('node_type') or None,
+        include_failed=args.get('include_failed') == 'true',
+    )
+
+
+class CachedResponse:
+    __slots__ = (
+        'body', 'etag', 'generation', 'version', 'expires_at', '_encoded'
+    )
+
+    def __init__(self, body, etag, generation, version, expires_at):
+        self.body = body
+        self.etag = etag
+        self.generation = generation
+        self.version = version
+        self.expires_at = expires_at
+        self._encoded = {}
+
+    def is_valid(self, generation, now):
+        if generation != self.generation:
+            return False
+        return self.expires_at is None or now < self.expires_at
+
+    # encoded returns the body compressed with the given content coding.
+    # Each variant is compressed once and kept for the life of the entry.
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = compress(self.body, encoding)
+            self._encoded[encoding] = body
+        return body
+
+
+# ProposalResponseCache keeps encoded /v1/proposals bodies per query.
+# An entry is dropped when the index generation of its service type moves
+# or when the first of its proposals runs out of AVAILABILITY_TIMEOUT.
+class ProposalResponseCache:
+    def __init__(self, index, max_entries):
+        self._index = index
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, query):
+        generation = self._index.generation(query.service_type)
+        version = self._index.version_token()
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and entry.is_valid(generation, now):
+                self._entries.move_to_end(query)
+                return entry
+
+        indexed = self._index.find(**query._asdict())
+        entry = build_cached_response(indexed, generation, version)
+        with self._lock:
+            self._entries[query] = entry
+            self._entries.move_to_end(query)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def supported_encodings():
+    if brotli is None:
+        return ['gzip']
+    return ['br', 'gzip']
+
+
+# choose_encoding picks the preferred content coding the client accepts,
+# or None when the body should be sent as is.
+def choose_encoding(accept_encodings, body_size):
+    if body_size < settings.PROPOSALS_COMPRESSION_MIN_SIZE:
+        return None
+    for encoding in supported_encodings():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+# format_etag quotes the etag of a cached response. Compressed bodies are
+# different representations, so their etag is suffixed with the coding.
+def format_etag(etag, encoding):
+    if encoding is None:
+        return '"{}"'.format(etag)
+    return '"{}-{}"'.format(etag, encoding)
+
+
+# etag_matches tells whether If-None-Match names the cached response in
+# any of its content codings.
+def etag_matches(etag, if_none_match):
+    if if_none_match.star_tag:
+        return True
+    for tag in if_none_match.as_set(include_weak=True):
+        if tag.split('-', 1)[0] == etag:
+            return True
+    return False
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)
+    raise ValueError('unsupported content encoding: {}'.format(encoding))
+
+
+def build_cached_response(indexed, generation, version):
+    service_proposals = []
+    for p in indexed:
+        service_proposals += p.proposals
+
+    body = json.dumps({'proposals': service_proposals}).encode('utf-8')
+    expires_at = None
+    if indexed:
+        expires_at = min(p.updated_at for p in indexed) + AVAILABILITY_TIMEOUT
+
+    return CachedResponse(
+        body,
+        hashlib.md5(body).hexdigest(),
+        generation,
+        version,
+        expires_at
+    )
+
+
+proposal_response_cache = ProposalResponseCache(
+    proposal_index,
+    settings.PROPOSALS_RESPONSE_CACHE_SIZE
+)
@@ -0,0 +1,179 @@
+import json
+import logging
+from datetime import timedelta
+
+from tornado import gen
+from tornado.ioloop import PeriodicCallback
+from tornado.iostream import StreamClosedError
+from tornado.queues import Queue, QueueFull
+from tornado.web import RequestHandler
+
+from api import settings
+from api.proposal_index import CHANGE_REMOVED
+
+logger = logging.getLogger('proposal_stream')
+
+EVENT_RESET = 'reset'
+
+
+class ProposalStreamSubscriber:
+    def __init__(self, service_type):
+        self.service_type = service_type
+        self.queue = Queue(maxsize=settings.PROPOSALS_STREAM_QUEUE_SIZE)
+        self.closed = False
+
+    def wants(self, service_type):
+        return self.service_type in ('all', service_type)
+
+
+# ProposalStreamBroadcaster turns proposal index changes into server-sent
+# events. The index notifies it from whichever thread made the change,
+# events are then built once on the IOLoop and fanned out to subscribers.
+class ProposalStreamBroadcaster:
+    def __init__(self, index, io_loop):
+        self._index = index
+        self._io_loop = io_loop
+        self._subscribers = set()
+        self._scheduled = False
+        self._version = index.version()
+        index.add_listener(self.notify)
+
+    def notify(self):
+        if self._scheduled:
+            return
+        self._scheduled = True
+        self._io_loop.add_callback(self._publish)
+
+    def subscribe(self, service_type):
+        subscriber = ProposalStreamSubscriber(service_type)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.closed = True
+        self._subscribers.discard(subscriber)
+
+    # replay returns the events after a version token. A token of another
+    # epoch or no longer in the change log gets a reset event. It raises
+    # ValueError when the token is malformed.
+    def replay(self, since, service_type):
+        since = self._index.parse_version(since)
+        changes = None
+        if since is not None:
+            version, changes = self._index.changes_since(since, service_type)
+        if changes is None:
+            return [(None, format_reset_event(self._index.version_token()))]
+        return format_change_events(self._index.version_token(version), changes)
+
+    def _publish(self):
+        self._scheduled = False
+        version, changes = self._index.changes_since(self._version)
+        self._version = version
+        token = self._index.version_token(version)
+        if changes is None:
+            events = [(None, format_reset_event(token))]
+        else:
+            events = format_change_events(token, changes)
+
+        for subscriber in list(self._subscribers):
+            for service_type, event in events:
+                if service_type is not None and \
+                        not subscriber.wants(service_type):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except QueueFull:
+                    logger.info("Dropping slow proposal stream subscriber")
+                    self.unsubscribe(subscriber)
+                    break
+
+
+def format_change_events(version, changes):
+    events = []
+    for kind, indexed in changes:
+        if kind == CHANGE_REMOVED:
+            data = [{
+                'provider_id': indexed.node_key,
+                'service_type': indexed.service_type,
+            }]
+        else:
+            data = indexed.proposals
+        for item in data:
+            events.append((
+                indexed.service_type,
+                format_event(version, kind, item)
+            ))
+    return events
+
+
+def format_reset_event(version):
+    return format_event(version, EVENT_RESET, {'version': version})
+
+
+def format_event(version, kind, data):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        version, kind, json.dumps(data)
+    )
+
+
+# ProposalStreamHandler keeps a text/event-stream response open on the
+# IOLoop, so a connected consumer does not occupy a WSGI worker.
+# Consumers resume with Last-Event-ID or the since argument.
+class ProposalStreamHandler(RequestHandler):
+    def initialize(self, broadcaster):
+        self._broadcaster = broadcaster
+        self._subscriber = None
+
+    @gen.coroutine
+    def get(self):
+        service_type = self.get_argument('service_type', 'openvpn')
+        since = self.request.headers.get('Last-Event-ID') or \
+            self.get_argument('since', None)
+        events = []
+        if since is not None:
+            try:
+                events = self._broadcaster.replay(since, service_type)
+            except ValueError:
+                self.set_status(400)
+                self.finish({'error': 'since must be a version'})
+                return
+
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        self.set_header('X-Accel-Buffering', 'no')
+
+        self._subscriber = self._broadcaster.subscribe(service_type)
+        keepalive = timedelta(seconds=settings.PROPOSALS_STREAM_KEEPALIVE)
+        try:
+            self.write(': connected\n\n')
+            for _, event in events:
+                self.write(event)
+            yield self.flush()
+
+            while not self._subscriber.closed:
+                try:
+                    event = yield self._subscriber.queue.get(
+                        timeout=keepalive
+                    )
+                except gen.TimeoutError:
+                    event = ': keepalive\n\n'
+                self.write(event)
+                yield self.flush()
+            self.finish()
+        except StreamClosedError:
+            pass
+        finally:
+            self._broadcaster.unsubscribe(self._subscriber)
+
+    def on_connection_close(self):
+        if self._subscriber is not None:
+            self._broadcaster.unsubscribe(self._subscriber)
+
+
+def start_proposal_stream(index, io_loop):
+    broadcaster = ProposalStreamBroadcaster(index, io_loop)
+    PeriodicCallback(
+        index.expire_stale,
+        settings.PROPOSALS_EXPIRY_SWEEP_INTERVAL * 1000
+    ).start()
+    return broadcaster
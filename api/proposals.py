@@ -2,12 +2,26 @@ from api import settings
 import helpers
 import json
 import hashlib
-from flask import request, jsonify
+from datetime import datetime
+from flask import request, jsonify, Response
 
 from api.node_availability_worker import node_availability_queue
+from api.node_heartbeat_worker import node_heartbeats
+from api.proposal_index import proposal_index, CHANGE_REMOVED
+from api.proposal_response_cache import (
+    proposal_response_cache,
+    parse_proposal_query,
+    choose_encoding,
+    format_etag,
+    etag_matches
+)
 from models import db, Node, ProposalAccessPolicy, NodeAvailability
 from request_helpers import validate_json, restrict_by_ip, recover_identity
-from identity_contract import IdentityContract
+from identity_contract import (
+    IdentityContract,
+    BatchedIdentityContract,
+    CachedIdentityContract
+)
 from queries import (
     filter_active_nodes,
     filter_active_nodes_by_service_type,
@@ -22,7 +36,25 @@ from cache import isProposalPingRecentlyCalled, markProposalPingRecentlyCalled
 identity_contract = IdentityContract(
     settings.ETHER_RPC_URL,
     settings.IDENTITY_CONTRACT,
-    settings.ETHER_MINING_MODE
+    settings.ETHER_MINING_MODE,
+    max_connections=settings.ETHER_RPC_MAX_CONNECTIONS,
+    timeout=settings.ETHER_RPC_TIMEOUT
+)
+rpc_latency_stats = identity_contract.provider.latency_stats
+if settings.IDENTITY_BATCH_SIZE > 1:
+    identity_contract = BatchedIdentityContract(
+        identity_contract,
+        batch_size=settings.IDENTITY_BATCH_SIZE,
+        batch_window=settings.IDENTITY_BATCH_WINDOW,
+        timeout=settings.ETHER_RPC_TIMEOUT,
+        workers=settings.ETHER_RPC_MAX_CONNECTIONS
+    )
+identity_contract = CachedIdentityContract(
+    identity_contract,
+    ttl=settings.IDENTITY_CACHE_TTL,
+    negative_ttl=settings.IDENTITY_NEGATIVE_CACHE_TTL,
+    stale_ttl=settings.IDENTITY_CACHE_STALE_TTL,
+    max_size=settings.IDENTITY_CACHE_SIZE,
 )
 
 
@@ -73,12 +105,14 @@ def register_endpoints(app):
         node.service_type = service_type
 
         delete_proposal_policies(node_key)
+        policies = []
         access_policies = proposal.get('access_policies')
         if access_policies:
             for policy_data in access_policies:
                 id = policy_data['id']
                 source = policy_data['source']
                 db.session.add(ProposalAccessPolicy(node_key, id, source))
+                policies.append((id, source))
 
         node_type = helpers.parse_node_type_from_proposal(proposal)
         if node_type:
@@ -88,6 +122,8 @@ def register_endpoints(app):
         db.session.add(node)
         db.session.commit()
 
+        proposal_index.put_node(node, policies)
+
         return jsonify({})
 
     @app.route('/v1/unregister_proposal', methods=['POST'])
@@ -111,45 +147,22 @@ def register_endpoints(app):
         if not node:
             return jsonify({}), 404
 
+        node_heartbeats.discard(
+            caller_identity, service_type, datetime.utcnow()
+        )
         node.mark_inactive()
         db.session.commit()
 
+        proposal_index.touch(node.node_key, service_type, node.updated_at)
+
         return jsonify({})
 
     @app.route('/v1/proposals', methods=['GET'])
     def proposals():
-        service_type = request.args.get('service_type', 'openvpn')
-        if service_type == "all":
-            nodes = filter_active_nodes()
-        else:
-            nodes = filter_active_nodes_by_service_type(service_type)
-
-        node_key = request.args.get('node_key')
-        if node_key:
-            nodes = nodes.filter_by(node_key=node_key)
-
-        if request.args.get('access_policy') != '*':
-            id = request.args.get('access_policy[id]')
-            source = request.args.get('access_policy[source]')
-            if id or source:
-                nodes = filter_nodes_by_access_policy(nodes, id, source)
-            else:
-                nodes = filter_nodes_without_access_policies(nodes)
-
-        if request.args.get('bounty_only') == 'true':
-            nodes = filter_nodes_in_bounty_programme(nodes)
-
-        node_type_arg = request.args.get('node_type')
-        if node_type_arg:
-            nodes = filter_nodes_by_node_type(nodes, node_type_arg)
-
-        if request.args.get('include_failed') != 'true':
-            nodes = filter_nodes_by_monitoring_failed(nodes)
-
-        service_proposals = []
-        for node in nodes:
-            service_proposals += node.get_service_proposals()
+        if settings.PROPOSALS_INDEX_ENABLED and proposal_index.is_loaded():
+            return cached_proposals_response()
 
+        service_proposals = query_proposals(request.args)
         proposals_res = {'proposals': service_proposals}
         etag = generate_etag(proposals_res)
         req_etag = request.headers.get('If-None-Match')
@@ -160,6 +173,37 @@ def register_endpoints(app):
         response.headers.set('Etag', etag)
         return response
 
+    # Returns proposals added, updated and removed after the given version.
+    # Versions come from the X-Proposals-Version header of /v1/proposals
+    # or from a previous call. Access policy, bounty and node type filters
+    # are not applied, proposals failing monitoring count as removed.
+    @app.route('/v1/proposals/changes', methods=['GET'])
+    def proposal_changes():
+        if not settings.PROPOSALS_INDEX_ENABLED or \
+                not proposal_index.is_loaded():
+            return jsonify(error='proposal changes are not available'), 503
+
+        try:
+            since = proposal_index.parse_version(request.args.get('since', ''))
+        except ValueError:
+            return jsonify(error='since must be a version'), 400
+
+        service_type = request.args.get('service_type', 'openvpn')
+        changes = None
+        if since is not None:
+            version, changes = proposal_index.changes_since(
+                since, service_type
+            )
+        if changes is None:
+            return jsonify(
+                error='version is not available, fetch all proposals',
+                version=proposal_index.version_token()
+            ), 410
+
+        return jsonify(serialize_proposal_changes(
+            proposal_index.version_token(version), changes
+        ))
+
     # node call this function each minute.
     @app.route('/v1/ping_proposal', methods=['POST'])
     # TODO: remove deprecated route when it's not used anymore
@@ -178,12 +222,28 @@ def register_endpoints(app):
                 ), 429
             markProposalPingRecentlyCalled(caller_identity, service_type)
 
-        node = Node.query.get([caller_identity, service_type])
-        if not node:
-            return jsonify(error='node key not found'), 400
+        if node_heartbeats.started:
+            # heartbeats are written to db in batches by the heartbeat worker
+            seen_at = datetime.utcnow()
+            if not proposal_index.touch(caller_identity, service_type,
+                                        seen_at):
+                node = Node.query.get([caller_identity, service_type])
+                if not node:
+                    return jsonify(error='node key not found'), 400
+                proposal_index.put_node(node)
+                proposal_index.touch(caller_identity, service_type, seen_at)
+            node_heartbeats.record(caller_identity, service_type, seen_at)
+        else:
+            node = Node.query.get([caller_identity, service_type])
+            if not node:
+                return jsonify(error='node key not found'), 400
 
-        node.mark_activity()
-        db.session.commit()
+            node.mark_activity()
+            db.session.commit()
+
+            if not proposal_index.touch(caller_identity, service_type,
+                                        node.updated_at):
+                proposal_index.put_node(node)
 
         # Add record to NodeAvailability to queue.
         na = NodeAvailability(caller_identity)
@@ -193,6 +253,75 @@ def register_endpoints(app):
         return jsonify({})
 
 
+def query_proposals(args):
+    service_type = args.get('service_type', 'openvpn')
+    if service_type == "all":
+        nodes = filter_active_nodes()
+    else:
+        nodes = filter_active_nodes_by_service_type(service_type)
+
+    node_key = args.get('node_key')
+    if node_key:
+        nodes = nodes.filter_by(node_key=node_key)
+
+    if args.get('access_policy') != '*':
+        id = args.get('access_policy[id]')
+        source = args.get('access_policy[source]')
+        if id or source:
+            nodes = filter_nodes_by_access_policy(nodes, id, source)
+        else:
+            nodes = filter_nodes_without_access_policies(nodes)
+
+    if args.get('bounty_only') == 'true':
+        nodes = filter_nodes_in_bounty_programme(nodes)
+
+    node_type_arg = args.get('node_type')
+    if node_type_arg:
+        nodes = filter_nodes_by_node_type(nodes, node_type_arg)
+
+    if args.get('include_failed') != 'true':
+        nodes = filter_nodes_by_monitoring_failed(nodes)
+
+    service_proposals = []
+    for node in nodes:
+        service_proposals += node.get_service_proposals()
+    return service_proposals
+
+
+def cached_proposals_response():
+    query = parse_proposal_query(request.args)
+    cached = proposal_response_cache.get(query)
+    if etag_matches(cached.etag, request.if_none_match):
+        return '', 304
+
+    encoding = choose_encoding(request.accept_encodings, len(cached.body))
+    if encoding is None:
+        response = Response(cached.body, mimetype='application/json')
+    else:
+        response = Response(
+            cached.encoded(encoding),
+            mimetype='application/json'
+        )
+        response.headers.set('Content-Encoding', encoding)
+    response.headers.set('Vary', 'Accept-Encoding')
+    response.headers.set('Etag', format_etag(cached.etag, encoding))
+    response.headers.set('X-Proposals-Version', cached.version)
+    return response
+
+
+def serialize_proposal_changes(version, changes):
+    res = {'version': version, 'added': [], 'updated': [], 'removed': []}
+    for kind, indexed in changes:
+        if kind == CHANGE_REMOVED:
+            res[kind].append({
+                'provider_id': indexed.node_key,
+                'service_type': indexed.service_type,
+            })
+        else:
+            res[kind] += indexed.proposals
+    return res
+
+
 def delete_proposal_policies(node_key):
     ProposalAccessPolicy \
         .query \
@@ -0,0 +1,105 @@
+import datetime
+import logging
+import time
+import threading
+from collections import namedtuple
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from api import settings
+
+logger = logging.getLogger('retention_worker')
+
+# RetentionPolicy removes rows of table whose column is older than days.
+# Rows whose column is NULL are aged by fallback_column, when one is set.
+# A policy with zero days is disabled.
+RetentionPolicy = namedtuple(
+    'RetentionPolicy', ['table', 'column', 'days', 'fallback_column']
+)
+
+
+def retention_policies():
+    return [
+        RetentionPolicy(
+            'node_availability', 'date',
+            settings.NODE_AVAILABILITY_RETENTION_DAYS, None
+        ),
+        RetentionPolicy(
+            'node_availability_hourly', 'hour',
+            settings.NODE_AVAILABILITY_HOURLY_RETENTION_DAYS, None
+        ),
+        # sessions which never got client stats have no client_updated_at
+        RetentionPolicy(
+            'session', 'client_updated_at',
+            settings.SESSION_RETENTION_DAYS, 'created_at'
+        ),
+    ]
+
+
+# delete_expired_rows deletes rows older than cutoff in chunks of
+# chunk_size, each in its own short transaction, so no lock is held for
+# long. It returns the number of deleted rows.
+def delete_expired_rows(db_session, policy, cutoff, chunk_size, pause=0.0):
+    statement = text(
+        'DELETE FROM {} WHERE {} LIMIT :limit'.format(
+            policy.table, expired_condition(policy)
+        )
+    )
+    deleted = 0
+    while True:
+        result = db_session.execute(
+            statement, {'cutoff': cutoff, 'limit': chunk_size}
+        )
+        db_session.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted
+        time.sleep(pause)
+
+
+# expired_condition compares the columns of policy with :cutoff. The
+# fallback is an OR branch rather than COALESCE, so both columns can still
+# be looked up by their indexes.
+def expired_condition(policy):
+    if policy.fallback_column is None:
+        return '{} < :cutoff'.format(policy.column)
+    return '({0} < :cutoff OR ({0} IS NULL AND {1} < :cutoff))'.format(
+        policy.column, policy.fallback_column
+    )
+
+
+# process_retention removes expired rows of every enabled policy each
+# RETENTION_INTERVAL seconds. This work happens in a separate thread.
+def process_retention(db_engine):
+    session_factory = sessionmaker(bind=db_engine)
+
+    while True:
+        for policy in retention_policies():
+            if policy.days <= 0:
+                continue
+            db_session = session_factory()
+            try:
+                cutoff = datetime.datetime.utcnow() - \
+                    datetime.timedelta(days=policy.days)
+                deleted = delete_expired_rows(
+                    db_session,
+                    policy,
+                    cutoff,
+                    settings.RETENTION_CHUNK_SIZE,
+                    settings.RETENTION_CHUNK_PAUSE
+                )
+                logger.info("Deleted {} expired rows from {}".format(
+                    deleted, policy.table
+                ))
+            except Exception:
+                logger.error("Failed to delete expired rows:", exc_info=True)
+                db_session.rollback()
+            finally:
+                db_session.close()
+
+        time.sleep(settings.RETENTION_INTERVAL)
+
+
+def start_retention_worker(db_engine):
+    x = threading.Thread(target=process_retention, args=(db_engine,), daemon=True)
+    x.start()
@@ -0,0 +1,255 @@
+import threading
+import time
+import queue
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import sessionmaker
+
+from api import settings
+from api.session_totals import session_totals_change, add_session_totals
+from models import Session, SESSION_EXPIRATION
+
+logger = logging.getLogger('session_stats_worker')
+
+
+# SessionState is what stats validation needs to know about a session.
+# It is kept in memory so validation does not read the session row.
+class SessionState:
+    __slots__ = ('consumer_id', 'created_at', 'client_updated_at',
+                 'client_bytes_sent', 'client_bytes_received')
+
+    def __init__(self, consumer_id, created_at, client_updated_at=None,
+                 client_bytes_sent=0, client_bytes_received=0):
+        self.consumer_id = consumer_id
+        self.created_at = created_at
+        self.client_updated_at = client_updated_at
+        self.client_bytes_sent = client_bytes_sent
+        self.client_bytes_received = client_bytes_received
+
+    @classmethod
+    def from_session(cls, session):
+        return cls(
+            session.consumer_id,
+            session.created_at,
+            session.client_updated_at,
+            session.client_bytes_sent,
+            session.client_bytes_received
+        )
+
+    def has_expired(self):
+        last_session_activity = self.client_updated_at or self.created_at
+        return datetime.utcnow() - last_session_activity > SESSION_EXPIRATION
+
+
+# SessionStatsPipeline validates session stats against cached session
+# state and queues accepted stats for the session stats worker. Queued
+# stats are what validation sees until the worker commits them, only
+# committed ones are kept in the state cache. Stats of a failed flush are
+# forgotten, so the next stats of the session are validated against the
+# state that is in db.
+class SessionStatsPipeline:
+    def __init__(self, state_cache_size, queue_size):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.started = False
+        self._state_cache_size = state_cache_size
+        self._states = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def state(self, session_key):
+        with self._lock:
+            stats = self._pending.get(session_key)
+            if stats is not None:
+                return _state_of(stats)
+            state = self._states.get(session_key)
+            if state is not None:
+                self._states.move_to_end(session_key)
+            return state
+
+    # put queues stats for the worker. It returns False when the queue is
+    # full and the stats were not accepted.
+    def put(self, stats):
+        with self._lock:
+            try:
+                self.queue.put_nowait(stats)
+            except queue.Full:
+                return False
+            self._pending[stats['session_key']] = stats
+            return True
+
+    # committed moves the state of written stats to the state cache.
+    def committed(self, batch):
+        with self._lock:
+            for stats in batch:
+                session_key = stats['session_key']
+                if self._pending.get(session_key) is not stats:
+                    continue
+                del self._pending[session_key]
+                self._states[session_key] = _state_of(stats)
+                self._states.move_to_end(session_key)
+            while len(self._states) > self._state_cache_size:
+                self._states.popitem(last=False)
+
+    # failed forgets the state of stats which could not be written.
+    def failed(self, batch):
+        with self._lock:
+            for stats in batch:
+                session_key = stats['session_key']
+                if self._pending.get(session_key) is stats:
+                    del self._pending[session_key]
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._pending.clear()
+
+
+def _state_of(stats):
+    return SessionState(
+        stats['consumer_id'],
+        stats['created_at'],
+        stats['client_updated_at'],
+        stats['client_bytes_sent'],
+        stats['client_bytes_received']
+    )
+
+
+session_stats_pipeline = SessionStatsPipeline(
+    settings.SESSION_STATS_STATE_CACHE_SIZE,
+    settings.SESSION_STATS_QUEUE_SIZE
+)
+session_stats_stop = threading.Event()
+session_stats_stopped = threading.Event()
+
+
+# upsert_session_stats writes a batch of stats with a single multi-row
+# INSERT ... ON DUPLICATE KEY UPDATE. Only the latest stats of a session
+# in the batch are written, counters are totals so nothing is lost.
+# Session totals are updated from the locked current rows in the same
+# transaction.
+def upsert_session_stats(db_session, batch):
+    latest = OrderedDict()
+    for stats in batch:
+        latest[stats['session_key']] = stats
+
+    table = Session.__table__
+    rows = db_session.execute(
+        select([
+            table.c.session_key,
+            table.c.created_at,
+            table.c.client_updated_at,
+            table.c.client_bytes_sent,
+            table.c.client_bytes_received,
+        ])
+        .where(table.c.session_key.in_(sorted(latest)))
+        .with_for_update()
+    )
+    previous = {row.session_key: row for row in rows}
+    add_session_totals(db_session, [
+        session_totals_change(
+            previous.get(key),
+            stats['created_at'],
+            stats['client_updated_at'],
+            stats['client_bytes_sent'],
+            stats['client_bytes_received']
+        )
+        for key, stats in latest.items()
+    ])
+
+    statement = insert(Session.__table__).values(list(latest.values()))
+    statement = statement.on_duplicate_key_update(
+        service_type=statement.inserted.service_type,
+        client_bytes_sent=statement.inserted.client_bytes_sent,
+        client_bytes_received=statement.inserted.client_bytes_received,
+        client_updated_at=statement.inserted.client_updated_at
+    )
+    db_session.execute(statement)
+    db_session.commit()
+
+
+# process_session_stats writes queued session stats to db in batches of
+# batch_size, or whatever arrived in flush_interval seconds. When stop is
+# set the queue is drained and the worker exits. This work happens in a
+# separate thread.
+def process_session_stats(db_engine, pipeline, batch_size, flush_interval,
+                          stop=None, stopped=None):
+    session_factory = sessionmaker(bind=db_engine)
+    if stop is None:
+        stop = session_stats_stop
+    if stopped is None:
+        stopped = session_stats_stopped
+
+    batch = []
+    deadline = None
+    while True:
+        stopping = stop.is_set()
+        if stopping:
+            timeout = 0
+        elif deadline is None:
+            # wake up now and then to notice a stop request
+            timeout = 0.5
+        else:
+            timeout = max(deadline - time.monotonic(), 0)
+        try:
+            batch.append(pipeline.queue.get(timeout=timeout))
+            if deadline is None:
+                deadline = time.monotonic() + flush_interval
+        except queue.Empty:
+            if stopping:
+                if batch:
+                    _flush(session_factory, pipeline, batch)
+                stopped.set()
+                return
+            if deadline is None:
+                continue
+
+        # while draining, batches are filled from the queue without waiting
+        if len(batch) < batch_size and \
+                (stopping or time.monotonic() < deadline):
+            continue
+
+        _flush(session_factory, pipeline, batch)
+        batch = []
+        deadline = None
+
+
+def _flush(session_factory, pipeline, batch):
+    db_session = session_factory()
+    try:
+        upsert_session_stats(db_session, batch)
+        pipeline.committed(batch)
+        logger.info("Committed {} session stats".format(len(batch)))
+    except Exception:
+        logger.error("Failed to process session stats:", exc_info=True)
+        db_session.rollback()
+        pipeline.failed(batch)
+    finally:
+        db_session.close()
+
+
+def start_session_stats_worker(db_engine, pipeline):
+    pipeline.started = True
+    x = threading.Thread(
+        target=process_session_stats,
+        args=(
+            db_engine,
+            pipeline,
+            settings.SESSION_STATS_BATCH_SIZE,
+            settings.SESSION_STATS_FLUSH_INTERVAL
+        ),
+        daemon=True
+    )
+    x.start()
+
+
+# stop_session_stats_worker asks the worker to write everything that is
+# queued and waits up to timeout seconds for it to finish.
+def stop_session_stats_worker(timeout):
+    session_stats_stop.set()
+    if not session_stats_stopped.wait(timeout):
+        logger.error("Session stats worker did not drain in time")
+        return False
+    return True
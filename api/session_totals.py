@@ -0,0 +1,63 @@
+from sqlalchemy.dialects.mysql import insert
+
+from models import SessionTotals, SESSION_TOTALS_ID
+
+TOTALS = [
+    'sessions',
+    'timed_sessions',
+    'duration_seconds',
+    'client_bytes_sent',
+    'client_bytes_received',
+]
+
+
+def _duration_seconds(created_at, client_updated_at):
+    if client_updated_at is None:
+        return 0
+    return int((client_updated_at - created_at).total_seconds())
+
+
+# session_totals_change returns how session totals change when a session
+# previously stored as previous (None for a new session) gets new stats.
+# previous is anything with the attributes of a SessionState.
+def session_totals_change(previous, created_at, client_updated_at,
+                          client_bytes_sent, client_bytes_received):
+    if previous is None:
+        return {
+            'sessions': 1,
+            'timed_sessions': 1 if client_updated_at is not None else 0,
+            'duration_seconds': _duration_seconds(
+                created_at, client_updated_at
+            ),
+            'client_bytes_sent': client_bytes_sent or 0,
+            'client_bytes_received': client_bytes_received or 0,
+        }
+
+    timed = previous.client_updated_at is None and \
+        client_updated_at is not None
+    return {
+        'sessions': 0,
+        'timed_sessions': 1 if timed else 0,
+        'duration_seconds':
+            _duration_seconds(previous.created_at, client_updated_at) -
+            _duration_seconds(previous.created_at, previous.client_updated_at),
+        'client_bytes_sent':
+            (client_bytes_sent or 0) - (previous.client_bytes_sent or 0),
+        'client_bytes_received':
+            (client_bytes_received or 0) - (previous.client_bytes_received or 0),
+    }
+
+
+# add_session_totals adds changes to the session totals row. It does not
+# commit, so totals are written in the transaction of the session stats.
+def add_session_totals(db_session, changes):
+    change = {name: sum(c[name] for c in changes) for name in TOTALS}
+    if not any(change.values()):
+        return
+
+    table = SessionTotals.__table__
+    statement = insert(table).values(id=SESSION_TOTALS_ID, **change)
+    statement = statement.on_duplicate_key_update(**{
+        name: table.c[name] + statement.inserted[name] for name in TOTALS
+    })
+    db_session.execute(statement)
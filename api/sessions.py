@@ -5,6 +5,8 @@ from ip import mask_ip_partially
 from models import db, Session
 from cache import isSessionStatRecentlyCalled, markSessionStatRecentlyCalled
 from api import settings
+from api.session_stats_worker import session_stats_pipeline, SessionState
+from api.session_totals import session_totals_change, add_session_totals
 
 
 def register_endpoints(app):
@@ -38,7 +40,15 @@ def register_endpoints(app):
         provider_id = payload.get('provider_id')
         if not provider_id:
             return jsonify(error='provider_id missing'), 400
+
+        if session_stats_pipeline.started:
+            return queue_session_stats(
+                session_key, caller_identity, payload, service_type,
+                bytes_sent, bytes_received, provider_id
+            )
+
         session = Session.query.get(session_key)
+        previous = None
         if session is None:
             consumer_country = payload.get('consumer_country', '')
             session = Session(session_key, service_type)
@@ -50,28 +60,88 @@ def register_endpoints(app):
             session.client_bytes_received = 0
             session.client_bytes_sent = 0
         else:
+            previous = SessionState.from_session(session)
             session.service_type = service_type
 
-        threshold = (1000000000 / 8 * 60)
-        if bytes_received - session.client_bytes_received > threshold:
-            return jsonify({}), 418
-        if bytes_sent - session.client_bytes_sent > threshold:
-            return jsonify({}), 418
-
-        if session.consumer_id != caller_identity:
-            message = 'session identity does not match current one'
-            return jsonify(error=message), 403
-
-        if session.has_expired():
-            return jsonify(
-                error='session has expired'
-            ), 400
+        error = validate_session_stats(
+            session, caller_identity, bytes_sent, bytes_received
+        )
+        if error is not None:
+            return error
 
         session.client_bytes_sent = bytes_sent
         session.client_bytes_received = bytes_received
         session.client_updated_at = datetime.utcnow()
 
         db.session.add(session)
+        add_session_totals(db.session, [session_totals_change(
+            previous,
+            session.created_at,
+            session.client_updated_at,
+            bytes_sent,
+            bytes_received
+        )])
         db.session.commit()
 
         return jsonify({})
+
+
+# validate_session_stats checks new stats against the current session,
+# either a Session model or a cached SessionState.
+def validate_session_stats(session, caller_identity, bytes_sent,
+                           bytes_received):
+    threshold = (1000000000 / 8 * 60)
+    if bytes_received - session.client_bytes_received > threshold:
+        return jsonify({}), 418
+    if bytes_sent - session.client_bytes_sent > threshold:
+        return jsonify({}), 418
+
+    if session.consumer_id != caller_identity:
+        message = 'session identity does not match current one'
+        return jsonify(error=message), 403
+
+    if session.has_expired():
+        return jsonify(
+            error='session has expired'
+        ), 400
+
+    return None
+
+
+# queue_session_stats validates stats against cached session state and
+# leaves writing them to the session stats worker.
+def queue_session_stats(session_key, caller_identity, payload, service_type,
+                        bytes_sent, bytes_received, provider_id):
+    state = session_stats_pipeline.state(session_key)
+    if state is None:
+        session = Session.query.get(session_key)
+        if session is not None:
+            state = SessionState.from_session(session)
+        else:
+            state = SessionState(caller_identity, datetime.utcnow())
+
+    error = validate_session_stats(
+        state, caller_identity, bytes_sent, bytes_received
+    )
+    if error is not None:
+        return error
+
+    accepted = session_stats_pipeline.put({
+        'session_key': session_key,
+        'service_type': service_type,
+        'created_at': state.created_at,
+        'established': False,
+        'node_bytes_sent': 0,
+        'node_bytes_received': 0,
+        'consumer_id': caller_identity,
+        'node_key': provider_id,
+        'client_ip': mask_ip_partially(request.remote_addr),
+        'client_country': payload.get('consumer_country', ''),
+        'client_bytes_sent': bytes_sent,
+        'client_bytes_received': bytes_received,
+        'client_updated_at': datetime.utcnow(),
+    })
+    if not accepted:
+        return jsonify(error='session stats queue is full'), 503
+
+    return jsonify({})
@@ -1,3 +1,4 @@
+import json
 import os
 from distutils import util
 
@@ -23,6 +24,15 @@ DB_CONFIG = {
 
 DISABLE_LOGS = os.environ.get('DISABLE_LOGS') or False
 
+# beaker cache type shared by api and dashboard: memory, file, dbm or
+# ext:memcached. Only ext:memcached, or file and dbm on a shared data dir,
+# are seen by every process, docker-compose.yml runs memcached.
+CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'memory'
+# directory of file and dbm caches
+CACHE_DATA_DIR = os.environ.get('CACHE_DATA_DIR') or '/tmp/api-cache'
+# address of the memcached cache, e.g. 127.0.0.1:11211
+CACHE_URL = os.environ.get('CACHE_URL') or ''
+
 # util.strtobool
 # True values are y, yes, t, true, on and 1;
 # False values are n, no, f, false, off and 0.
@@ -37,6 +47,13 @@ ALLOWED_IP_ADDRESSES = (
 ETHER_RPC_URL = os.environ.get('ETHER_RPC_URL') \
                               or 'https://ropsten.infura.io/'
 
+# maximum number of concurrent keep-alive connections to ETHER_RPC_URL
+ETHER_RPC_MAX_CONNECTIONS = int(
+    os.environ.get('ETHER_RPC_MAX_CONNECTIONS') or 10
+)
+# in seconds
+ETHER_RPC_TIMEOUT = float(os.environ.get('ETHER_RPC_TIMEOUT') or 10)
+
 ETHER_MINING_MODE = os.environ.get('ETHER_MINING_MODE') or 'pow'
 if ETHER_MINING_MODE not in ['pow', 'poa']:
     raise Exception('Not supported ether mining mode')
@@ -47,3 +64,190 @@ IDENTITY_CONTRACT = os.environ.get('IDENTITY_CONTRACT') \
 DISCOVERY_VERIFY_IDENTITY = os.environ.get(
     'DISCOVERY_VERIFY_IDENTITY', 'true'
 ).lower() == 'true'
+
+# in seconds, how often buffered ping_proposal heartbeats are written to db
+HEARTBEAT_FLUSH_INTERVAL = float(
+    os.environ.get('HEARTBEAT_FLUSH_INTERVAL') or 5
+)
+# maximum number of nodes updated by a single UPDATE statement
+HEARTBEAT_FLUSH_BATCH_SIZE = int(
+    os.environ.get('HEARTBEAT_FLUSH_BATCH_SIZE') or 500
+)
+
+# node availabilities are written at least every
+# NODE_AVAILABILITY_FLUSH_INTERVAL seconds, batches grow up to
+# NODE_AVAILABILITY_MAX_BATCH_SIZE while commits stay under
+# NODE_AVAILABILITY_TARGET_COMMIT_SECONDS
+NODE_AVAILABILITY_FLUSH_INTERVAL = float(
+    os.environ.get('NODE_AVAILABILITY_FLUSH_INTERVAL') or 1
+)
+NODE_AVAILABILITY_MAX_BATCH_SIZE = int(
+    os.environ.get('NODE_AVAILABILITY_MAX_BATCH_SIZE') or 1000
+)
+NODE_AVAILABILITY_TARGET_COMMIT_SECONDS = float(
+    os.environ.get('NODE_AVAILABILITY_TARGET_COMMIT_SECONDS') or 0.1
+)
+# maximum number of node availabilities waiting to be written, when full
+# the overflow policy drops the oldest one (drop_oldest), waits up to
+# NODE_AVAILABILITY_BLOCK_TIMEOUT seconds (block) or appends the new one
+# to NODE_AVAILABILITY_SPILL_PATH (spill)
+NODE_AVAILABILITY_QUEUE_SIZE = int(
+    os.environ.get('NODE_AVAILABILITY_QUEUE_SIZE') or 100000
+)
+NODE_AVAILABILITY_OVERFLOW_POLICY = os.environ.get(
+    'NODE_AVAILABILITY_OVERFLOW_POLICY'
+) or 'drop_oldest'
+if NODE_AVAILABILITY_OVERFLOW_POLICY not in ['drop_oldest', 'block', 'spill']:
+    raise Exception('Not supported node availability overflow policy')
+NODE_AVAILABILITY_BLOCK_TIMEOUT = float(
+    os.environ.get('NODE_AVAILABILITY_BLOCK_TIMEOUT') or 0.05
+)
+NODE_AVAILABILITY_SPILL_PATH = os.environ.get(
+    'NODE_AVAILABILITY_SPILL_PATH'
+) or 'node_availability.spill'
+
+# in days, how long rows are kept, 0 keeps them forever
+NODE_AVAILABILITY_RETENTION_DAYS = int(
+    os.environ.get('NODE_AVAILABILITY_RETENTION_DAYS') or 31
+)
+NODE_AVAILABILITY_HOURLY_RETENTION_DAYS = int(
+    os.environ.get('NODE_AVAILABILITY_HOURLY_RETENTION_DAYS') or 400
+)
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS') or 0)
+# expired rows are deleted every RETENTION_INTERVAL seconds, in chunks of
+# RETENTION_CHUNK_SIZE rows with RETENTION_CHUNK_PAUSE seconds in between
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL') or 60 * 60)
+RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE') or 1000)
+RETENTION_CHUNK_PAUSE = float(
+    os.environ.get('RETENTION_CHUNK_PAUSE') or 0.1
+)
+
+# in seconds, how often the monthly leaderboards are refreshed
+LEADERBOARD_REFRESH_INTERVAL = int(
+    os.environ.get('LEADERBOARD_REFRESH_INTERVAL') or 3 * 60
+)
+# in hours, how long hourly ping counts are read again on every refresh
+# before they are added to the leaderboard once. Node availabilities are
+# written late when the queue backs up or spilled ones are replayed after
+# a db outage, so this has to outlast the longest such delay.
+LEADERBOARD_SEAL_DELAY = int(
+    os.environ.get('LEADERBOARD_SEAL_DELAY') or 24
+)
+# JSON list of leaderboards, each with a name, service_type, optional
+# node_type and countries filters, size and ranking column
+LEADERBOARDS = json.loads(os.environ.get('LEADERBOARDS') or json.dumps([{
+    'name': 'monthly',
+    'service_type': 'openvpn',
+    'node_type': 'residential',
+    'countries': ['DE', 'GB', 'IT', 'US'],
+    'size': 1000,
+    'ranking': 'hours_available',
+}]))
+LEADERBOARD_RESPONSE_CACHE_SIZE = int(
+    os.environ.get('LEADERBOARD_RESPONSE_CACHE_SIZE') or 1000
+)
+# in seconds, how often a cached leaderboard page checks whether the
+# leaderboard was refreshed
+LEADERBOARD_RESPONSE_CHECK_INTERVAL = float(
+    os.environ.get('LEADERBOARD_RESPONSE_CHECK_INTERVAL') or 10
+)
+
+# in seconds, how often collected metrics are logged, 0 disables it
+METRICS_LOG_INTERVAL = int(os.environ.get('METRICS_LOG_INTERVAL') or 60)
+
+# in seconds, how long each worker writes its queued data to db on SIGTERM
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT') or 10)
+
+# session stats are written in batches of up to SESSION_STATS_BATCH_SIZE,
+# or whatever arrived within SESSION_STATS_FLUSH_INTERVAL seconds
+SESSION_STATS_BATCH_SIZE = int(
+    os.environ.get('SESSION_STATS_BATCH_SIZE') or 500
+)
+SESSION_STATS_FLUSH_INTERVAL = float(
+    os.environ.get('SESSION_STATS_FLUSH_INTERVAL') or 1
+)
+# maximum number of session stats waiting to be written, when full new
+# stats are refused with 503 and sent again by the consumer
+SESSION_STATS_QUEUE_SIZE = int(
+    os.environ.get('SESSION_STATS_QUEUE_SIZE') or 100000
+)
+# number of sessions whose state is kept to validate stats without db reads
+SESSION_STATS_STATE_CACHE_SIZE = int(
+    os.environ.get('SESSION_STATS_STATE_CACHE_SIZE') or 100000
+)
+
+# in seconds, how long identity contract answers are trusted
+IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60 * 60)
+IDENTITY_NEGATIVE_CACHE_TTL = int(
+    os.environ.get('IDENTITY_NEGATIVE_CACHE_TTL') or 60
+)
+# in seconds, how long an expired positive answer is still served
+# while it is refreshed in the background
+IDENTITY_CACHE_STALE_TTL = int(
+    os.environ.get('IDENTITY_CACHE_STALE_TTL') or 24 * 60 * 60
+)
+# identity checks arriving within IDENTITY_BATCH_WINDOW seconds are sent
+# as one JSON-RPC batch of up to IDENTITY_BATCH_SIZE calls, 1 disables it.
+# Only worth enabling when the app runs in a threaded WSGI server, the
+# Tornado WSGIContainer of server.py serves one request at a time.
+IDENTITY_BATCH_SIZE = int(os.environ.get('IDENTITY_BATCH_SIZE') or 1)
+IDENTITY_BATCH_WINDOW = float(
+    os.environ.get('IDENTITY_BATCH_WINDOW') or 0.005
+)
+IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE') or 100000)
+
+# recovered signature addresses kept in memory, 0 disables the cache
+SIGNATURE_CACHE_SIZE = int(
+    os.environ.get('SIGNATURE_CACHE_SIZE') or 10000
+)
+# worker processes for signature recovery, 0 recovers in the request thread.
+# Only worth enabling when the app runs in a threaded WSGI server, the
+# Tornado WSGIContainer of server.py serves one request at a time, so the
+# pool only adds inter-process calls and SIGNATURE_RECOVERY_BATCH_WINDOW.
+SIGNATURE_RECOVERY_WORKERS = int(
+    os.environ.get('SIGNATURE_RECOVERY_WORKERS') or 0
+)
+SIGNATURE_RECOVERY_BATCH_SIZE = int(
+    os.environ.get('SIGNATURE_RECOVERY_BATCH_SIZE') or 16
+)
+# in seconds, how long to wait for more recoveries to batch together
+SIGNATURE_RECOVERY_BATCH_WINDOW = float(
+    os.environ.get('SIGNATURE_RECOVERY_BATCH_WINDOW') or 0.002
+)
+SIGNATURE_RECOVERY_TIMEOUT = float(
+    os.environ.get('SIGNATURE_RECOVERY_TIMEOUT') or 5
+)
+
+PROPOSALS_INDEX_ENABLED = bool(util.strtobool(
+    os.environ.get('PROPOSALS_INDEX_ENABLED') or 'yes'
+))
+PROPOSALS_RESPONSE_CACHE_SIZE = int(
+    os.environ.get('PROPOSALS_RESPONSE_CACHE_SIZE') or 1000
+)
+PROPOSALS_CHANGE_LOG_SIZE = int(
+    os.environ.get('PROPOSALS_CHANGE_LOG_SIZE') or 10000
+)
+# in seconds
+PROPOSALS_EXPIRY_SWEEP_INTERVAL = int(
+    os.environ.get('PROPOSALS_EXPIRY_SWEEP_INTERVAL') or 10
+)
+# in hours, how long inactive proposals are kept in the index
+PROPOSALS_PRUNE_AFTER = int(
+    os.environ.get('PROPOSALS_PRUNE_AFTER') or 24
+)
+PROPOSALS_STREAM_KEEPALIVE = int(
+    os.environ.get('PROPOSALS_STREAM_KEEPALIVE') or 15
+)
+# events buffered per stream consumer before it is disconnected
+PROPOSALS_STREAM_QUEUE_SIZE = int(
+    os.environ.get('PROPOSALS_STREAM_QUEUE_SIZE') or 1000
+)
+# in seconds, how often the proposal index picks up what other server
+# processes wrote to db, 0 to only load it at startup
+PROPOSALS_SYNC_INTERVAL = int(
+    os.environ.get('PROPOSALS_SYNC_INTERVAL') or 30
+)
+# in bytes, smaller proposal listings are sent uncompressed
+PROPOSALS_COMPRESSION_MIN_SIZE = int(
+    os.environ.get('PROPOSALS_COMPRESSION_MIN_SIZE') or 1024
+)
@@ -1,13 +1,27 @@
-from flask import jsonify, request
+from datetime import datetime, timedelta
+from flask import Response, jsonify, request
 
-from api.stats.model_layer import get_sessions, get_session_info
+from api.leaderboard_config import (
+    get_leaderboard_config, default_leaderboard_name
+)
+from api.leaderboard_response_cache import (
+    leaderboard_response_cache, parse_cursor
+)
+from api.proposal_response_cache import format_etag, etag_matches
+from api.stats.model_layer import get_sessions_page, get_session_info
 
 
 DEFAULT_SESSIONS_LIMIT = 100
 MAX_SESSIONS_LIMIT = 500
+EPOCH = datetime(1970, 1, 1)
+DEFAULT_LEADERBOARD_LIMIT = 100
+MAX_LEADERBOARD_LIMIT = 500
 
 
 def register_endpoints(app):
+    # Returns sessions newest first, optionally of a provider, service type
+    # or client country. The next page is requested with the next_cursor
+    # of the previous one, which is null on the last page.
     @app.route('/v1/statistics/sessions', methods=['GET'])
     def sessions():
         limit = DEFAULT_SESSIONS_LIMIT
@@ -16,11 +30,29 @@ def register_endpoints(app):
             if limit > MAX_SESSIONS_LIMIT:
                 return jsonify({'error': 'Too many sessions requested'}), 400
 
-        sessions = get_sessions(limit=limit)
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = parse_session_cursor(request.args.get('cursor'))
+            except (ValueError, OverflowError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        sessions = get_sessions_page(
+            limit,
+            after,
+            node_key=request.args.get('provider_id'),
+            service_type=request.args.get('service_type'),
+            country=request.args.get('country')
+        )
         serialized = list(map(serialize_enriched_session, sessions))
 
+        next_cursor = None
+        if sessions and len(sessions) == limit:
+            next_cursor = format_session_cursor(sessions[-1])
+
         return jsonify({
-            'sessions': serialized
+            'sessions': serialized,
+            'next_cursor': next_cursor
         })
 
     @app.route('/v1/statistics/sessions/<key>')
@@ -30,6 +62,57 @@ def register_endpoints(app):
             return jsonify({'error': 'Session not found'}), 404
         return jsonify({'session': serialize_enriched_session(session)})
 
+    # Returns a page of the leaderboard as rows of values in the order of
+    # columns. The next page is requested with the next_cursor of the
+    # previous one, which is null on the last page.
+    @app.route('/v1/statistics/leaderboard', methods=['GET'])
+    def leaderboard():
+        name = request.args.get('leaderboard') or default_leaderboard_name()
+        config = get_leaderboard_config(name)
+        if config is None:
+            return jsonify({'error': 'Leaderboard not found'}), 404
+
+        try:
+            limit = int(request.args.get('limit', DEFAULT_LEADERBOARD_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit must be positive'}), 400
+        if limit > MAX_LEADERBOARD_LIMIT:
+            return jsonify({'error': 'Too many rows requested'}), 400
+
+        after = None
+        if request.args.get('cursor'):
+            try:
+                after = parse_cursor(request.args.get('cursor'))
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        page = leaderboard_response_cache.get(config, limit, after)
+        if etag_matches(page.etag, request.if_none_match):
+            return '', 304
+
+        response = Response(page.body, mimetype='application/json')
+        response.headers.set('Etag', format_etag(page.etag, None))
+        return response
+
+
+# format_session_cursor returns "<created_at in microseconds>:<session key>"
+# of the session.
+def format_session_cursor(session):
+    created_at = (session.created_at - EPOCH) // timedelta(microseconds=1)
+    return '{}:{}'.format(created_at, session.session_key)
+
+
+# parse_session_cursor reads a cursor made by format_session_cursor. It
+# raises ValueError when the cursor is malformed and OverflowError when
+# its time is out of range.
+def parse_session_cursor(cursor):
+    created_at, session_key = cursor.split(':', 1)
+    if not session_key:
+        raise ValueError('cursor has no session key')
+    return EPOCH + timedelta(microseconds=int(created_at)), session_key
+
 
 def serialize_enriched_session(session):
     return {
@@ -1,4 +1,7 @@
 from sqlalchemy import text
+from api.leaderboard_config import (
+    get_leaderboard_config, default_leaderboard_name, refreshed_at_state
+)
 from models import db, AVAILABILITY_TIMEOUT
 
 
@@ -32,7 +35,10 @@ class LeaderboardRow:
             )
 
 
-def get_leaderboard_rows(date_from, date_to):
+def get_leaderboard_rows(date_from, date_to, leaderboard=None):
+    config = get_leaderboard_config(leaderboard or default_leaderboard_name())
+    if config is None:
+        return []
     sql = text("""
         SELECT
             l.provider_id,
@@ -49,9 +55,50 @@ def get_leaderboard_rows(date_from, date_to):
         FROM dwh_leaderboard l
             LEFT JOIN node n ON n.node_key = l.provider_id AND n.service_type = l.service_type
             LEFT JOIN payments_tokens p ON p.provider_id = l.provider_id
-        ORDER BY l.hours_available DESC
-        """)
-    rows = db.engine.execute(sql).fetchall()
+        WHERE l.leaderboard = :leaderboard
+        ORDER BY l.{} DESC, l.provider_id
+        """.format(config.ranking))
+    rows = db.engine.execute(sql, leaderboard=config.name).fetchall()
     total_hours_in_range = round((date_to - date_from).total_seconds() / 3600)
     leaderboard_rows = [LeaderboardRow(r, total_hours_in_range) for r in rows]
     return leaderboard_rows
+
+
+def get_leaderboard_refreshed_at(leaderboard):
+    return db.engine.execute(
+        text('SELECT value FROM dwh_leaderboard_state WHERE name = :name'),
+        name=refreshed_at_state(leaderboard)
+    ).scalar()
+
+
+# get_leaderboard_page returns up to limit rows of the leaderboard ranked
+# after the (value, provider_id) cursor. Rows are ordered by the ranking
+# column, ties by provider_id, so a page is one range read.
+def get_leaderboard_page(config, limit, after=None):
+    keyset = ''
+    params = {'leaderboard': config.name, 'limit': limit}
+    if after is not None:
+        keyset = """
+          AND (l.{ranking} < :value
+               OR (l.{ranking} = :value AND l.provider_id > :provider_id))
+        """.format(ranking=config.ranking)
+        params['value'], params['provider_id'] = after
+
+    sql = text("""
+        SELECT
+            l.provider_id,
+            l.service_type,
+            l.country,
+            l.hours_available,
+            l.unique_users,
+            l.sessions,
+            l.data_transferred,
+            p.tokens
+        FROM dwh_leaderboard l
+            LEFT JOIN payments_tokens p ON p.provider_id = l.provider_id
+        WHERE l.leaderboard = :leaderboard
+        {keyset}
+        ORDER BY l.{ranking} DESC, l.provider_id
+        LIMIT :limit
+        """.format(ranking=config.ranking, keyset=keyset))
+    return db.engine.execute(sql, **params).fetchall()
@@ -1,13 +1,61 @@
-from models import NodeAvailability
+from datetime import datetime, timedelta
+from models import NodeAvailabilityHourly, truncate_to_hour
 from sqlalchemy import func
 
 
+# get_node_hours_online counts pings of the hourly buckets starting from
+# the hour date_from falls in until date_to, a bucket starting exactly at
+# date_to is left out.
 def get_node_hours_online(node_key, service_type, date_from, date_to) -> int:
-    query = NodeAvailability.query.with_entities(func.count()).filter(
-        NodeAvailability.node_key == node_key,
-        NodeAvailability.service_type == service_type,
-        date_from <= NodeAvailability.date,
-        NodeAvailability.date <= date_to
+    query = NodeAvailabilityHourly.query.with_entities(
+        func.coalesce(func.sum(NodeAvailabilityHourly.pings), 0)
+    ).filter(
+        NodeAvailabilityHourly.node_key == node_key,
+        NodeAvailabilityHourly.service_type == service_type,
+        truncate_to_hour(date_from) <= NodeAvailabilityHourly.hour,
+        NodeAvailabilityHourly.hour < date_to
     )
-    records_count = query.scalar()
-    return int(round(records_count / 20.0))
+    # SUM is returned as a decimal
+    return _pings_to_hours(int(query.scalar()))
+
+
+# get_node_availability returns hours online per day for the last days
+# days, today included, and for the last 24 hours, which are the current
+# hour bucket and the 23 before it. All of it is read with a single query
+# over the hourly buckets.
+def get_node_availability(node_key, service_type, days=7, now=None):
+    now = now or datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    date_from = today - timedelta(days=days - 1)
+    last_day_from = truncate_to_hour(now) - timedelta(hours=23)
+
+    rows = NodeAvailabilityHourly.query.with_entities(
+        NodeAvailabilityHourly.hour,
+        NodeAvailabilityHourly.pings
+    ).filter(
+        NodeAvailabilityHourly.node_key == node_key,
+        NodeAvailabilityHourly.service_type == service_type,
+        min(date_from, last_day_from) <= NodeAvailabilityHourly.hour,
+        NodeAvailabilityHourly.hour < now
+    ).all()
+
+    daily_pings = {}
+    last_day_pings = 0
+    for hour, pings in rows:
+        day = hour.replace(hour=0)
+        daily_pings[day] = daily_pings.get(day, 0) + pings
+        if hour >= last_day_from:
+            last_day_pings += pings
+
+    availability = []
+    for i in range(days - 1, -1, -1):
+        day = today - timedelta(days=i)
+        availability.append({
+            'day': day.strftime('%Y-%m-%d'),
+            'time_online': _pings_to_hours(daily_pings.get(day, 0)),
+        })
+    return availability, _pings_to_hours(last_day_pings)
+
+
+def _pings_to_hours(pings):
+    return int(round(pings / 20.0))
@@ -3,10 +3,10 @@ from queries import (
     filter_active_nodes,
     get_active_nodes_count_query
 )
-from api.stats.db_queries.node_availability import get_node_hours_online
+from api.stats.db_queries.node_availability import get_node_availability
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc, text
-from models import db, Node, Session
+from sqlalchemy import func, desc, text, and_, or_
+from models import db, Node, Session, SessionTotals, SESSION_TOTALS_ID
 
 
 def get_active_nodes_count():
@@ -36,23 +36,26 @@ def get_sessions_count_by_service_type(node_key, service_type):
     return query.scalar()
 
 
-def get_average_session_time():
-    sql = text("""select
-    AVG(TIME_TO_SEC(TIMEDIFF(client_updated_at, created_at)))
-    as averageDuration FROM session;""")
-    result = db.engine.execute(sql)
-    myrow = result.fetchone()
-    seconds = int(myrow[0]) if myrow[0] is not None else 0
-    return timedelta(seconds=seconds)
-
-
-def get_total_data_transferred():
-    sql = text("""select SUM(client_bytes_sent) as clientBytesSent,
-    SUM(client_bytes_received) as clientBytesReceived FROM session;""")
-    result = db.engine.execute(sql)
-    myrow = result.fetchone()
-    total_bytes = (myrow[0] or 0) + (myrow[1] or 0)
-    return total_bytes
+# get_session_totals returns network-wide session metrics from the
+# running totals, without reading the session table.
+def get_session_totals():
+    totals = SessionTotals.query.get(SESSION_TOTALS_ID)
+    if totals is None:
+        return {
+            'sessions_count': 0,
+            'average_session_time': timedelta(seconds=0),
+            'total_data_transferred': 0,
+        }
+
+    average_seconds = 0
+    if totals.timed_sessions:
+        average_seconds = totals.duration_seconds // totals.timed_sessions
+    return {
+        'sessions_count': totals.sessions,
+        'average_session_time': timedelta(seconds=average_seconds),
+        'total_data_transferred':
+            totals.client_bytes_sent + totals.client_bytes_received,
+    }
 
 
 def get_total_data_transferred_by_node(node_key, service_type):
@@ -112,30 +115,11 @@ def get_node_info(node_key, service_type):
         service_type
     )
 
-    availability = []
-
-    # 7 days
-    for i in range(6, -1, -1):
-        now = datetime.utcnow()
-        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        day = today - timedelta(days=i)
-        availability.append({
-            'day': day.strftime('%Y-%m-%d'),
-            'time_online': get_node_hours_online(
-                node_key,
-                service_type,
-                day,
-                day + timedelta(days=1)
-            )
-        })
-
-    node.availability = availability
-    node.uptime = '{} / 24 h'.format(get_node_hours_online(
+    node.availability, hours_online = get_node_availability(
         node_key,
-        service_type,
-        datetime.utcnow() - timedelta(days=1),
-        datetime.utcnow()
-    ))
+        service_type
+    )
+    node.uptime = '{} / 24 h'.format(hours_online)
     return node
 
 
@@ -173,6 +157,39 @@ def get_sessions(node_key=None, service_type=None, limit=None):
     return sessions
 
 
+# get_sessions_page returns up to limit sessions, newest first, created
+# before the (created_at, session_key) cursor. Every page is a range read
+# of one of the session created_at indexes.
+def get_sessions_page(limit, after=None, node_key=None, service_type=None,
+                      country=None):
+    sessions = Session.query
+    if node_key:
+        sessions = sessions.filter(Session.node_key == node_key)
+    if service_type:
+        sessions = sessions.filter(Session.service_type == service_type)
+    if country:
+        sessions = sessions.filter(Session.client_country == country)
+    if after is not None:
+        created_at, session_key = after
+        sessions = sessions.filter(or_(
+            Session.created_at < created_at,
+            and_(
+                Session.created_at == created_at,
+                Session.session_key < session_key
+            )
+        ))
+
+    sessions = sessions.order_by(
+        Session.created_at.desc(),
+        Session.session_key.desc()
+    ).limit(limit).all()
+
+    for se in sessions:
+        enrich_session_info(se)
+
+    return sessions
+
+
 def get_session_info(session_key):
     se = Session.query.get(session_key)
     if se is not None:
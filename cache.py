@@ -1,12 +1,129 @@
+import logging
+import math
+import random
+import threading
+import time
+from collections import namedtuple
+
 from beaker.cache import CacheManager
 from beaker.util import parse_cache_config_options
 
+from api import settings
+
+logger = logging.getLogger('cache')
+
+# CachedValue is how get_or_set stores a value: delta is how many seconds
+# computing it took, expires_at when it stops being fresh.
+CachedValue = namedtuple('CachedValue', ['value', 'delta', 'expires_at'])
+
+
+# cache_options builds beaker options from settings. The memory type is
+# private to a process, file and dbm types are shared by processes using
+# the same data dir, ext:memcached by everything using the same url.
+def cache_options():
+    cache_opts = {
+        'cache.type': settings.CACHE_TYPE,
+    }
+    if settings.CACHE_TYPE in ['file', 'dbm']:
+        cache_opts['cache.data_dir'] = settings.CACHE_DATA_DIR
+        cache_opts['cache.lock_dir'] = settings.CACHE_DATA_DIR + '/lock'
+    if settings.CACHE_URL:
+        cache_opts['cache.url'] = settings.CACHE_URL
+    return cache_opts
+
+
+# SharedCache gives a beaker cache the get and set methods of werkzeug
+# caches, get returns None for missing and expired keys.
+#
+# get_or_set computes a value at most once at a time per key in a process.
+# A value is refreshed a little before it expires, earlier the longer it
+# takes to compute (XFetch), and while one request refreshes it the others
+# keep getting the stale value for up to stale_timeout seconds. A marker
+# in the shared backend keeps other processes from refreshing it as well.
+class SharedCache:
+    def __init__(self, manager, namespace, clock=time.time,
+                 random=random.random):
+        self._cache = manager.get_cache(namespace)
+        self._clock = clock
+        self._random = random
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def get(self, key):
+        try:
+            return self._cache.get(key=key)
+        except KeyError:
+            return None
+
+    def set(self, key, value, timeout):
+        self._cache.put(key, value, expiretime=timeout)
+
+    def delete(self, key):
+        self._cache.remove_value(key)
+
+    def get_or_set(self, key, compute, timeout, stale_timeout=0, beta=1.0,
+                   refresh_timeout=30):
+        cached = self.get(key)
+        if cached is not None and \
+                not self._should_refresh(cached, self._clock(), beta):
+            return cached.value
+
+        lock = self._lock(key)
+        refreshing_key = key + ':refreshing'
+        if cached is not None:
+            if not lock.acquire(blocking=False):
+                return cached.value
+            if self.get(refreshing_key):
+                lock.release()
+                return cached.value
+        else:
+            lock.acquire()
+            cached = self.get(key)
+            if cached is not None and self._clock() < cached.expires_at:
+                lock.release()
+                return cached.value
+
+        try:
+            self.set(refreshing_key, True, timeout=refresh_timeout)
+            started = self._clock()
+            try:
+                value = compute()
+            except Exception:
+                if cached is None:
+                    raise
+                logger.error(
+                    "Failed to refresh {}, serving stale value:".format(key),
+                    exc_info=True
+                )
+                return cached.value
+            finally:
+                self.delete(refreshing_key)
+
+            now = self._clock()
+            self.set(
+                key,
+                CachedValue(value, now - started, now + timeout),
+                timeout=timeout + stale_timeout
+            )
+            return value
+        finally:
+            lock.release()
+
+    def _should_refresh(self, cached, now, beta):
+        # 1 - random() is in (0, 1], so the logarithm is defined
+        early = -cached.delta * beta * math.log(1 - self._random())
+        return now + early >= cached.expires_at
+
+    def _lock(self, key):
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
 
-cache_opts = {
-    'cache.type': 'memory',
-}
 
-cache = CacheManager(**parse_cache_config_options(cache_opts))
+cache = CacheManager(**parse_cache_config_options(cache_options()))
 sessionStatCallCache = cache.get_cache('sessionStatsCallCache', expire=45)
 proposalPingCallCache = cache.get_cache('propsalPingCallCache', expire=45)
 
@@ -7,8 +7,7 @@ from api.stats.db_queries.leaderboard import (
 from api.stats.model_layer import (
     get_active_nodes_count,
     get_sessions_count,
-    get_average_session_time,
-    get_total_data_transferred,
+    get_session_totals,
     get_available_nodes,
     get_node_info,
     get_sessions_country_stats,
@@ -16,10 +15,12 @@ from api.stats.model_layer import (
 from api.stats.node_list import get_nodes
 from dashboard.settings import (
     METRICS_CACHE_TIMEOUT,
-    VIEW_SESSIONS_CACHE_TIMEOUT
+    METRICS_CACHE_STALE_TIMEOUT,
+    VIEW_SESSIONS_CACHE_TIMEOUT,
+    VIEW_SESSIONS_CACHE_STALE_TIMEOUT
 )
 from api.settings import DB_CONFIG
-from werkzeug.contrib.cache import SimpleCache
+from cache import cache as cache_manager, SharedCache
 from dashboard.helpers import get_month_range
 from flask import Flask, render_template, request, abort, jsonify
 from datetime import datetime
@@ -32,7 +33,7 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
-cache = SimpleCache()
+cache = SharedCache(cache_manager, 'dashboard')
 
 initialize_filters(app)
 
@@ -48,23 +49,22 @@ app.config['SQLALCHEMY_DATABASE_URI'] =\
 
 
 def collect_metrics():
-    metrics = cache.get('metrics')
-    if metrics is None:
-        metrics = {
-            'active_nodes_count': get_active_nodes_count(),
-            'sessions_count': get_sessions_count(),
-            'active_sessions_count': get_sessions_count(
-                only_active_sessions=True
-            ),
-            'average_session_time': get_average_session_time(),
-            'total_data_transferred': get_total_data_transferred(),
-        }
-        cache.set(
-            'metrics',
-            metrics,
-            timeout=METRICS_CACHE_TIMEOUT
-        )
-    return metrics
+    return cache.get_or_set(
+        'metrics',
+        compute_metrics,
+        timeout=METRICS_CACHE_TIMEOUT,
+        stale_timeout=METRICS_CACHE_STALE_TIMEOUT
+    )
+
+
+def compute_metrics():
+    return {
+        'active_nodes_count': get_active_nodes_count(),
+        'active_sessions_count': get_sessions_count(
+            only_active_sessions=True
+        ),
+        **get_session_totals(),
+    }
 
 
 @app.route('/')
@@ -94,7 +94,9 @@ def main():
 @app.route('/leaderboard')
 def leaderboard():
     date_from, date_to = get_month_range(datetime.utcnow().date())
-    leaderboard_rows = get_leaderboard_rows(date_from, date_to)
+    leaderboard_rows = get_leaderboard_rows(
+        date_from, date_to, request.args.get('leaderboard')
+    )
     page_data = {
         'date_from': date_from.strftime('%b %d, %Y'),
         'date_to': date_to.strftime('%b %d, %Y'),
@@ -137,14 +139,12 @@ def session(key):
 
 @app.route('/sessions')
 def sessions():
-    sessions = cache.get('all-sessions')
-    if sessions is None:
-        sessions = fetch_sessions(limit=500)
-        cache.set(
-            'all-sessions',
-            sessions,
-            timeout=VIEW_SESSIONS_CACHE_TIMEOUT
-        )
+    sessions = cache.get_or_set(
+        'all-sessions',
+        lambda: fetch_sessions(limit=500),
+        timeout=VIEW_SESSIONS_CACHE_TIMEOUT,
+        stale_timeout=VIEW_SESSIONS_CACHE_STALE_TIMEOUT
+    )
 
     return render_template(
         'sessions.html',
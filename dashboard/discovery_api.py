@@ -1,17 +1,88 @@
-import requests
+import threading
+import time
 from json import JSONDecodeError
-from typing import List, Optional
-
-from dashboard.settings import API_HOST
+from typing import Callable, List, Optional
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-REQUEST_TIMEOUT = 5
+from dashboard.settings import (
+    API_HOST,
+    DISCOVERY_API_POOL_SIZE,
+    DISCOVERY_API_RETRIES,
+    DISCOVERY_API_CONNECT_TIMEOUT,
+    DISCOVERY_API_READ_TIMEOUT,
+    DISCOVERY_API_BREAKER_FAILURES,
+    DISCOVERY_API_BREAKER_RESET_TIMEOUT,
+)
 
 
 class ApiError(Exception):
     pass
 
 
+# CircuitBreaker stops calling the api after failure_threshold failures
+# in a row. Once reset_timeout seconds pass one trial call is let through,
+# its success closes the breaker again.
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self._reset_timeout:
+                return False
+            # let one trial call through, later ones wait for its result
+            self._opened_at = self._clock()
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self._failure_threshold:
+                self._opened_at = self._clock()
+
+
+def _create_session() -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=DISCOVERY_API_POOL_SIZE,
+        max_retries=Retry(
+            total=DISCOVERY_API_RETRIES,
+            # a request which timed out reading is not worth waiting again
+            read=0,
+            backoff_factor=0.1,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False
+        )
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = _create_session()
+circuit_breaker = CircuitBreaker(
+    DISCOVERY_API_BREAKER_FAILURES,
+    DISCOVERY_API_BREAKER_RESET_TIMEOUT
+)
+
+
 def fetch_sessions(limit: int) -> List[any]:
     params = {'limit': limit}
     return _make_request('/v1/statistics/sessions', 'sessions', params)
@@ -22,14 +93,21 @@ def fetch_session(key: str) -> any:
 
 
 def _make_request(path: str, response_key: str, params: any = None) -> any:
+    if not circuit_breaker.allow():
+        raise ApiError('Discovery api is unavailable')
     try:
-        response = requests.get(
+        response = _session.get(
             API_HOST + path,
-            params,
-            timeout=REQUEST_TIMEOUT
+            params=params,
+            timeout=(DISCOVERY_API_CONNECT_TIMEOUT, DISCOVERY_API_READ_TIMEOUT)
         )
     except requests.exceptions.RequestException as err:
+        circuit_breaker.record_failure()
         raise ApiError('Request failed') from err
+    if response.status_code >= 500:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.record_success()
     if response.status_code != 200:
         api_error = _parse_response_json_error(response)
         error_message = _format_response_error_message(
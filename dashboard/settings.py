@@ -2,8 +2,28 @@ import os
 
 API_HOST = os.environ.get('API_HOST') or 'http://localhost:8001'
 
-METRICS_CACHE_TIMEOUT = os.environ.get('METRICS_CACHE_TIMEOUT') \
-                        or 5 * 60  # in seconds
+METRICS_CACHE_TIMEOUT = int(os.environ.get('METRICS_CACHE_TIMEOUT')
+                            or 5 * 60)  # in seconds
+# in seconds, how long expired metrics are served while being refreshed
+METRICS_CACHE_STALE_TIMEOUT = int(os.environ.get('METRICS_CACHE_STALE_TIMEOUT')
+                                  or 5 * 60)
 
-VIEW_SESSIONS_CACHE_TIMEOUT = os.environ.get('VIEW_SESSIONS_CACHE_TIMEOUT') \
-                        or 1 * 60  # in seconds
+VIEW_SESSIONS_CACHE_TIMEOUT = int(os.environ.get('VIEW_SESSIONS_CACHE_TIMEOUT')
+                                  or 1 * 60)  # in seconds
+# in seconds, how long expired sessions are served while being refreshed
+VIEW_SESSIONS_CACHE_STALE_TIMEOUT = int(os.environ.get('VIEW_SESSIONS_CACHE_STALE_TIMEOUT')
+                                        or 5 * 60)
+
+# connections kept alive to the api
+DISCOVERY_API_POOL_SIZE = int(os.environ.get('DISCOVERY_API_POOL_SIZE') or 10)
+# retries of failed connections and 502, 503 and 504 responses
+DISCOVERY_API_RETRIES = int(os.environ.get('DISCOVERY_API_RETRIES') or 2)
+DISCOVERY_API_CONNECT_TIMEOUT = float(os.environ.get('DISCOVERY_API_CONNECT_TIMEOUT')
+                                      or 1)  # in seconds
+DISCOVERY_API_READ_TIMEOUT = float(os.environ.get('DISCOVERY_API_READ_TIMEOUT')
+                                   or 5)  # in seconds
+# failures in a row which stop calls to the api for the reset timeout
+DISCOVERY_API_BREAKER_FAILURES = int(os.environ.get('DISCOVERY_API_BREAKER_FAILURES')
+                                     or 5)
+DISCOVERY_API_BREAKER_RESET_TIMEOUT = float(os.environ.get('DISCOVERY_API_BREAKER_RESET_TIMEOUT')
+                                            or 30)  # in seconds
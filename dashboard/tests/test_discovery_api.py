@@ -0,0 +1,54 @@
+import unittest
+import responses
+
+from dashboard.discovery_api import (
+    ApiError,
+    CircuitBreaker,
+    circuit_breaker,
+    fetch_session,
+    fetch_sessions,
+)
+from tests.utils import FakeClock
+
+SESSIONS_URL = 'http://localhost:8001/v1/statistics/sessions'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_failures_in_a_row(self):
+        breaker = CircuitBreaker(2, 30, FakeClock())
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_lets_one_trial_call_through_after_reset_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(1, 30, clock)
+        breaker.record_failure()
+
+        clock.now = 30
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+
+class TestDiscoveryApi(unittest.TestCase):
+    def tearDown(self):
+        circuit_breaker.record_success()
+
+    @responses.activate
+    def test_requests_stop_when_api_keeps_failing(self):
+        responses.add(responses.GET, SESSIONS_URL, status=500)
+        for _ in range(5):
+            with self.assertRaises(ApiError):
+                fetch_sessions(limit=10)
+        calls = len(responses.calls)
+
+        with self.assertRaisesRegex(ApiError, 'unavailable'):
+            fetch_sessions(limit=10)
+        self.assertEqual(calls, len(responses.calls))
@@ -1,6 +1,17 @@
-from web3 import Web3, HTTPProvider
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from web3 import Web3
 from web3.middleware import geth_poa_middleware
 from abi import IDENTITY_CONTRACT_ABI
+from rpc_provider import PooledHTTPProvider
+
+logger = logging.getLogger('identity_contract')
 
 
 class IdentityContract:
@@ -8,9 +19,14 @@ class IdentityContract:
     contract = None
 
     def __init__(self, provider_endpoint_uri, contract_address,
-                 mining_mode='pow'):
+                 mining_mode='pow', max_connections=10, timeout=10):
 
-        self.web3 = Web3(HTTPProvider(provider_endpoint_uri))
+        self.provider = PooledHTTPProvider(
+            provider_endpoint_uri,
+            max_connections=max_connections,
+            timeout=timeout
+        )
+        self.web3 = Web3(self.provider)
 
         if mining_mode == 'poa':
             self.web3.middleware_stack.inject(geth_poa_middleware, layer=0)
@@ -24,6 +40,173 @@ class IdentityContract:
         checksum_address = self.web3.toChecksumAddress(identity)
         return self.contract.functions.isRegistered(checksum_address).call()
 
+    # is_registered_many checks all identities with a single JSON-RPC batch
+    # request. Each answer is either a bool or the exception of its call.
+    def is_registered_many(self, identities):
+        batch = []
+        for i, identity in enumerate(identities):
+            data = self.contract.encodeABI(
+                fn_name='isRegistered',
+                args=[self.web3.toChecksumAddress(identity)]
+            )
+            batch.append({
+                'jsonrpc': '2.0',
+                'id': i,
+                'method': 'eth_call',
+                'params': [{'to': self.contract.address, 'data': data}, 'latest'],
+            })
+
+        raw_response = self.provider.post(
+            'eth_call_batch',
+            json.dumps(batch).encode()
+        )
+        responses = {r.get('id'): r for r in json.loads(raw_response)}
+
+        results = []
+        for i in range(len(identities)):
+            response = responses.get(i)
+            if response is None:
+                results.append(Exception('Missing JSON-RPC response'))
+            elif 'error' in response:
+                results.append(Exception(response['error']))
+            else:
+                try:
+                    results.append(decode_registered(response['result']))
+                except (KeyError, TypeError, ValueError) as err:
+                    results.append(err)
+        return results
+
+
+# decode_registered reads the result of an isRegistered eth_call. An empty
+# result ("0x") is what a node returns for a call without return data, it
+# counts as not registered.
+def decode_registered(result):
+    if not result or result == '0x':
+        return False
+    return int(result, 16) != 0
+
+
+# CachedIdentityContract keeps is_registered results of the wrapped
+# contract. Positive results are fresh for ttl seconds and are then served
+# for another stale_ttl seconds while a background refresh runs. Negative
+# results are kept for negative_ttl seconds only, so a freshly registered
+# identity is not rejected for long.
+class CachedIdentityContract:
+    def __init__(self, contract, ttl, negative_ttl, stale_ttl,
+                 max_size=100000, refresh_workers=2, clock=time.monotonic):
+        self.contract = contract
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._stale_ttl = stale_ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers)
+
+    def is_registered(self, identity):
+        identity = identity.lower()
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(identity)
+
+        if entry is not None:
+            registered, checked_at = entry
+            age = now - checked_at
+            if registered:
+                if age < self._ttl:
+                    return True
+                if age < self._ttl + self._stale_ttl:
+                    self._refresh_in_background(identity)
+                    return True
+            elif age < self._negative_ttl:
+                return False
+
+        return self._refresh(identity)
+
+    def _refresh(self, identity):
+        registered = self.contract.is_registered(identity)
+        with self._lock:
+            self._entries[identity] = (registered, self._clock())
+            self._entries.move_to_end(identity)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return registered
+
+    def _refresh_in_background(self, identity):
+        with self._lock:
+            if identity in self._refreshing:
+                return
+            self._refreshing.add(identity)
+        self._executor.submit(self._background_refresh, identity)
+
+    def _background_refresh(self, identity):
+        try:
+            self._refresh(identity)
+        except Exception:
+            logger.error("Failed to refresh identity registration:",
+                         exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(identity)
+
+
+# BatchedIdentityContract coalesces is_registered calls that arrive within
+# batch_window seconds of each other into one JSON-RPC batch of up to
+# batch_size identities. Each caller still gets its own answer. It only
+# helps when requests are served by several threads, under the
+# single-threaded WSGIContainer of server.py calls never overlap and each
+# one just waits out the window.
+class BatchedIdentityContract:
+    def __init__(self, contract, batch_size=50, batch_window=0.005,
+                 timeout=None, workers=4):
+        self.contract = contract
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def is_registered(self, identity):
+        future = Future()
+        self._pending.put((identity.lower(), future))
+        return future.result(timeout=self._timeout)
+
+    def _dispatch(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self._batch_window
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._pending.get(timeout=remaining))
+                    else:
+                        batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._resolve, batch)
+
+    def _resolve(self, batch):
+        waiting = OrderedDict()
+        for identity, future in batch:
+            waiting.setdefault(identity, []).append(future)
+
+        try:
+            results = self.contract.is_registered_many(list(waiting))
+        except Exception as err:
+            results = [err] * len(waiting)
+
+        for futures, result in zip(waiting.values(), results):
+            for future in futures:
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
 
 class IdentityContractFake:
     registered = None
@@ -0,0 +1,26 @@
+"""Index availability dates for retention deletes
+
+Revision ID: 3c5e1f0a9d27
+Revises: 8aa029721ebc
+Create Date: 2026-10-18 07:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c5e1f0a9d27'
+down_revision = '8aa029721ebc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_node_availability_date'), 'node_availability', ['date'], unique=False)
+    op.create_index(op.f('ix_node_availability_hourly_hour'), 'node_availability_hourly', ['hour'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_node_availability_hourly_hour'), table_name='node_availability_hourly')
+    op.drop_index(op.f('ix_node_availability_date'), table_name='node_availability')
@@ -0,0 +1,52 @@
+"""Refresh leaderboard incrementally from the api instead of an event
+
+Revision ID: 5d2b7c4e8f10
+Revises: 3c5e1f0a9d27
+Create Date: 2026-10-18 08:00:00.000000
+
+"""
+import importlib.util
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b7c4e8f10'
+down_revision = '3c5e1f0a9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute("DROP EVENT IF EXISTS evt_refresh_dwh_leaderboard")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dwh_leaderboard_state
+    (
+        name  VARCHAR(64) PRIMARY KEY,
+        value DATETIME
+    );
+    """)
+
+    conn.execute("""
+    ALTER TABLE dwh_leaderboard_availability
+        ADD COLUMN pings BIGINT UNSIGNED NOT NULL DEFAULT 0;
+    """)
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute("ALTER TABLE dwh_leaderboard_availability DROP COLUMN pings")
+    conn.execute("DROP TABLE IF EXISTS dwh_leaderboard_state")
+
+    # restore the event of the previous revision
+    path = os.path.join(os.path.dirname(__file__), '8aa029721ebc_.py')
+    spec = importlib.util.spec_from_file_location('hourly_availability', path)
+    previous = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(previous)
+    conn.execute(previous.LEADERBOARD_EVENT.format(
+        availability=previous.HOURLY_AVAILABILITY.strip('\n')
+    ))
@@ -0,0 +1,61 @@
+"""Keep rows of several leaderboards and service types in leaderboard tables
+
+Revision ID: 6e3f8a1b2c4d
+Revises: 5d2b7c4e8f10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e3f8a1b2c4d'
+down_revision = '5d2b7c4e8f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table in ['dwh_leaderboard', 'dwh_leaderboard_nodes']:
+        conn.execute("""
+        ALTER TABLE {}
+            ADD COLUMN leaderboard VARCHAR(64) NOT NULL DEFAULT 'monthly' FIRST,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (leaderboard, provider_id);
+        """.format(table))
+
+    for table in ['dwh_leaderboard_availability', 'dwh_leaderboard_session_stats']:
+        conn.execute("""
+        ALTER TABLE {}
+            ADD COLUMN service_type VARCHAR(255) NOT NULL DEFAULT 'openvpn' FIRST,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (service_type, provider_id);
+        """.format(table))
+
+    # watermarks are kept per service type now
+    conn.execute("DELETE FROM dwh_leaderboard_state")
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table in ['dwh_leaderboard', 'dwh_leaderboard_nodes']:
+        conn.execute("DELETE FROM {} WHERE leaderboard != 'monthly'".format(table))
+        conn.execute("""
+        ALTER TABLE {}
+            DROP PRIMARY KEY,
+            DROP COLUMN leaderboard,
+            ADD PRIMARY KEY (provider_id);
+        """.format(table))
+
+    for table in ['dwh_leaderboard_availability', 'dwh_leaderboard_session_stats']:
+        conn.execute("DELETE FROM {} WHERE service_type != 'openvpn'".format(table))
+        conn.execute("""
+        ALTER TABLE {}
+            DROP PRIMARY KEY,
+            DROP COLUMN service_type,
+            ADD PRIMARY KEY (provider_id);
+        """.format(table))
+
+    conn.execute("DELETE FROM dwh_leaderboard_state")
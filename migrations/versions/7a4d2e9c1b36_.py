@@ -0,0 +1,45 @@
+"""Keep running totals of sessions
+
+Revision ID: 7a4d2e9c1b36
+Revises: 6e3f8a1b2c4d
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4d2e9c1b36'
+down_revision = '6e3f8a1b2c4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('session_totals',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('sessions', sa.BigInteger(), nullable=False),
+    sa.Column('timed_sessions', sa.BigInteger(), nullable=False),
+    sa.Column('duration_seconds', sa.BigInteger(), nullable=False),
+    sa.Column('client_bytes_sent', sa.BigInteger(), nullable=False),
+    sa.Column('client_bytes_received', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    conn = op.get_bind()
+    conn.execute("""
+    INSERT INTO session_totals
+    SELECT
+        1,
+        COUNT(*),
+        COUNT(client_updated_at),
+        COALESCE(SUM(TIME_TO_SEC(TIMEDIFF(client_updated_at, created_at))), 0),
+        COALESCE(SUM(client_bytes_sent), 0),
+        COALESCE(SUM(client_bytes_received), 0)
+    FROM session;
+    """)
+
+
+def downgrade():
+    op.drop_table('session_totals')
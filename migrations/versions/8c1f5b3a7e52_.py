@@ -0,0 +1,34 @@
+"""Index sessions for paging newest first
+
+Revision ID: 8c1f5b3a7e52
+Revises: 7a4d2e9c1b36
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1f5b3a7e52'
+down_revision = '7a4d2e9c1b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('session_created_at_index', 'session', ['created_at', 'session_key'], unique=False)
+    op.create_index('session_node_key_created_at_index', 'session', ['node_key', 'created_at'], unique=False)
+    # covered by session_node_key_created_at_index
+    op.drop_index(op.f('ix_session_node_key'), table_name='session')
+    op.create_index('session_service_type_created_at_index', 'session', ['service_type', 'created_at'], unique=False)
+    op.create_index('session_client_country_created_at_index', 'session', ['client_country', 'created_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('session_client_country_created_at_index', table_name='session')
+    op.drop_index('session_service_type_created_at_index', table_name='session')
+    op.create_index(op.f('ix_session_node_key'), 'session', ['node_key'], unique=False)
+    op.drop_index('session_node_key_created_at_index', table_name='session')
+    op.drop_index('session_created_at_index', table_name='session')
@@ -99,7 +99,7 @@ class Session(db.Model):
 
     session_key = db.Column(db.String(SESSION_KEY_LIMIT), primary_key=True)
     # TODO: rename to provider_id
-    node_key = db.Column(db.String(IDENTITY_LENGTH_LIMIT), index=True)
+    node_key = db.Column(db.String(IDENTITY_LENGTH_LIMIT))
     created_at = db.Column(db.DateTime)
     node_updated_at = db.Column(db.DateTime)
     client_updated_at = db.Column(db.DateTime, index=True)
@@ -131,11 +131,43 @@ class Session(db.Model):
         return datetime.utcnow() - last_session_activity > SESSION_EXPIRATION
 
 
+# indexes for paging sessions newest first, alone or by a filter
+Index('session_created_at_index', Session.created_at, Session.session_key)
+Index(
+    'session_node_key_created_at_index',
+    Session.node_key, Session.created_at
+)
+Index(
+    'session_service_type_created_at_index',
+    Session.service_type, Session.created_at
+)
+Index(
+    'session_client_country_created_at_index',
+    Session.client_country, Session.created_at
+)
+
+
+# SessionTotals holds network-wide running totals of all sessions in its
+# only row, updated whenever session stats are written.
+class SessionTotals(db.Model):
+    __tablename__ = 'session_totals'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sessions = db.Column(db.BigInteger, nullable=False, default=0)
+    # sessions which reported stats at least once and so have a duration
+    timed_sessions = db.Column(db.BigInteger, nullable=False, default=0)
+    duration_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+    client_bytes_sent = db.Column(db.BigInteger, nullable=False, default=0)
+    client_bytes_received = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+SESSION_TOTALS_ID = 1
+
+
 class NodeAvailability(db.Model):
     __tablename__ = 'node_availability'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     node_key = db.Column(db.String(IDENTITY_LENGTH_LIMIT))
-    date = db.Column(db.DateTime)
+    date = db.Column(db.DateTime, index=True)
     service_type = db.Column(db.String(255), nullable=False)
 
     def __init__(self, node_key):
@@ -149,6 +181,26 @@ Index(
 )
 
 
+# NodeAvailabilityHourly counts node pings per hour, the hour is the
+# start of the hour the pings were received in.
+class NodeAvailabilityHourly(db.Model):
+    __tablename__ = 'node_availability_hourly'
+    node_key = db.Column(db.String(IDENTITY_LENGTH_LIMIT), primary_key=True)
+    service_type = db.Column(db.String(255), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True, index=True)
+    pings = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, node_key, service_type, hour, pings=0):
+        self.node_key = node_key
+        self.service_type = service_type
+        self.hour = hour
+        self.pings = pings
+
+
+def truncate_to_hour(date):
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
 class Identity(db.Model):
     __tablename__ = 'identity'
     identity = db.Column(db.String(IDENTITY_LENGTH_LIMIT), primary_key=True)
@@ -1,14 +1,31 @@
 import binascii
+import logging
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from functools import wraps
 import json
 from flask import request, jsonify
 from api import settings
 import base64
 from signature import (
+    RecoveryCache,
+    RecoveryPool,
     recover_public_address,
+    recover_public_address_cached,
     ValidationError as SignatureValidationError
 )
 
+logger = logging.getLogger('request_helpers')
+
+recovery_cache = RecoveryCache(settings.SIGNATURE_CACHE_SIZE)
+recovery_pool = None
+if settings.SIGNATURE_RECOVERY_WORKERS > 0:
+    recovery_pool = RecoveryPool(
+        settings.SIGNATURE_RECOVERY_WORKERS,
+        settings.SIGNATURE_RECOVERY_BATCH_SIZE,
+        settings.SIGNATURE_RECOVERY_BATCH_WINDOW,
+    )
+
 
 def is_json_dict(data):
     try:
@@ -81,9 +98,29 @@ def decode_authorization_header(headers):
         raise ValueError('signature must be base64 encoded: {0}'.format(err))
 
     try:
-        return recover_public_address(
+        return recover_public_address_cached(
+            recovery_cache,
             request.data,
             signature_bytes,
+            recover=recover_caller_address,
         ).lower()
     except SignatureValidationError as err:
         raise ValueError('invalid signature format: {0}'.format(err))
+
+
+# recover_caller_address recovers in the request thread when the recovery
+# pool times out or one of its workers died, and restarts the pool.
+def recover_caller_address(message, signature_bytes):
+    if recovery_pool is None:
+        return recover_public_address(message, signature_bytes)
+    try:
+        return recovery_pool.recover(
+            message,
+            signature_bytes,
+            timeout=settings.SIGNATURE_RECOVERY_TIMEOUT
+        )
+    except (FuturesTimeoutError, BrokenProcessPool):
+        logger.error("Signature recovery pool failed, restarting it:",
+                     exc_info=True)
+        recovery_pool.restart()
+        return recover_public_address(message, signature_bytes)
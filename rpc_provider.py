@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+logger = logging.getLogger('rpc_provider')
+
+
+# RPCLatencyStats collects how long JSON-RPC calls take, per method.
+class RPCLatencyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def record(self, method, seconds, failed=False):
+        with self._lock:
+            stats = self._methods.setdefault(method, {
+                'calls': 0,
+                'errors': 0,
+                'total_seconds': 0.0,
+                'max_seconds': 0.0,
+            })
+            stats['calls'] += 1
+            if failed:
+                stats['errors'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for method, stats in self._methods.items():
+                result[method] = dict(
+                    stats,
+                    average_seconds=stats['total_seconds'] / stats['calls']
+                )
+            return result
+
+
+# PooledHTTPProvider sends JSON-RPC requests through its own keep-alive
+# session. At most max_connections requests are in flight at once, the
+# rest wait for a free connection instead of opening new ones.
+class PooledHTTPProvider(HTTPProvider):
+    def __init__(self, endpoint_uri, max_connections=10, timeout=10,
+                 latency_stats=None):
+        super().__init__(endpoint_uri, request_kwargs={'timeout': timeout})
+        self.latency_stats = latency_stats or RPCLatencyStats()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_connections,
+            pool_block=True
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        return self.decode_rpc_response(self.post(method, request_data))
+
+    def post(self, method, request_data):
+        with self._slots:
+            started = time.monotonic()
+            failed = True
+            try:
+                response = self._session.post(
+                    self.endpoint_uri,
+                    data=request_data,
+                    **self.get_request_kwargs()
+                )
+                response.raise_for_status()
+                failed = False
+                return response.content
+            finally:
+                elapsed = time.monotonic() - started
+                self.latency_stats.record(method, elapsed, failed)
+                logger.debug("RPC %s took %.3fs", method, elapsed)
+
+    def close(self):
+        self._session.close()
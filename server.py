@@ -1,20 +1,68 @@
+import signal
+
 from tornado.wsgi import WSGIContainer
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
+from tornado.web import Application, FallbackHandler
 
 from api.node_payments_worker import start_node_payments_worker
 from api.node_monitoring_worker import start_node_monitoring_worker
-from api.node_availability_worker import start_node_availability_worker, node_availability_queue
+from api.node_availability_worker import (
+    start_node_availability_worker, stop_node_availability_worker, node_availability_queue
+)
+from api.node_heartbeat_worker import start_node_heartbeat_worker, node_heartbeats
+from api.session_stats_worker import (
+    start_session_stats_worker, stop_session_stats_worker, session_stats_pipeline
+)
+from api.retention_worker import start_retention_worker
+from api.leaderboard_worker import start_leaderboard_worker
+from api.metrics_worker import start_metrics_worker
+from api.proposals import rpc_latency_stats
+from api.proposal_index import load_proposal_index, proposal_index
+from api.proposal_index_worker import start_proposal_index_worker
+from api.proposal_stream import ProposalStreamHandler, start_proposal_stream
 from app import app, init_db
+from request_helpers import recovery_cache
 from api import settings
 from models import db
 
 print('starting server')
 init_db()
+if settings.PROPOSALS_INDEX_ENABLED:
+    loaded_from = load_proposal_index(db.get_engine(app))
+    start_proposal_index_worker(db.get_engine(app), loaded_from)
 start_node_payments_worker(db.get_engine(app))
 start_node_monitoring_worker(db.get_engine(app))
 start_node_availability_worker(db.get_engine(app), node_availability_queue)
+start_node_heartbeat_worker(db.get_engine(app), node_heartbeats)
+start_session_stats_worker(db.get_engine(app), session_stats_pipeline)
+start_retention_worker(db.get_engine(app))
+start_leaderboard_worker(db.get_engine(app))
+start_metrics_worker([
+    ('Identity contract RPC latency', rpc_latency_stats.stats),
+    ('Signature recovery cache', recovery_cache.stats),
+])
+
+io_loop = IOLoop.instance()
+handlers = []
+if settings.PROPOSALS_INDEX_ENABLED:
+    # streaming consumers are served on the IOLoop, everything else by Flask
+    broadcaster = start_proposal_stream(proposal_index, io_loop)
+    handlers.append((r'/v1/proposals/stream', ProposalStreamHandler, dict(broadcaster=broadcaster)))
+handlers.append((r'.*', FallbackHandler, dict(fallback=WSGIContainer(app))))
 
-http_server = HTTPServer(WSGIContainer(app))
+http_server = HTTPServer(Application(handlers))
 http_server.listen(settings.APP_PORT)
-IOLoop.instance().start()
+
+
+# shutdown stops taking requests and writes queued data before exiting
+def shutdown():
+    print('stopping server')
+    http_server.stop()
+    stop_node_availability_worker(settings.SHUTDOWN_DRAIN_TIMEOUT)
+    stop_session_stats_worker(settings.SHUTDOWN_DRAIN_TIMEOUT)
+    io_loop.stop()
+
+
+signal.signal(signal.SIGTERM, lambda signum, frame: io_loop.add_callback_from_signal(shutdown))
+io_loop.start()
@@ -1,4 +1,10 @@
 import base64
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
 
 from eth_keys.datatypes import Signature
 from eth_keys.exceptions import ValidationError
@@ -18,3 +24,161 @@ def recover_public_address(message, signature_bytes):
         public_key_bytes_to_address(public_key.to_bytes())
     )
     return public_address
+
+
+# RecoveryCache remembers addresses recovered from (message, signature)
+# pairs, so retried and duplicated requests skip the public key recovery.
+class RecoveryCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            address = self._entries.get(key)
+            if address is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return address
+
+    def put(self, key, address):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = address
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+        }
+
+
+def recovery_cache_key(message, signature_bytes):
+    return hashlib.sha256(message).digest() + signature_bytes
+
+
+def recover_public_address_cached(cache, message, signature_bytes,
+                                  recover=recover_public_address):
+    key = recovery_cache_key(message, signature_bytes)
+    address = cache.get(key)
+    if address is None:
+        address = recover(message, signature_bytes)
+        cache.put(key, address)
+    return address
+
+
+# recover_public_addresses runs in pool worker processes. Errors are
+# returned next to the results, so a single bad signature does not fail
+# the whole batch.
+def recover_public_addresses(items):
+    results = []
+    for message, signature_bytes in items:
+        try:
+            results.append((recover_public_address(message, signature_bytes),
+                            None))
+        except Exception as err:
+            results.append((None, err))
+    return results
+
+
+# RecoveryPool runs public key recovery in worker processes, so concurrent
+# requests are not serialized on one interpreter's GIL. Recoveries that
+# arrive within batch_window seconds of each other are sent to a worker
+# as one batch of up to batch_size items. It only helps when requests are
+# served by several threads, under the single-threaded WSGIContainer of
+# server.py requests never overlap and each recovery just pays for the
+# inter-process call and the batch window.
+class RecoveryPool:
+    def __init__(self, workers, batch_size=16, batch_window=0.0):
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+        self._pending = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def recover(self, message, signature_bytes, timeout=None):
+        future = Future()
+        self._pending.put((message, signature_bytes, future))
+        return future.result(timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    # restart replaces the worker processes, for example after one of them
+    # died and broke the executor. Work sent to the old ones is left to
+    # finish or fail.
+    def restart(self):
+        with self._lock:
+            previous = self._executor
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+        previous.shutdown(wait=False)
+
+    def _dispatch(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self._batch_window
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._pending.get(timeout=remaining))
+                    else:
+                        batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._submit(batch)
+
+    def _submit(self, batch):
+        futures = [f for _, _, f in batch]
+        with self._lock:
+            executor = self._executor
+        try:
+            result = executor.submit(
+                recover_public_addresses,
+                [(m, s) for m, s, _ in batch]
+            )
+        except Exception as err:
+            for f in futures:
+                f.set_exception(err)
+            return
+        result.add_done_callback(
+            lambda done: _resolve_batch(done, futures)
+        )
+
+
+def _resolve_batch(done, futures):
+    try:
+        results = done.result()
+    except Exception as err:
+        for f in futures:
+            f.set_exception(err)
+        return
+    for f, (address, error) in zip(futures, results):
+        if error is None:
+            f.set_result(address)
+        else:
+            f.set_exception(error)
@@ -1,52 +1,120 @@
-from api.stats.db_queries.node_availability import get_node_hours_online
+from api.stats.db_queries.node_availability import (
+    get_node_hours_online,
+    get_node_availability
+)
 from tests.test_case import TestCase
-from models import db, NodeAvailability
+from models import db, NodeAvailabilityHourly
 from datetime import datetime, timedelta
 
-now = datetime.utcnow()
+hour = datetime(2020, 5, 1, 10)
 second = timedelta(seconds=1)
 
 
 class TestNodeAvailability(TestCase):
     def test_result_is_rounded_to_hour(self):
-        for x in range(11):
-            self._create_node_availability('node key', 'service type', now)
+        self._create_node_availability('node key', 'service type', hour, 11)
 
         hours = get_node_hours_online(
             'node key',
             'service type',
-            now - second,
-            now + second
+            hour + second,
+            hour + 2 * second
         )
         self.assertEqual(1, hours)
 
-    def test_not_match_query_params(self):
-        for x in range(11):
+    def test_hours_are_summed(self):
+        for x in range(3):
             self._create_node_availability(
-                'node key other', 'service type', now
+                'node key', 'service type', hour + timedelta(hours=x), 20
             )
 
-        for x in range(11):
-            self._create_node_availability(
-                'node key', 'service type other', now
-            )
+        hours = get_node_hours_online(
+            'node key',
+            'service type',
+            hour,
+            hour + timedelta(hours=2)
+        )
+        self.assertEqual(2, hours)
 
-        for x in range(11):
-            self._create_node_availability(
-                'node key', 'service type', now + second
-            )
+    def test_not_match_query_params(self):
+        self._create_node_availability(
+            'node key other', 'service type', hour, 11
+        )
+        self._create_node_availability(
+            'node key', 'service type other', hour, 11
+        )
+        self._create_node_availability(
+            'node key', 'service type', hour + timedelta(hours=1), 11
+        )
 
         hours = get_node_hours_online(
             'node key',
             'service type',
-            now,
-            now
+            hour,
+            hour + timedelta(hours=1)
         )
         self.assertEqual(0, hours)
 
+    def test_availability_histogram(self):
+        now = datetime(2020, 5, 7, 12, 30)
+        # counted for 2020-05-01 only
+        self._create_node_availability(
+            'node key', 'service type', datetime(2020, 5, 1, 0), 40
+        )
+        # outside of the 7 days
+        self._create_node_availability(
+            'node key', 'service type', datetime(2020, 4, 30, 23), 40
+        )
+        # counted for 2020-05-06 and the last 24 hours
+        self._create_node_availability(
+            'node key', 'service type', datetime(2020, 5, 6, 13), 20
+        )
+        # counted for 2020-05-07 and the last 24 hours
+        self._create_node_availability(
+            'node key', 'service type', datetime(2020, 5, 7, 12), 60
+        )
+        self._create_node_availability(
+            'node key other', 'service type', datetime(2020, 5, 7, 12), 60
+        )
+
+        availability, hours_online = get_node_availability(
+            'node key',
+            'service type',
+            now=now
+        )
+
+        self.assertEqual(
+            [
+                {'day': '2020-05-01', 'time_online': 2},
+                {'day': '2020-05-02', 'time_online': 0},
+                {'day': '2020-05-03', 'time_online': 0},
+                {'day': '2020-05-04', 'time_online': 0},
+                {'day': '2020-05-05', 'time_online': 0},
+                {'day': '2020-05-06', 'time_online': 1},
+                {'day': '2020-05-07', 'time_online': 3},
+            ],
+            availability
+        )
+        self.assertEqual(4, hours_online)
+
+    def test_last_24_hours_of_always_online_node(self):
+        now = datetime(2020, 5, 7, 12, 30)
+        for x in range(30):
+            self._create_node_availability(
+                'node key',
+                'service type',
+                datetime(2020, 5, 7, 12) - timedelta(hours=x),
+                20
+            )
+
+        _, hours_online = get_node_availability(
+            'node key',
+            'service type',
+            now=now
+        )
+        self.assertEqual(24, hours_online)
+
     @staticmethod
-    def _create_node_availability(provider_id, service_type, update_time):
-        avail = NodeAvailability(provider_id)
-        avail.service_type = service_type
-        avail.date = update_time
+    def _create_node_availability(provider_id, service_type, hour, pings):
+        avail = NodeAvailabilityHourly(provider_id, service_type, hour, pings)
         db.session.add(avail)
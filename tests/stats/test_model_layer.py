@@ -1,5 +1,9 @@
 from tests.test_case import TestCase
-from api.stats.model_layer import get_sessions_country_stats
+from api.stats.model_layer import (
+    get_sessions_country_stats,
+    get_session_totals
+)
+from api.session_totals import add_session_totals
 from datetime import datetime, timedelta
 from models import db, Session
 
@@ -20,6 +24,24 @@ class TestModelLayer(TestCase):
         self.assertEqual(1, results[1].count)
         self.assertEqual(None, results[1].client_country)
 
+    def test_get_session_totals(self):
+        self.assertEqual(0, get_session_totals()['sessions_count'])
+
+        add_session_totals(db.session, [{
+            'sessions': 2,
+            'timed_sessions': 2,
+            'duration_seconds': 61,
+            'client_bytes_sent': 10,
+            'client_bytes_received': 20,
+        }])
+        db.session.commit()
+
+        self.assertEqual({
+            'sessions_count': 2,
+            'average_session_time': timedelta(seconds=30),
+            'total_data_transferred': 30,
+        }, get_session_totals())
+
     @staticmethod
     def _create_session(session_key, country):
         session = Session(session_key, 'openvpn')
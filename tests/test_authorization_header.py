@@ -1,6 +1,9 @@
 import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 from tests.test_case import TestCase
-from request_helpers import decode_authorization_header
+import request_helpers
+from request_helpers import decode_authorization_header, recover_caller_address
 import base64
 from tests.utils import (
     sign_message_with_static_key,
@@ -96,5 +99,27 @@ class TestAuthorizationHeader(TestCase):
         self.assertEqual(public_address.lower(), recovered_public_address)
 
 
+class BrokenRecoveryPool:
+    restarted = False
+
+    def recover(self, message, signature_bytes, timeout=None):
+        raise BrokenProcessPool('worker died')
+
+    def restart(self):
+        self.restarted = True
+
+
+class TestRecoverCallerAddress(unittest.TestCase):
+    def test_broken_pool_falls_back_to_request_thread(self):
+        pool = BrokenRecoveryPool()
+        signature = sign_message_with_static_key('message')
+
+        with mock.patch.object(request_helpers, 'recovery_pool', pool):
+            address = recover_caller_address(b'message', signature)
+
+        self.assertEqual(build_static_public_address().lower(), address.lower())
+        self.assertTrue(pool.restarted)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+import tempfile
+import threading
+import time
+from unittest import TestCase
+
+from beaker.cache import CacheManager
+from beaker.util import parse_cache_config_options
+
+from cache import SharedCache, cache_options
+from tests.utils import setting, FakeClock
+
+
+class TestSharedCache(TestCase):
+    def test_file_cache_is_shared_by_managers(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with setting('CACHE_TYPE', 'file'), \
+                    setting('CACHE_DATA_DIR', data_dir):
+                options = parse_cache_config_options(cache_options())
+            first = SharedCache(CacheManager(**options), 'dashboard')
+            second = SharedCache(CacheManager(**options), 'dashboard')
+
+            self.assertIsNone(second.get('metrics'))
+            first.set('metrics', {'sessions_count': 1}, timeout=60)
+            self.assertEqual({'sessions_count': 1}, second.get('metrics'))
+
+    def test_get_returns_none_for_expired_key(self):
+        options = parse_cache_config_options({'cache.type': 'memory'})
+        cache = SharedCache(CacheManager(**options), self.id())
+
+        cache.set('metrics', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('metrics'))
+
+
+class TestGetOrSet(TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.random = 0.5
+        options = parse_cache_config_options({'cache.type': 'memory'})
+        # memory namespaces are shared by the whole process
+        self.cache = SharedCache(
+            CacheManager(**options), self.id(),
+            clock=self.clock, random=lambda: self.random
+        )
+        self.computed = 0
+
+    def test_value_is_computed_once_until_it_expires(self):
+        self.assertEqual(1, self._get())
+        self.assertEqual(1, self._get())
+
+        self.clock.now += 60
+        self.assertEqual(2, self._get())
+
+    def test_value_is_refreshed_early_by_chance(self):
+        self._get()
+        self.clock.now += 59
+
+        self.random = 0.0
+        self.assertEqual(1, self._get())
+        # the last computation took no time, make it look slow
+        self.cache.set('metrics', self.cache.get('metrics')._replace(delta=10), 120)
+        self.random = 0.99
+        self.assertEqual(2, self._get())
+
+    def test_stale_value_is_served_while_refreshing(self):
+        self._get()
+        self.clock.now += 61
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_compute():
+            started.set()
+            release.wait(5)
+            return 'fresh'
+
+        refresh = threading.Thread(target=lambda: self.cache.get_or_set(
+            'metrics', slow_compute, timeout=60, stale_timeout=60
+        ))
+        refresh.start()
+        started.wait(5)
+        self.assertEqual(1, self._get())
+        release.set()
+        refresh.join(5)
+
+        self.assertEqual('fresh', self._get())
+        self.assertEqual(1, self.computed)
+
+    def test_stale_value_is_served_when_refresh_fails(self):
+        self._get()
+        self.clock.now += 61
+
+        def failing_compute():
+            raise Exception('db is down')
+
+        self.assertEqual(1, self.cache.get_or_set(
+            'metrics', failing_compute, timeout=60, stale_timeout=60
+        ))
+
+    def _get(self):
+        return self.cache.get_or_set(
+            'metrics', self._compute, timeout=60, stale_timeout=60
+        )
+
+    def _compute(self):
+        self.computed += 1
+        return self.computed
@@ -0,0 +1,191 @@
+import threading
+from unittest import TestCase
+
+from identity_contract import (
+    IdentityContract,
+    BatchedIdentityContract,
+    CachedIdentityContract
+)
+from tests.test_rpc_provider import start_stub_server
+
+REGISTERED = '0x0000000000000000000000000000000000000001'
+CONTRACT = '0xbe5F9CCea12Df756bF4a5Baf4c29A10c3ee7C83B'
+
+
+class CountingContract:
+    def __init__(self, registered):
+        self.registered = registered
+        self.calls = 0
+        self.called = threading.Event()
+
+    def is_registered(self, identity):
+        self.calls += 1
+        self.called.set()
+        return self.registered
+
+
+class BatchingContract:
+    def __init__(self, registered):
+        self.registered = registered
+        self.batches = []
+
+    def is_registered_many(self, identities):
+        self.batches.append(identities)
+        return [
+            identity in self.registered if identity != 'bad'
+            else Exception('call failed')
+            for identity in identities
+        ]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCachedIdentityContract(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def test_positive_answer_is_cached_for_ttl(self):
+        contract = CountingContract(True)
+        cached = self._cached(contract)
+
+        self.assertTrue(cached.is_registered('0xABC'))
+        self.clock.now = 99
+        self.assertTrue(cached.is_registered('0xabc'))
+        self.assertEqual(1, contract.calls)
+
+    def test_negative_answer_uses_shorter_ttl(self):
+        contract = CountingContract(False)
+        cached = self._cached(contract)
+
+        self.assertFalse(cached.is_registered('0xabc'))
+        self.clock.now = 9
+        self.assertFalse(cached.is_registered('0xabc'))
+        self.assertEqual(1, contract.calls)
+
+        contract.registered = True
+        self.clock.now = 10
+        self.assertTrue(cached.is_registered('0xabc'))
+        self.assertEqual(2, contract.calls)
+
+    def test_stale_positive_answer_is_refreshed_in_background(self):
+        contract = CountingContract(True)
+        cached = self._cached(contract)
+        cached.is_registered('0xabc')
+        contract.called.clear()
+
+        contract.registered = False
+        self.clock.now = 150
+        self.assertTrue(cached.is_registered('0xabc'))
+        self.assertTrue(contract.called.wait(5))
+        cached._executor.shutdown()
+
+        self.assertFalse(cached.is_registered('0xabc'))
+        self.assertEqual(2, contract.calls)
+
+    def test_expired_stale_answer_is_checked_synchronously(self):
+        contract = CountingContract(True)
+        cached = self._cached(contract)
+        cached.is_registered('0xabc')
+
+        contract.registered = False
+        self.clock.now = 1000
+        self.assertFalse(cached.is_registered('0xabc'))
+
+    def test_least_recently_used_identity_is_evicted(self):
+        contract = CountingContract(True)
+        cached = self._cached(contract, max_size=2)
+        cached.is_registered('0xa')
+        cached.is_registered('0xb')
+        cached.is_registered('0xc')
+
+        cached.is_registered('0xa')
+        self.assertEqual(4, contract.calls)
+
+    def _cached(self, contract, max_size=10):
+        return CachedIdentityContract(
+            contract,
+            ttl=100,
+            negative_ttl=10,
+            stale_ttl=500,
+            max_size=max_size,
+            clock=self.clock
+        )
+
+
+class TestBatchedIdentityContract(TestCase):
+    def test_concurrent_checks_are_sent_as_one_batch(self):
+        contract = BatchingContract({'0xa'})
+        batched = BatchedIdentityContract(
+            contract,
+            batch_size=10,
+            batch_window=0.2,
+            timeout=5
+        )
+
+        results = {}
+
+        def check(identity):
+            results[identity] = batched.is_registered(identity)
+
+        threads = [
+            threading.Thread(target=check, args=(identity,))
+            for identity in ['0xA', '0xb', '0xa']
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({'0xA': True, '0xb': False, '0xa': True}, results)
+        self.assertEqual(1, len(contract.batches))
+        self.assertEqual(['0xa', '0xb'], sorted(contract.batches[0]))
+
+    def test_failed_call_raises_only_for_its_caller(self):
+        contract = BatchingContract({'0xa'})
+        batched = BatchedIdentityContract(contract, timeout=5)
+
+        with self.assertRaises(Exception):
+            batched.is_registered('bad')
+        self.assertTrue(batched.is_registered('0xa'))
+
+
+class TestIdentityContract(TestCase):
+    def test_is_registered_many_sends_one_batch(self):
+        def result(request):
+            data = request['params'][0]['data']
+            registered = data.endswith(REGISTERED[2:])
+            return '0x' + '{:064x}'.format(int(registered))
+
+        server = start_stub_server(self, result=result)
+        contract = IdentityContract(server.url(), CONTRACT)
+
+        self.assertEqual(
+            [True, False],
+            contract.is_registered_many([
+                REGISTERED,
+                '0x0000000000000000000000000000000000000002',
+            ])
+        )
+        self.assertEqual(1, len(server.requests))
+        self.assertEqual(2, len(server.requests[0]))
+
+    def test_is_registered_many_decodes_each_result(self):
+        results = iter(['0x', 'not hex', '0x' + '{:064x}'.format(1)])
+
+        server = start_stub_server(self, result=lambda r: next(results))
+        contract = IdentityContract(server.url(), CONTRACT)
+
+        registered = contract.is_registered_many([
+            REGISTERED,
+            '0x0000000000000000000000000000000000000002',
+            '0x0000000000000000000000000000000000000003',
+        ])
+        self.assertFalse(registered[0])
+        self.assertIsInstance(registered[1], ValueError)
+        self.assertTrue(registered[2])
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from api.leaderboard_config import LeaderboardConfig
+from api.leaderboard_response_cache import (
+    LeaderboardResponseCache,
+    parse_cursor
+)
+from tests.utils import FakeClock
+
+
+class TestLeaderboardResponseCache(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.refreshed_at = datetime(2020, 5, 10, 12, 0)
+        self.pages = []
+        self.cache = LeaderboardResponseCache(
+            lambda leaderboard: self.refreshed_at,
+            self._load_page,
+            2,
+            10,
+            self.clock
+        )
+        self.config = LeaderboardConfig('monthly', 'openvpn')
+
+    def test_get_reuses_page_until_leaderboard_is_refreshed(self):
+        first = self.cache.get(self.config, 2)
+        self.assertIs(first, self.cache.get(self.config, 2))
+        self.assertEqual(1, len(self.pages))
+
+        # the refresh is noticed once the check interval passes
+        self.refreshed_at = datetime(2020, 5, 10, 12, 3)
+        self.assertIs(first, self.cache.get(self.config, 2))
+        self.clock.now = 10
+        second = self.cache.get(self.config, 2)
+        self.assertIsNot(first, second)
+        self.assertEqual(2, len(self.pages))
+
+    def test_get_builds_compact_page(self):
+        page = json.loads(self.cache.get(self.config, 2).body)
+        self.assertEqual('provider_id', page['columns'][0])
+        self.assertEqual(['0x1', '0x2'], [row[0] for row in page['rows']])
+        self.assertEqual('10:0x2', page['next_cursor'])
+        self.assertEqual('2020-05-10T12:00:00', page['refreshed_at'])
+
+        page = json.loads(self.cache.get(self.config, 3).body)
+        self.assertIsNone(page['next_cursor'])
+
+    def test_get_evicts_least_recently_used_page(self):
+        first = self.cache.get(self.config, 1)
+        self.cache.get(self.config, 2)
+        self.cache.get(self.config, 3)
+        self.assertIsNot(first, self.cache.get(self.config, 1))
+
+    def test_parse_cursor(self):
+        self.assertEqual((10, '0x2'), parse_cursor('10:0x2'))
+        for cursor in ['x', '10', 'x:0x2', '10:']:
+            with self.assertRaises(ValueError):
+                parse_cursor(cursor)
+
+    def _load_page(self, config, limit, after):
+        self.pages.append((config.name, limit, after))
+        rows = [
+            self._row('0x1', 20),
+            self._row('0x2', 10),
+        ]
+        return rows[:limit]
+
+    @staticmethod
+    def _row(provider_id, hours_available):
+        return {
+            'provider_id': provider_id,
+            'service_type': 'openvpn',
+            'country': 'DE',
+            'hours_available': hours_available,
+            'unique_users': 1,
+            'sessions': 2,
+            'data_transferred': 3,
+            'tokens': None,
+        }
@@ -0,0 +1,180 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+from api.leaderboard_config import LeaderboardConfig
+from api.leaderboard_worker import refresh_leaderboard, get_month_range
+from models import (
+    db, Node, IdentityRegistration, NodeAvailabilityHourly, Session
+)
+from tests.test_case import TestCase
+from tests.utils import setting
+
+DWH_TABLES = [
+    'dwh_leaderboard',
+    'dwh_leaderboard_nodes',
+    'dwh_leaderboard_availability',
+    'dwh_leaderboard_session_stats',
+    'dwh_leaderboard_state',
+]
+
+
+class TestRefreshLeaderboard(TestCase):
+    def setUp(self):
+        super().setUp()
+        self._clear_dwh_tables()
+
+    def tearDown(self):
+        self._clear_dwh_tables()
+        super().tearDown()
+
+    def test_refresh_folds_in_new_data(self):
+        now = datetime(2020, 5, 10, 12, 30)
+        self._create_provider('0x1', now, 'DE')
+        self._create_provider('0x2', now, 'LT')
+        self._create_pings('0x1', datetime(2020, 5, 1, 0), 60)
+        self._create_pings('0x1', datetime(2020, 4, 30, 23), 600)
+        self._create_pings('0x1', datetime(2020, 5, 10, 12), 60)
+        self._create_session('s1', '0x1', 'c1', now)
+        self._create_session('s2', '0x1', 'c1', now)
+
+        refresh_leaderboard(db.session, now)
+        self.assertEqual(
+            [('0x1', 2, 1, 2, 60)],
+            self._leaderboard()
+        )
+
+        # the current hour gets more pings, a new session starts
+        later = now + timedelta(minutes=20)
+        self._add_pings('0x1', datetime(2020, 5, 10, 12), 60)
+        self._create_session('s3', '0x1', 'c2', later)
+
+        result = refresh_leaderboard(db.session, later)
+        self.assertEqual(0, result['sealed_availability_rows'])
+        self.assertEqual(1, result['updated_session_providers'])
+        self.assertEqual(
+            [('0x1', 3, 2, 3, 90)],
+            self._leaderboard()
+        )
+
+        # sealed hours are counted once
+        refresh_leaderboard(db.session, later + timedelta(hours=3))
+        self.assertEqual(3, self._leaderboard()[0][1])
+
+    def test_late_pings_of_recent_hours_are_counted(self):
+        now = datetime(2020, 5, 10, 12, 30)
+        self._create_provider('0x1', now, 'DE')
+        self._create_pings('0x1', datetime(2020, 5, 10, 8), 60)
+        refresh_leaderboard(db.session, now)
+        self.assertEqual(1, self._leaderboard()[0][1])
+
+        # spilled availability of an earlier hour is replayed later
+        self._add_pings('0x1', datetime(2020, 5, 10, 8), 60)
+        refresh_leaderboard(db.session, now + timedelta(hours=2))
+        self.assertEqual(2, self._leaderboard()[0][1])
+
+        with setting('LEADERBOARD_SEAL_DELAY', 1):
+            refresh_leaderboard(db.session, now + timedelta(hours=3))
+            refresh_leaderboard(db.session, now + timedelta(hours=4))
+        self.assertEqual(2, self._leaderboard()[0][1])
+
+    def test_new_month_starts_from_scratch(self):
+        now = datetime(2020, 5, 31, 23, 30)
+        self._create_provider('0x1', now, 'US')
+        self._create_pings('0x1', datetime(2020, 5, 31, 10), 120)
+        refresh_leaderboard(db.session, now)
+        self.assertEqual(2, self._leaderboard()[0][1])
+
+        next_month = datetime(2020, 6, 1, 0, 30)
+        self._touch_provider('0x1', next_month)
+        refresh_leaderboard(db.session, next_month)
+        self.assertEqual(0, self._leaderboard()[0][1])
+
+    def test_refresh_several_leaderboards(self):
+        now = datetime(2020, 5, 10, 12, 30)
+        self._create_provider('0x1', now, 'DE')
+        self._create_provider('0x2', now, 'LT')
+        self._create_pings('0x1', datetime(2020, 5, 1, 0), 120)
+        self._create_pings('0x2', datetime(2020, 5, 1, 0), 60)
+        self._create_session('s1', '0x2', 'c1', now)
+        self._create_session('s2', '0x2', 'c2', now)
+        configs = [
+            LeaderboardConfig('monthly', 'openvpn', 'residential', ['DE']),
+            LeaderboardConfig('users', 'openvpn', size=1,
+                              ranking='unique_users'),
+        ]
+
+        refresh_leaderboard(db.session, now, configs)
+        self.assertEqual(
+            [('0x1', 2, 0, 0, 0)],
+            self._leaderboard('monthly')
+        )
+        self.assertEqual(
+            [('0x2', 1, 2, 2, 60)],
+            self._leaderboard('users')
+        )
+
+    def test_unknown_ranking_is_rejected(self):
+        with self.assertRaises(Exception):
+            LeaderboardConfig('monthly', 'openvpn', ranking='tokens')
+
+    def test_get_month_range(self):
+        self.assertEqual(
+            (datetime(2020, 2, 1), datetime(2020, 2, 29, 23, 59, 59)),
+            get_month_range(datetime(2020, 2, 14, 10, 5))
+        )
+
+    def _create_provider(self, provider_id, updated_at, country):
+        db.session.add(IdentityRegistration(provider_id, ''))
+        node = Node(provider_id, 'openvpn')
+        node.node_type = 'residential'
+        node.updated_at = updated_at
+        node.proposal = json.dumps({
+            'service_definition': {'location': {'country': country}}
+        })
+        db.session.add(node)
+        db.session.commit()
+
+    def _touch_provider(self, provider_id, updated_at):
+        Node.query.get([provider_id, 'openvpn']).updated_at = updated_at
+        db.session.commit()
+
+    def _create_pings(self, provider_id, hour, pings):
+        db.session.add(
+            NodeAvailabilityHourly(provider_id, 'openvpn', hour, pings)
+        )
+        db.session.commit()
+
+    def _add_pings(self, provider_id, hour, pings):
+        NodeAvailabilityHourly.query.get(
+            [provider_id, 'openvpn', hour]
+        ).pings += pings
+        db.session.commit()
+
+    def _create_session(self, session_key, provider_id, consumer_id,
+                        updated_at):
+        session = Session(session_key, 'openvpn')
+        session.node_key = provider_id
+        session.consumer_id = consumer_id
+        session.client_bytes_sent = 10
+        session.client_bytes_received = 20
+        session.client_updated_at = updated_at
+        db.session.add(session)
+        db.session.commit()
+
+    @staticmethod
+    def _leaderboard(leaderboard='monthly'):
+        rows = db.session.execute(text("""
+            SELECT provider_id, hours_available, unique_users, sessions,
+                   data_transferred
+            FROM dwh_leaderboard
+            WHERE leaderboard = :leaderboard
+            ORDER BY provider_id
+            """), {'leaderboard': leaderboard})
+        return [tuple(row) for row in rows]
+
+    @staticmethod
+    def _clear_dwh_tables():
+        for table in DWH_TABLES:
+            db.session.execute(text('DELETE FROM {}'.format(table)))
+        db.session.commit()
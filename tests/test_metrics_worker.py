@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from api.metrics_worker import log_metrics
+from rpc_provider import RPCLatencyStats
+from signature import RecoveryCache
+
+
+class TestLogMetrics(TestCase):
+    def test_every_reporter_is_logged(self):
+        stats = RPCLatencyStats()
+        stats.record('eth_call', 0.5)
+
+        def failing():
+            raise ValueError('not available')
+
+        with self.assertLogs('metrics_worker') as logs:
+            log_metrics([('Failing', failing), ('RPC latency', stats.stats)])
+
+        self.assertIn('Failed to collect Failing', logs.output[0])
+        self.assertIn('RPC latency: {"eth_call": {', logs.output[1])
+        self.assertIn('"calls": 1', logs.output[1])
+
+    def test_recovery_cache_stats_are_logged(self):
+        cache = RecoveryCache(10)
+        cache.get(b'key')
+
+        with self.assertLogs('metrics_worker') as logs:
+            log_metrics([('Signature recovery cache', cache.stats)])
+
+        self.assertIn('"hit_rate": 0.0', logs.output[0])
+        self.assertIn('"misses": 1', logs.output[0])
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest import TestCase as UnitTestCase
+
+from api.node_availability_worker import (
+    AdaptiveBatchSize,
+    NodeAvailabilityQueue,
+    NodeAvailabilityStats,
+    insert_node_availabilities,
+    process_node_availabilities,
+    OVERFLOW_BLOCK,
+    OVERFLOW_SPILL
+)
+from models import db, NodeAvailability, NodeAvailabilityHourly
+from tests.test_case import TestCase
+
+
+class TestAdaptiveBatchSize(UnitTestCase):
+    def test_grows_while_commits_are_fast(self):
+        batch_size = AdaptiveBatchSize(20, 20, 50, target_seconds=0.1)
+        batch_size.update(20, 0.01)
+        self.assertEqual(40, batch_size.value)
+        batch_size.update(40, 0.01)
+        self.assertEqual(50, batch_size.value)
+
+    def test_does_not_grow_on_partial_batches(self):
+        batch_size = AdaptiveBatchSize(20, 20, 50, target_seconds=0.1)
+        batch_size.update(5, 0.01)
+        self.assertEqual(20, batch_size.value)
+
+    def test_shrinks_when_commits_are_slow(self):
+        batch_size = AdaptiveBatchSize(80, 20, 100, target_seconds=0.1)
+        batch_size.update(80, 0.2)
+        self.assertEqual(40, batch_size.value)
+        batch_size.update(40, 0.2)
+        batch_size.update(20, 0.2)
+        self.assertEqual(20, batch_size.value)
+
+
+class TestNodeAvailabilityQueue(UnitTestCase):
+    def test_drop_oldest_when_full(self):
+        availabilities = NodeAvailabilityQueue(2)
+        for node_key in ['node1', 'node2', 'node3']:
+            availabilities.put(availability(node_key))
+
+        self.assertEqual(1, availabilities.dropped)
+        self.assertEqual('node2', availabilities.get_nowait().node_key)
+        self.assertEqual('node3', availabilities.get_nowait().node_key)
+
+    def test_block_drops_new_item_after_timeout(self):
+        availabilities = NodeAvailabilityQueue(
+            1, OVERFLOW_BLOCK, block_timeout=0.01
+        )
+        availabilities.put(availability('node1'))
+        availabilities.put(availability('node2'))
+
+        self.assertEqual(1, availabilities.dropped)
+        self.assertEqual('node1', availabilities.get_nowait().node_key)
+
+    def test_spill_writes_overflow_to_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'availability.spill')
+        availabilities = NodeAvailabilityQueue(
+            1, OVERFLOW_SPILL, spill_path=path
+        )
+        first = availability('node1')
+        availabilities.put(first)
+        availabilities.put(availability('node2'))
+        availabilities.put(availability('node3'))
+
+        self.assertEqual(2, availabilities.spilled)
+        self.assertEqual(1, availabilities.qsize())
+
+        items, replay_path = availabilities.take_spilled()
+        self.assertEqual(
+            ['node2', 'node3'],
+            [item.node_key for item in items]
+        )
+        self.assertEqual('openvpn', items[0].service_type)
+        self.assertEqual(first.date.date(), items[0].date.date())
+        self.assertFalse(os.path.exists(path))
+
+        # not yet removed, so it is returned again
+        items, _ = availabilities.take_spilled()
+        self.assertEqual(2, len(items))
+        os.remove(replay_path)
+        self.assertEqual(([], None), availabilities.take_spilled())
+
+
+class TestProcessNodeAvailabilities(TestCase):
+    def test_partial_batch_is_flushed_after_interval(self):
+        availabilities = NodeAvailabilityQueue(10)
+        stats = NodeAvailabilityStats(availabilities)
+        availabilities.put(availability('node1'))
+
+        threading.Thread(
+            target=process_node_availabilities,
+            args=(db.engine, availabilities),
+            kwargs=dict(
+                flush_interval=0.1,
+                batch_size=AdaptiveBatchSize(20, 20, 20, 1),
+                stats=stats
+            ),
+            daemon=True
+        ).start()
+        time.sleep(1)
+
+        db.session.remove()
+        self.assertEqual(1, NodeAvailabilityHourly.query.one().pings)
+        self.assertEqual(1, stats.stats()['rows'])
+        self.assertEqual(0, stats.stats()['queue_depth'])
+
+    def test_pings_are_counted_per_hour(self):
+        first = availability('node1')
+        first.date = datetime(2020, 5, 1, 10, 5)
+        second = availability('node1')
+        second.date = datetime(2020, 5, 1, 10, 55)
+        third = availability('node1')
+        third.date = datetime(2020, 5, 1, 11, 0)
+
+        insert_node_availabilities(db.session, [first, second])
+        insert_node_availabilities(db.session, [first, third])
+        db.session.remove()
+
+        self.assertEqual(
+            [(datetime(2020, 5, 1, 10), 3), (datetime(2020, 5, 1, 11), 1)],
+            [
+                (a.hour, a.pings) for a in
+                NodeAvailabilityHourly.query.order_by(
+                    NodeAvailabilityHourly.hour
+                )
+            ]
+        )
+
+    def test_stop_drains_queue_in_full_batches(self):
+        availabilities = NodeAvailabilityQueue(100)
+        for i in range(50):
+            availabilities.put(availability('node{}'.format(i)))
+        stop = threading.Event()
+        stopped = threading.Event()
+        stop.set()
+        stats = NodeAvailabilityStats(availabilities)
+
+        process_node_availabilities(
+            db.engine,
+            availabilities,
+            flush_interval=60,
+            batch_size=AdaptiveBatchSize(20, 20, 20, 1),
+            stats=stats,
+            stop=stop,
+            stopped=stopped
+        )
+
+        self.assertTrue(stopped.is_set())
+        self.assertEqual(3, stats.flushes)
+        self.assertEqual(10, stats.last_flush_rows)
+        db.session.remove()
+        self.assertEqual(
+            50,
+            sum(a.pings for a in NodeAvailabilityHourly.query.all())
+        )
+
+
+def availability(node_key):
+    item = NodeAvailability(node_key)
+    item.service_type = 'openvpn'
+    return item
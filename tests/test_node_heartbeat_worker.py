@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from unittest import TestCase as UnitTestCase
+
+from api.node_heartbeat_worker import HeartbeatBuffer, flush_heartbeats
+from models import db, Node, AVAILABILITY_TIMEOUT
+from tests.test_case import TestCase
+
+
+class TestHeartbeatBuffer(UnitTestCase):
+    def test_repeated_heartbeats_are_coalesced(self):
+        buffer = HeartbeatBuffer()
+        first = datetime.utcnow()
+        buffer.record('node1', 'openvpn', first)
+        buffer.record('node1', 'openvpn', first + timedelta(seconds=1))
+        buffer.record('node2', 'openvpn', first)
+        buffer.discard('node2', 'openvpn', first)
+
+        self.assertEqual(
+            {('node1', 'openvpn'): first + timedelta(seconds=1)},
+            buffer.drain()
+        )
+        self.assertEqual({}, buffer.drain())
+
+    def test_heartbeats_before_unregister_are_dropped(self):
+        buffer = HeartbeatBuffer()
+        now = datetime.utcnow()
+        before = now - timedelta(seconds=1)
+        after = now + timedelta(seconds=1)
+        buffer.record('node1', 'openvpn', before)
+        buffer.record('node2', 'openvpn', before)
+        pending = buffer.drain()
+        buffer.discard('node1', 'openvpn', now)
+        buffer.discard('node2', 'openvpn', now)
+        buffer.record('node2', 'openvpn', after)
+
+        buffer.drop_unregistered(pending, now)
+        self.assertEqual({}, pending)
+
+        pending = buffer.drain()
+        buffer.drop_unregistered(pending, now)
+        self.assertEqual({('node2', 'openvpn'): after}, pending)
+
+    def test_old_tombstones_are_forgotten(self):
+        buffer = HeartbeatBuffer()
+        now = datetime.utcnow()
+        buffer.discard('node1', 'openvpn', now)
+
+        buffer.drop_unregistered({}, now + AVAILABILITY_TIMEOUT * 2)
+        pending = {('node1', 'openvpn'): now}
+        buffer.drop_unregistered(pending, now)
+        self.assertEqual({('node1', 'openvpn'): now}, pending)
+
+
+class TestFlushHeartbeats(TestCase):
+    def test_flush_updates_nodes_in_batches(self):
+        now = datetime.utcnow().replace(microsecond=0)
+        old = now - timedelta(minutes=1)
+        newer = now + timedelta(minutes=1)
+        self._create_node('node1', 'openvpn', None)
+        self._create_node('node2', 'openvpn', old)
+        self._create_node('node2', 'wireguard', old)
+        self._create_node('node3', 'openvpn', newer)
+
+        flush_heartbeats(db.session, {
+            ('node1', 'openvpn'): now,
+            ('node2', 'openvpn'): now,
+            ('node3', 'openvpn'): now,
+        }, batch_size=2)
+        db.session.remove()
+
+        self.assertEqual(now, Node.query.get(['node1', 'openvpn']).updated_at)
+        self.assertEqual(now, Node.query.get(['node2', 'openvpn']).updated_at)
+        self.assertEqual(
+            old,
+            Node.query.get(['node2', 'wireguard']).updated_at
+        )
+        self.assertEqual(
+            newer,
+            Node.query.get(['node3', 'openvpn']).updated_at
+        )
+
+    @staticmethod
+    def _create_node(node_key, service_type, updated_at):
+        node = Node(node_key, service_type)
+        node.proposal = '{}'
+        node.updated_at = updated_at
+        db.session.add(node)
+        db.session.commit()
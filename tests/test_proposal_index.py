@@ -0,0 +1,266 @@
+import json
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from api.proposal_index import (
+    ProposalIndex, CHANGE_ADDED, CHANGE_UPDATED, CHANGE_REMOVED
+)
+from models import Node, AVAILABILITY_TIMEOUT
+from tests.utils import setting
+
+
+class TestProposalIndex(TestCase):
+    def setUp(self):
+        self.index = ProposalIndex()
+        self.index.load([], [], [], [])
+
+    def test_find_returns_only_active_proposals(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn', updated_at=None))
+        expired = datetime.utcnow() - AVAILABILITY_TIMEOUT - timedelta(minutes=1)
+        self.index.put_node(self._node('node3', 'openvpn', updated_at=expired))
+
+        found = self.index.find()
+        self.assertEqual(['node1'], [p.node_key for p in found])
+
+    def test_find_filters_by_service_type(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'wireguard'))
+
+        self.assertEqual(
+            ['node2'],
+            [p.node_key for p in self.index.find(service_type='wireguard')]
+        )
+        self.assertEqual(
+            ['node1', 'node2'],
+            [p.node_key for p in self.index.find(service_type='all')]
+        )
+
+    def test_find_filters_by_access_policy(self):
+        self.index.put_node(self._node('node1', 'openvpn'), [])
+        self.index.put_node(
+            self._node('node2', 'openvpn'),
+            [('mysterium', 'test source')]
+        )
+
+        self.assertEqual(
+            ['node1'],
+            [p.node_key for p in self.index.find()]
+        )
+        self.assertEqual(
+            ['node2'],
+            [p.node_key for p in self.index.find(
+                access_policy=('mysterium', None)
+            )]
+        )
+        self.assertEqual(
+            [],
+            [p.node_key for p in self.index.find(
+                access_policy=('mysterium', 'other source')
+            )]
+        )
+        self.assertEqual(2, len(self.index.find(access_policy='*')))
+
+    def test_find_filters_by_bounty_and_monitoring(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn'))
+        self.index.set_bounty_identity('NODE2', True)
+        self.index.set_monitoring_failed([('node1', 'openvpn')])
+
+        self.assertEqual(
+            ['node2'],
+            [p.node_key for p in self.index.find(bounty_only=True)]
+        )
+        self.assertEqual(
+            ['node2'],
+            [p.node_key for p in self.index.find()]
+        )
+        self.assertEqual(2, len(self.index.find(include_failed=True)))
+
+    def test_touch_updates_activity(self):
+        expired = datetime.utcnow() - AVAILABILITY_TIMEOUT - timedelta(minutes=1)
+        self.index.put_node(self._node('Node1', 'openvpn', updated_at=expired))
+        self.assertEqual([], self.index.find())
+
+        self.assertTrue(
+            self.index.touch('node1', 'openvpn', datetime.utcnow())
+        )
+        self.assertEqual(1, len(self.index.find(node_key='node1')))
+        self.assertFalse(
+            self.index.touch('node1', 'wireguard', datetime.utcnow())
+        )
+
+    def test_changes_since_returns_net_changes(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        version = self.index.version()
+
+        node = self._node('node1', 'openvpn')
+        node.node_type = 'datacenter'
+        self.index.put_node(node)
+        self.index.put_node(self._node('node2', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn'))
+        self.index.put_node(self._node('node3', 'wireguard'))
+
+        current, changes = self.index.changes_since(version)
+        self.assertEqual(self.index.version(), current)
+        self.assertEqual(
+            [
+                (CHANGE_UPDATED, 'node1'),
+                (CHANGE_ADDED, 'node2'),
+                (CHANGE_ADDED, 'node3'),
+            ],
+            [(kind, p.node_key) for kind, p in changes]
+        )
+
+        _, changes = self.index.changes_since(version, 'wireguard')
+        self.assertEqual(
+            [(CHANGE_ADDED, 'node3')],
+            [(kind, p.node_key) for kind, p in changes]
+        )
+
+        _, changes = self.index.changes_since(current)
+        self.assertEqual([], changes)
+
+    def test_unchanged_registration_is_not_logged(self):
+        expired = datetime.utcnow() - AVAILABILITY_TIMEOUT - timedelta(minutes=1)
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn', updated_at=expired))
+        version = self.index.version()
+
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn'))
+
+        self.assertEqual(
+            [(CHANGE_ADDED, 'node2')],
+            [(kind, p.node_key) for kind, p in
+             self.index.changes_since(version)[1]]
+        )
+
+    def test_changes_since_reports_removals(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn'))
+        self.index.put_node(self._node('node3', 'openvpn'))
+        version = self.index.version()
+
+        expired = datetime.utcnow() - AVAILABILITY_TIMEOUT - timedelta(minutes=1)
+        self.index.touch('node1', 'openvpn', expired)
+        self.index.set_monitoring_failed([('node2', 'openvpn')])
+        self.index._proposals[('node3', 'openvpn')].updated_at = expired
+
+        _, changes = self.index.changes_since(version)
+        self.assertEqual(
+            [
+                (CHANGE_REMOVED, 'node1'),
+                (CHANGE_REMOVED, 'node2'),
+                (CHANGE_REMOVED, 'node3'),
+            ],
+            [(kind, p.node_key) for kind, p in changes]
+        )
+
+    def test_changes_since_skips_proposals_added_and_removed(self):
+        version = self.index.version()
+        self.index.put_node(self._node('node1', 'openvpn'))
+        expired = datetime.utcnow() - AVAILABILITY_TIMEOUT - timedelta(minutes=1)
+        self.index.touch('node1', 'openvpn', expired)
+
+        _, changes = self.index.changes_since(version)
+        self.assertEqual([], changes)
+
+    def test_prune_drops_long_inactive_proposals(self):
+        index = ProposalIndex(change_log_size=1)
+        index.load([], [], [], [])
+        now = datetime.utcnow()
+        index.put_node(self._node('node1', 'openvpn'))
+        index.put_node(
+            self._node('node2', 'openvpn', updated_at=now - timedelta(days=2))
+        )
+        index.put_node(self._node('node3', 'openvpn', updated_at=None))
+        index.put_node(self._node('node4', 'openvpn'))
+        index.touch('node4', 'openvpn', now - timedelta(days=3))
+
+        with setting('PROPOSALS_PRUNE_AFTER', 24):
+            index.prune(now)
+
+        self.assertEqual(
+            [('node1', 'openvpn'), ('node4', 'openvpn')],
+            sorted(index._proposals)
+        )
+        self.assertEqual(
+            {('node1', 'openvpn'), ('node4', 'openvpn')},
+            index._by_service_type['openvpn']
+        )
+
+    def test_parse_version_token(self):
+        token = self.index.version_token()
+        self.assertEqual(self.index.version(), self.index.parse_version(token))
+        self.assertIsNone(
+            ProposalIndex().parse_version(token)
+        )
+        for malformed in ['', '12', '{}-x'.format(token)]:
+            with self.assertRaises(ValueError):
+                self.index.parse_version(malformed)
+
+    def test_changes_since_requires_logged_version(self):
+        index = ProposalIndex(change_log_size=2)
+        index.load([], [], [], [])
+        version = index.version()
+        for i in range(3):
+            index.put_node(self._node('node{}'.format(i), 'openvpn'))
+
+        _, changes = index.changes_since(version)
+        self.assertIsNone(changes)
+        _, changes = index.changes_since(version + 1)
+        self.assertEqual(2, len(changes))
+
+    def test_sync_applies_changes_of_other_processes(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'openvpn'))
+        self.index.put_node(self._node('node3', 'openvpn'))
+        version = self.index.version()
+
+        synced_from = datetime.utcnow()
+        self.index.sync(
+            [self._node('node1', 'openvpn'), self._node('node4', 'openvpn')],
+            [('node1', 'openvpn'), ('node3', 'openvpn'), ('node4', 'openvpn')],
+            [('node1', 1, 'mysterium')],
+            ['node1'],
+            [('node3', 'openvpn')],
+            synced_from=synced_from
+        )
+
+        _, changes = self.index.changes_since(version)
+        self.assertEqual(
+            [
+                (CHANGE_ADDED, 'node4'),
+                (CHANGE_REMOVED, 'node2'),
+                (CHANGE_REMOVED, 'node3'),
+            ],
+            [(kind, p.node_key) for kind, p in changes]
+        )
+        self.assertEqual(
+            ['node1'],
+            [p.node_key for p in self.index.find(
+                access_policy=(1, 'mysterium'), bounty_only=True
+            )]
+        )
+
+    def test_sync_keeps_proposals_refreshed_after_it_started(self):
+        synced_from = datetime.utcnow()
+        self.index.put_node(self._node('node1', 'openvpn'))
+        version = self.index.version()
+
+        self.index.sync([], [], [], [], [], synced_from=synced_from)
+
+        self.assertEqual((version, []), self.index.changes_since(version))
+
+    @staticmethod
+    def _node(node_key, service_type, updated_at=0):
+        node = Node(node_key, service_type)
+        node.node_type = 'residential'
+        node.proposal = json.dumps({
+            'id': 1,
+            'provider_id': node_key,
+            'service_type': service_type,
+        })
+        node.updated_at = datetime.utcnow() if updated_at == 0 else updated_at
+        return node
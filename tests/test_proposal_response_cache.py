@@ -0,0 +1,129 @@
+import gzip
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_etags
+
+from api.proposal_index import ProposalIndex
+from api.proposal_response_cache import (
+    ProposalResponseCache,
+    parse_proposal_query,
+    choose_encoding,
+    format_etag,
+    etag_matches
+)
+from models import Node
+from tests.utils import setting
+
+
+class TestProposalResponseCache(TestCase):
+    def setUp(self):
+        self.index = ProposalIndex()
+        self.index.load([], [], [], [])
+        self.cache = ProposalResponseCache(self.index, 2)
+
+    def test_parse_proposal_query_normalizes_args(self):
+        query = parse_proposal_query({
+            'node_key': 'NODE1',
+            'access_policy[id]': 'mysterium',
+            'bounty_only': 'true',
+        })
+        self.assertEqual('openvpn', query.service_type)
+        self.assertEqual('node1', query.node_key)
+        self.assertEqual(('mysterium', None), query.access_policy)
+        self.assertTrue(query.bounty_only)
+        self.assertFalse(query.include_failed)
+
+    def test_get_reuses_response_until_slice_changes(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        query = parse_proposal_query({})
+
+        first = self.cache.get(query)
+        self.assertIs(first, self.cache.get(query))
+        self.assertEqual(
+            ['node1'],
+            [p['provider_id'] for p in json.loads(first.body)['proposals']]
+        )
+
+        self.index.put_node(self._node('node2', 'wireguard'))
+        self.assertIs(first, self.cache.get(query))
+
+        self.index.put_node(self._node('node3', 'openvpn'))
+        second = self.cache.get(query)
+        self.assertIsNot(first, second)
+        self.assertNotEqual(first.etag, second.etag)
+
+    def test_get_survives_unchanged_registrations(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        query = parse_proposal_query({})
+        first = self.cache.get(query)
+
+        self.index.put_node(self._node('node1', 'openvpn'))
+        second = self.cache.get(query)
+        self.assertIs(first, second)
+        self.assertEqual(first.etag, second.etag)
+
+        node = self._node('node1', 'openvpn')
+        node.node_type = 'datacenter'
+        self.index.put_node(node)
+        self.assertIsNot(first, self.cache.get(query))
+
+    def test_get_is_invalidated_by_shared_changes(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        query = parse_proposal_query({})
+
+        first = self.cache.get(query)
+        self.index.set_monitoring_failed([('node1', 'openvpn')])
+        second = self.cache.get(query)
+
+        self.assertEqual({'proposals': []}, json.loads(second.body))
+        self.assertNotEqual(first.etag, second.etag)
+
+    def test_get_evicts_least_recently_used(self):
+        first = self.cache.get(parse_proposal_query({'node_key': 'a'}))
+        self.cache.get(parse_proposal_query({'node_key': 'b'}))
+        self.cache.get(parse_proposal_query({'node_key': 'c'}))
+
+        self.assertIsNot(
+            first,
+            self.cache.get(parse_proposal_query({'node_key': 'a'}))
+        )
+
+    def test_encoded_is_compressed_once(self):
+        self.index.put_node(self._node('node1', 'openvpn'))
+        cached = self.cache.get(parse_proposal_query({}))
+
+        encoded = cached.encoded('gzip')
+        self.assertIs(encoded, cached.encoded('gzip'))
+        self.assertEqual(cached.body, gzip.decompress(encoded))
+
+    def test_choose_encoding(self):
+        accept_gzip = Accept([('gzip', 1), ('deflate', 1)])
+        with setting('PROPOSALS_COMPRESSION_MIN_SIZE', 10):
+            self.assertEqual('gzip', choose_encoding(accept_gzip, 100))
+            self.assertIsNone(choose_encoding(accept_gzip, 5))
+            self.assertIsNone(choose_encoding(Accept([]), 100))
+            self.assertIsNone(
+                choose_encoding(Accept([('gzip', 0)]), 100)
+            )
+
+    def test_etag_of_each_encoding_matches(self):
+        self.assertEqual('"abc"', format_etag('abc', None))
+        self.assertEqual('"abc-gzip"', format_etag('abc', 'gzip'))
+
+        for encoding in [None, 'gzip', 'br']:
+            if_none_match = parse_etags(format_etag('abc', encoding))
+            self.assertTrue(etag_matches('abc', if_none_match))
+            self.assertFalse(etag_matches('abd', if_none_match))
+        self.assertTrue(etag_matches('abc', parse_etags('W/"abc-gzip"')))
+        self.assertTrue(etag_matches('abc', parse_etags('*')))
+        self.assertFalse(etag_matches('abc', parse_etags(None)))
+
+    @staticmethod
+    def _node(node_key, service_type):
+        node = Node(node_key, service_type)
+        node.proposal = json.dumps({'id': 1, 'provider_id': node_key})
+        node.updated_at = datetime.utcnow()
+        return node
@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+
+from tornado import gen
+from tornado.testing import AsyncHTTPTestCase, gen_test
+from tornado.web import Application
+
+from api.proposal_index import ProposalIndex
+from api.proposal_stream import (
+    ProposalStreamBroadcaster,
+    ProposalStreamHandler,
+    format_event,
+    format_reset_event
+)
+from models import Node
+
+
+class TestProposalStream(AsyncHTTPTestCase):
+    def get_app(self):
+        self.index = ProposalIndex()
+        self.index.load([], [], [], [])
+        self.broadcaster = ProposalStreamBroadcaster(self.index, self.io_loop)
+        return Application([
+            (r'/v1/proposals/stream', ProposalStreamHandler,
+             dict(broadcaster=self.broadcaster)),
+        ])
+
+    @gen_test
+    def test_stream_pushes_added_proposals(self):
+        chunks = []
+
+        def on_chunk(chunk):
+            chunks.append(chunk.decode())
+            if 'event: added' in ''.join(chunks):
+                self.io_loop.add_callback(self._close_stream)
+
+        self.http_client.fetch(
+            self.get_url('/v1/proposals/stream'),
+            streaming_callback=on_chunk,
+            request_timeout=5,
+            raise_error=False
+        )
+        yield self._wait_for(lambda: self.broadcaster._subscribers)
+
+        self.index.put_node(self._node('node1', 'openvpn'))
+        self.index.put_node(self._node('node2', 'wireguard'))
+        yield self._wait_for(lambda: 'event: added' in ''.join(chunks))
+
+        body = ''.join(chunks)
+        self.assertIn('"provider_id": "node1"', body)
+        self.assertNotIn('"provider_id": "node2"', body)
+
+    def test_replay_returns_reset_for_unknown_version(self):
+        epoch = self.index.version_token().split('-')[0]
+        events = self.broadcaster.replay(epoch + '--1', 'openvpn')
+        self.assertEqual(1, len(events))
+        self.assertIn('event: reset', events[0][1])
+
+    def test_replay_returns_reset_for_other_epoch(self):
+        version = self.index.version_token()
+        self.index.put_node(self._node('node1', 'openvpn'))
+
+        events = self.broadcaster.replay(
+            ProposalIndex().version_token(), 'openvpn'
+        )
+        self.assertEqual(
+            [(None, format_reset_event(self.index.version_token()))],
+            events
+        )
+
+        events = self.broadcaster.replay(version, 'openvpn')
+        self.assertIn('id: {}\n'.format(self.index.version_token()),
+                      events[0][1])
+        self.assertIn('event: added', events[0][1])
+
+    def test_replay_rejects_malformed_version(self):
+        with self.assertRaises(ValueError):
+            self.broadcaster.replay('12', 'openvpn')
+
+    def test_format_event(self):
+        self.assertEqual(
+            'id: 3\nevent: removed\ndata: {"provider_id": "node1"}\n\n',
+            format_event(3, 'removed', {'provider_id': 'node1'})
+        )
+
+    def _close_stream(self):
+        for subscriber in list(self.broadcaster._subscribers):
+            self.broadcaster.unsubscribe(subscriber)
+
+    @gen.coroutine
+    def _wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            yield gen.sleep(0.01)
+        self.fail('condition was not met in time')
+
+    @staticmethod
+    def _node(node_key, service_type):
+        node = Node(node_key, service_type)
+        node.proposal = json.dumps({'id': 1, 'provider_id': node_key})
+        node.updated_at = datetime.utcnow()
+        return node
@@ -1,3 +1,4 @@
+import gzip
 import json
 import time
 from datetime import datetime, timedelta
@@ -8,7 +9,7 @@ from api.node_availability_worker import (
 )
 from models import (
     db, Node, ProposalAccessPolicy, AVAILABILITY_TIMEOUT, IdentityRegistration,
-    NodeAvailability
+    NodeAvailabilityHourly
 )
 from tests.test_case import TestCase
 from tests.utils import (
@@ -18,10 +19,18 @@ from tests.utils import (
 )
 from identity_contract import IdentityContractFake
 from api import proposals as proposalEndpoints
+from api.proposal_index import (
+    proposal_index, load_proposal_index, sync_proposal_index
+)
+from api.node_heartbeat_worker import node_heartbeats
 from cache import proposalPingCallCache
 
 
 class TestProposals(TestCase):
+    def tearDown(self):
+        proposal_index.clear()
+        super().tearDown()
+
     def test_register_proposal_successful(self):
         public_address = build_static_public_address()
         payload = {
@@ -784,6 +793,180 @@ class TestProposals(TestCase):
         data = json.loads(re.data)
         self.assertEqual(1, len(data['proposals']))
 
+    def test_proposals_served_from_index(self):
+        node = self._create_sample_node()
+        node.mark_activity()
+        db.session.commit()
+        load_proposal_index(db.engine)
+
+        # created behind the index's back, so it is not served
+        node2 = self._create_node("node2", "openvpn")
+        node2.mark_activity()
+        db.session.commit()
+
+        re = self._get('/v1/proposals')
+
+        self.assertEqual(200, re.status_code)
+        data = json.loads(re.data)
+        self.assertEqual(1, len(data['proposals']))
+        self.assertEqual('node1', data['proposals'][0]['provider_id'])
+
+    def test_proposals_from_index_honours_etag(self):
+        node = self._create_sample_node()
+        node.mark_activity()
+        node_noop = self._create_node("node2", "noop")
+        node_noop.mark_activity()
+        db.session.commit()
+        load_proposal_index(db.engine)
+
+        re = self._get('/v1/proposals')
+        self.assertEqual(200, re.status_code)
+        etag = re.headers.get('Etag')
+        self.assertIsNotNone(etag)
+
+        re = self._get('/v1/proposals', headers={'If-None-Match': etag})
+        self.assertEqual(304, re.status_code)
+
+        with setting('PROPOSALS_COMPRESSION_MIN_SIZE', 0):
+            re = self._get(
+                '/v1/proposals',
+                headers={'Accept-Encoding': 'gzip'}
+            )
+            self.assertEqual(etag[:-1] + '-gzip"', re.headers.get('Etag'))
+
+            re = self._get(
+                '/v1/proposals',
+                headers={
+                    'Accept-Encoding': 'gzip',
+                    'If-None-Match': re.headers.get('Etag')
+                }
+            )
+            self.assertEqual(304, re.status_code)
+
+        re = self._get(
+            '/v1/proposals',
+            {'service_type': 'all'},
+            headers={'If-None-Match': etag}
+        )
+        self.assertEqual(200, re.status_code)
+
+    def test_proposals_from_index_are_compressed(self):
+        node = self._create_sample_node()
+        node.mark_activity()
+        db.session.commit()
+        load_proposal_index(db.engine)
+
+        with setting('PROPOSALS_COMPRESSION_MIN_SIZE', 0):
+            re = self._get(
+                '/v1/proposals',
+                headers={'Accept-Encoding': 'gzip'}
+            )
+
+        self.assertEqual(200, re.status_code)
+        self.assertEqual('gzip', re.headers.get('Content-Encoding'))
+        data = json.loads(gzip.decompress(re.data))
+        self.assertEqual('node1', data['proposals'][0]['provider_id'])
+
+    def test_proposal_changes_since_version(self):
+        node = self._create_sample_node()
+        node.mark_activity()
+        db.session.commit()
+        load_proposal_index(db.engine)
+
+        re = self._get('/v1/proposals')
+        version = re.headers.get('X-Proposals-Version')
+        self.assertIsNotNone(version)
+
+        node.mark_inactive()
+        db.session.commit()
+        proposal_index.touch(node.node_key, node.service_type, node.updated_at)
+
+        re = self._get('/v1/proposals/changes', {'since': version})
+        self.assertEqual(200, re.status_code)
+        self.assertEqual([], re.json['added'])
+        self.assertEqual(
+            [{'provider_id': 'node1', 'service_type': 'openvpn'}],
+            re.json['removed']
+        )
+        self.assertNotEqual(version, re.json['version'])
+
+        re = self._get('/v1/proposals/changes', {'since': re.json['version']})
+        self.assertEqual(200, re.status_code)
+        self.assertEqual([], re.json['removed'])
+
+    def test_sync_picks_up_nodes_unregistered_elsewhere(self):
+        node = self._create_sample_node()
+        node.mark_activity()
+        db.session.commit()
+        loaded_from = load_proposal_index(db.engine)
+        version = proposal_index.version_token()
+
+        node.mark_inactive()
+        db.session.commit()
+        sync_proposal_index(db.engine, loaded_from)
+
+        re = self._get('/v1/proposals/changes', {'since': version})
+        self.assertEqual(200, re.status_code)
+        self.assertEqual(
+            [{'provider_id': 'node1', 'service_type': 'openvpn'}],
+            re.json['removed']
+        )
+
+    def test_proposal_changes_requires_since(self):
+        load_proposal_index(db.engine)
+
+        re = self._get('/v1/proposals/changes')
+        self.assertEqual(400, re.status_code)
+        self.assertEqual({'error': 'since must be a version'}, re.json)
+
+        re = self._get('/v1/proposals/changes', {'since': 0})
+        self.assertEqual(400, re.status_code)
+
+    def test_proposal_changes_of_other_epoch_are_gone(self):
+        load_proposal_index(db.engine)
+        version = proposal_index.version_token()
+        epoch, number = version.split('-')
+
+        re = self._get('/v1/proposals/changes', {'since': 'other-' + number})
+        self.assertEqual(410, re.status_code)
+        self.assertEqual(version, re.json['version'])
+
+        re = self._get('/v1/proposals/changes', {'since': epoch + '-0'})
+        self.assertEqual(410, re.status_code)
+
+    def test_register_and_unregister_proposal_update_index(self):
+        load_proposal_index(db.engine)
+        public_address = build_static_public_address()
+        payload = {
+            "service_proposal": {
+                "id": 1,
+                "format": "service-proposal/v1",
+                "provider_id": public_address,
+                "service_type": "openvpn",
+            }
+        }
+        auth = build_test_authorization(json.dumps(payload))
+        proposalEndpoints.identity_contract = IdentityContractFake(True)
+        re = self._post(
+            '/v1/register_proposal',
+            payload,
+            headers=auth['headers'])
+        self.assertEqual(200, re.status_code)
+
+        re = self._get('/v1/proposals')
+        self.assertEqual(1, len(re.json['proposals']))
+
+        payload = {"provider_id": public_address}
+        auth = build_test_authorization(json.dumps(payload))
+        re = self._post(
+            '/v1/unregister_proposal',
+            payload,
+            headers=auth['headers'])
+        self.assertEqual(200, re.status_code)
+
+        re = self._get('/v1/proposals')
+        self.assertEqual([], re.json['proposals'])
+
     def test_ping_proposal_with_service_type(self):
         start_node_availability_worker(db.engine, node_availability_queue)
 
@@ -804,14 +987,43 @@ class TestProposals(TestCase):
         # Sleep for some time to wait for inserted availabilities.
         time.sleep(3)
 
-        # Detach current session so NodeAvailability model can pick new changes inserted from another session.
+        # Detach current session so NodeAvailabilityHourly model can pick new changes inserted from another session.
         db.session.remove()
-        pings = NodeAvailability.query.filter(
-            getattr(NodeAvailability, 'service_type') == payload['service_type']
+        pings = NodeAvailabilityHourly.query.filter(
+            getattr(NodeAvailabilityHourly, 'service_type') == payload['service_type']
         ).all()
 
         self.assertEqual({}, re.json)
         self.assertEqual(pings[0].service_type, "dummy_service")
+        self.assertEqual(
+            node_availability_batch_size,
+            sum(p.pings for p in pings)
+        )
+
+    def test_ping_proposal_buffers_heartbeat(self):
+        payload = {'service_type': 'openvpn'}
+        auth = build_test_authorization(json.dumps(payload))
+        node_key = auth['public_address']
+        self._create_node(node_key, 'openvpn')
+        node_heartbeats.started = True
+        self.addCleanup(setattr, node_heartbeats, 'started', False)
+        self.addCleanup(node_heartbeats.drain)
+
+        re = self._post('/v1/ping_proposal', payload, headers=auth['headers'])
+        self.assertEqual(200, re.status_code)
+
+        self.assertIsNone(Node.query.get([node_key, 'openvpn']).updated_at)
+        self.assertTrue(proposal_index.contains(node_key, 'openvpn'))
+        self.assertEqual(1, len(proposal_index.find(node_key=node_key)))
+
+        payload = {'provider_id': node_key}
+        auth = build_test_authorization(json.dumps(payload))
+        re = self._post(
+            '/v1/unregister_proposal',
+            payload,
+            headers=auth['headers'])
+        self.assertEqual(200, re.status_code)
+        self.assertEqual({}, node_heartbeats.drain())
 
     def test_ping_proposal_no_node_with_service_type(self):
         payload = {'service_type': 'dummy'}
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from api.retention_worker import RetentionPolicy, delete_expired_rows
+from models import db, NodeAvailabilityHourly, Session
+from tests.test_case import TestCase
+
+
+class TestDeleteExpiredRows(TestCase):
+    def test_expired_rows_are_deleted_in_chunks(self):
+        cutoff = datetime(2020, 5, 1, 10)
+        for hours in range(-5, 2):
+            db.session.add(NodeAvailabilityHourly(
+                'node1', 'openvpn', cutoff + timedelta(hours=hours), 20
+            ))
+        db.session.commit()
+
+        deleted = delete_expired_rows(
+            db.session,
+            RetentionPolicy('node_availability_hourly', 'hour', 1, None),
+            cutoff,
+            chunk_size=2
+        )
+        db.session.remove()
+
+        self.assertEqual(5, deleted)
+        self.assertEqual(
+            [cutoff, cutoff + timedelta(hours=1)],
+            [
+                a.hour for a in NodeAvailabilityHourly.query.order_by(
+                    NodeAvailabilityHourly.hour
+                )
+            ]
+        )
+
+    def test_sessions_without_client_stats_expire_by_creation(self):
+        cutoff = datetime(2020, 5, 1, 10)
+        for key, created_at, client_updated_at in [
+            ('old', cutoff - timedelta(days=2), cutoff - timedelta(days=1)),
+            ('old-unused', cutoff - timedelta(days=1), None),
+            ('recent', cutoff - timedelta(days=1), cutoff),
+            ('recent-unused', cutoff, None),
+        ]:
+            session = Session(key, 'openvpn')
+            session.created_at = created_at
+            session.client_updated_at = client_updated_at
+            db.session.add(session)
+        db.session.commit()
+
+        deleted = delete_expired_rows(
+            db.session,
+            RetentionPolicy('session', 'client_updated_at', 1, 'created_at'),
+            cutoff,
+            chunk_size=10
+        )
+        db.session.remove()
+
+        self.assertEqual(2, deleted)
+        self.assertEqual(
+            ['recent', 'recent-unused'],
+            sorted(s.session_key for s in Session.query.all())
+        )
@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import TestCase
+
+from rpc_provider import PooledHTTPProvider
+
+
+class StubRPCServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, result=lambda request: '0x1'):
+        super().__init__(('127.0.0.1', 0), StubRPCHandler)
+        self.delay = delay
+        self.result = result
+        self.requests = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class StubRPCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+        request = json.loads(
+            self.rfile.read(int(self.headers['Content-Length']))
+        )
+        server.requests.append(request)
+        time.sleep(server.delay)
+        if isinstance(request, list):
+            response = [self._response(r) for r in request]
+        else:
+            response = self._response(request)
+        body = json.dumps(response).encode()
+
+        with server.lock:
+            server.in_flight -= 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _response(self, request):
+        return {
+            'jsonrpc': '2.0',
+            'id': request['id'],
+            'result': self.server.result(request),
+        }
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPooledHTTPProvider(TestCase):
+    def test_connection_is_reused(self):
+        server = self._start_server()
+        provider = PooledHTTPProvider(server.url(), max_connections=2)
+        self.addCleanup(provider.close)
+
+        for _ in range(5):
+            response = provider.make_request('eth_blockNumber', [])
+            self.assertEqual('0x1', response['result'])
+
+        self.assertEqual(1, len(server.connections))
+
+    def test_concurrency_is_bounded(self):
+        server = self._start_server(delay=0.05)
+        provider = PooledHTTPProvider(server.url(), max_connections=2)
+        self.addCleanup(provider.close)
+
+        threads = [
+            threading.Thread(
+                target=provider.make_request,
+                args=('eth_call', [])
+            )
+            for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, server.max_in_flight)
+        self.assertLessEqual(len(server.connections), 2)
+
+    def test_latency_is_recorded(self):
+        server = self._start_server()
+        provider = PooledHTTPProvider(server.url())
+        self.addCleanup(provider.close)
+
+        provider.make_request('eth_call', [])
+        provider.make_request('eth_call', [])
+
+        stats = provider.latency_stats.stats()['eth_call']
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(0, stats['errors'])
+        self.assertGreater(stats['max_seconds'], 0)
+
+    def test_timeout_is_recorded_as_error(self):
+        server = self._start_server(delay=0.5)
+        provider = PooledHTTPProvider(server.url(), timeout=0.05)
+        self.addCleanup(provider.close)
+
+        with self.assertRaises(Exception):
+            provider.make_request('eth_call', [])
+        self.assertEqual(
+            1,
+            provider.latency_stats.stats()['eth_call']['errors']
+        )
+
+    def _start_server(self, delay=0.0):
+        return start_stub_server(self, delay)
+
+
+def start_stub_server(test_case, delay=0.0, result=lambda request: '0x1'):
+    server = StubRPCServer(delay, result)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server
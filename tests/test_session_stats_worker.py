@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime, timedelta
+from unittest import TestCase as UnitTestCase
+
+from api.session_stats_worker import (
+    SessionStatsPipeline,
+    process_session_stats,
+    upsert_session_stats
+)
+from models import db, Session, SessionTotals, SESSION_TOTALS_ID
+from tests.test_case import TestCase
+
+
+class TestSessionStatsPipeline(UnitTestCase):
+    def test_state_is_cached_once_committed(self):
+        pipeline = SessionStatsPipeline(state_cache_size=10, queue_size=10)
+        now = datetime.utcnow()
+        first = _stats('session1', 10, now)
+        second = _stats('session1', 20, now)
+        self.assertTrue(pipeline.put(first))
+        self.assertTrue(pipeline.put(second))
+        self.assertEqual(20, pipeline.state('session1').client_bytes_sent)
+
+        pipeline.committed([first])
+        self.assertEqual(20, pipeline.state('session1').client_bytes_sent)
+        pipeline.committed([second])
+        self.assertEqual(20, pipeline.state('session1').client_bytes_sent)
+
+        third = _stats('session1', 30, now)
+        pipeline.put(third)
+        pipeline.failed([third])
+        self.assertEqual(20, pipeline.state('session1').client_bytes_sent)
+
+    def test_failed_stats_are_not_cached(self):
+        pipeline = SessionStatsPipeline(state_cache_size=10, queue_size=10)
+        stats = _stats('session1', 10, datetime.utcnow())
+        pipeline.put(stats)
+
+        pipeline.failed([stats])
+        self.assertIsNone(pipeline.state('session1'))
+
+    def test_full_queue_refuses_stats(self):
+        pipeline = SessionStatsPipeline(state_cache_size=10, queue_size=1)
+        now = datetime.utcnow()
+        self.assertTrue(pipeline.put(_stats('session1', 10, now)))
+        self.assertFalse(pipeline.put(_stats('session2', 10, now)))
+        self.assertIsNone(pipeline.state('session2'))
+
+
+class TestUpsertSessionStats(TestCase):
+    def test_batch_inserts_and_updates_sessions(self):
+        created_at = datetime.utcnow().replace(microsecond=0)
+        session = Session('existing', 'openvpn')
+        session.consumer_id = '0x1'
+        session.created_at = created_at - timedelta(minutes=5)
+        db.session.add(session)
+        db.session.commit()
+
+        upsert_session_stats(db.session, [
+            _stats('existing', 10, created_at),
+            _stats('new', 20, created_at),
+            _stats('existing', 30, created_at),
+        ])
+        db.session.remove()
+
+        existing = Session.query.get('existing')
+        self.assertEqual(30, existing.client_bytes_sent)
+        self.assertEqual(60, existing.client_bytes_received)
+        self.assertEqual(created_at, existing.client_updated_at)
+        self.assertEqual(
+            created_at - timedelta(minutes=5),
+            existing.created_at
+        )
+        self.assertEqual('0x1', existing.consumer_id)
+
+        new = Session.query.get('new')
+        self.assertEqual(20, new.client_bytes_sent)
+        self.assertEqual('0x2', new.consumer_id)
+        self.assertEqual('8.8.8.X', new.client_ip)
+        self.assertEqual(created_at, new.created_at)
+
+        totals = SessionTotals.query.get(SESSION_TOTALS_ID)
+        self.assertEqual(1, totals.sessions)
+        self.assertEqual(2, totals.timed_sessions)
+        self.assertEqual(5 * 60, totals.duration_seconds)
+        self.assertEqual(50, totals.client_bytes_sent)
+        self.assertEqual(100, totals.client_bytes_received)
+
+    def test_stop_drains_queue(self):
+        pipeline = SessionStatsPipeline(state_cache_size=10, queue_size=100)
+        now = datetime.utcnow().replace(microsecond=0)
+        for i in range(50):
+            pipeline.put(_stats('session{}'.format(i), 10, now))
+        stop = threading.Event()
+        stopped = threading.Event()
+        stop.set()
+
+        process_session_stats(
+            db.engine,
+            pipeline,
+            batch_size=20,
+            flush_interval=60,
+            stop=stop,
+            stopped=stopped
+        )
+
+        self.assertTrue(stopped.is_set())
+        self.assertTrue(pipeline.queue.empty())
+        self.assertEqual(10, pipeline.state('session49').client_bytes_sent)
+        db.session.remove()
+        self.assertEqual(50, Session.query.count())
+
+
+def _stats(session_key, bytes_sent, now):
+    return {
+        'session_key': session_key,
+        'service_type': 'openvpn',
+        'created_at': now,
+        'established': False,
+        'node_bytes_sent': 0,
+        'node_bytes_received': 0,
+        'consumer_id': '0x2',
+        'node_key': '0x3',
+        'client_ip': '8.8.8.X',
+        'client_country': '',
+        'client_bytes_sent': bytes_sent,
+        'client_bytes_received': bytes_sent * 2,
+        'client_updated_at': now,
+    }
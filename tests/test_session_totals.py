@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from api.session_stats_worker import SessionState
+from api.session_totals import session_totals_change
+
+created_at = datetime(2020, 5, 10, 12, 0)
+minute = timedelta(minutes=1)
+
+
+class TestSessionTotalsChange(TestCase):
+    def test_new_session_is_counted(self):
+        self.assertEqual({
+            'sessions': 1,
+            'timed_sessions': 1,
+            'duration_seconds': 60,
+            'client_bytes_sent': 10,
+            'client_bytes_received': 20,
+        }, session_totals_change(None, created_at, created_at + minute, 10, 20))
+
+    def test_updated_session_adds_difference(self):
+        previous = SessionState('0x1', created_at, created_at + minute, 10, 20)
+        self.assertEqual({
+            'sessions': 0,
+            'timed_sessions': 0,
+            'duration_seconds': 120,
+            'client_bytes_sent': 5,
+            'client_bytes_received': 0,
+        }, session_totals_change(
+            previous, created_at, created_at + 3 * minute, 15, 20
+        ))
+
+    def test_first_stats_of_stored_session_give_it_a_duration(self):
+        previous = SessionState('0x1', created_at)
+        change = session_totals_change(
+            previous, created_at, created_at + minute, 0, 0
+        )
+        self.assertEqual(0, change['sessions'])
+        self.assertEqual(1, change['timed_sessions'])
+        self.assertEqual(60, change['duration_seconds'])
@@ -1,6 +1,7 @@
 import json
 from datetime import datetime, timedelta
-from models import db, Session
+from api.session_stats_worker import session_stats_pipeline
+from models import db, Session, SessionTotals, SESSION_TOTALS_ID
 from tests.test_case import TestCase
 from tests.utils import (
     build_test_authorization,
@@ -37,6 +38,25 @@ class TestSessions(TestCase):
         self.assertEqual('0x1', session.node_key)
         self.assertEqual('openvpn', session.service_type)
 
+    def test_session_stats_update_session_totals(self):
+        payload = {
+            'bytes_sent': 20,
+            'bytes_received': 40,
+            'provider_id': '0x1',
+        }
+        auth = build_test_authorization(json.dumps(payload))
+        self._post('/v1/sessions/123/stats', payload, headers=auth['headers'])
+
+        payload['bytes_sent'] = 30
+        auth = build_test_authorization(json.dumps(payload))
+        self._post('/v1/sessions/123/stats', payload, headers=auth['headers'])
+
+        totals = SessionTotals.query.get(SESSION_TOTALS_ID)
+        self.assertEqual(1, totals.sessions)
+        self.assertEqual(1, totals.timed_sessions)
+        self.assertEqual(30, totals.client_bytes_sent)
+        self.assertEqual(40, totals.client_bytes_received)
+
     def test_session_stats_create_with_type(self):
         payload = {
             'bytes_sent': 20,
@@ -383,3 +403,38 @@ class TestSessions(TestCase):
             )
             self.assertEqual(429, re.status_code)
             self.assertEqual({'error': 'too many requests'}, re.json)
+
+    def test_session_stats_are_queued_when_worker_runs(self):
+        session_stats_pipeline.started = True
+        self.addCleanup(setattr, session_stats_pipeline, 'started', False)
+        self.addCleanup(session_stats_pipeline.clear)
+
+        payload = {
+            'bytes_sent': 20,
+            'bytes_received': 40,
+            'provider_id': '0x1',
+        }
+        auth = build_test_authorization(json.dumps(payload))
+        re = self._post(
+            '/v1/sessions/123/stats',
+            payload,
+            headers=auth['headers'],
+        )
+        self.assertEqual(200, re.status_code)
+        self.assertIsNone(Session.query.get('123'))
+
+        stats = session_stats_pipeline.queue.get_nowait()
+        self.assertEqual('123', stats['session_key'])
+        self.assertEqual(20, stats['client_bytes_sent'])
+        self.assertEqual(auth['public_address'], stats['consumer_id'])
+
+        # validated against the queued state, not the db
+        payload['bytes_sent'] = round((1000000000 / 8 * 60) * 5)
+        auth = build_test_authorization(json.dumps(payload))
+        re = self._post(
+            '/v1/sessions/123/stats',
+            payload,
+            headers=auth['headers'],
+        )
+        self.assertEqual(418, re.status_code)
+        self.assertTrue(session_stats_pipeline.queue.empty())
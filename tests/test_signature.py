@@ -0,0 +1,93 @@
+from concurrent.futures.process import BrokenProcessPool
+from unittest import TestCase
+
+from signature import (
+    RecoveryCache,
+    RecoveryPool,
+    ValidationError,
+    recover_public_address,
+    recover_public_address_cached,
+)
+from tests.utils import sign_message_with_static_key
+
+
+class TestRecoveryCache(TestCase):
+    def test_recover_public_address_cached(self):
+        cache = RecoveryCache(10)
+        signature = sign_message_with_static_key('message')
+
+        address = recover_public_address_cached(cache, b'message', signature)
+        self.assertEqual(
+            recover_public_address(b'message', signature),
+            address
+        )
+        self.assertEqual(
+            address,
+            recover_public_address_cached(cache, b'message', signature)
+        )
+        self.assertEqual(
+            {'size': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5},
+            cache.stats()
+        )
+
+    def test_different_message_is_not_served_from_cache(self):
+        cache = RecoveryCache(10)
+        signature = sign_message_with_static_key('message')
+
+        first = recover_public_address_cached(cache, b'message', signature)
+        second = recover_public_address_cached(cache, b'other', signature)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(0, cache.hits)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = RecoveryCache(2)
+        cache.put(b'a', 'address a')
+        cache.put(b'b', 'address b')
+        cache.get(b'a')
+        cache.put(b'c', 'address c')
+
+        self.assertEqual('address a', cache.get(b'a'))
+        self.assertIsNone(cache.get(b'b'))
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = RecoveryCache(0)
+        cache.put(b'a', 'address a')
+        self.assertIsNone(cache.get(b'a'))
+
+
+class TestRecoveryPool(TestCase):
+    def test_recover_in_worker_processes(self):
+        pool = RecoveryPool(2, batch_size=4, batch_window=0.01)
+        self.addCleanup(pool.shutdown)
+        signature = sign_message_with_static_key('message')
+
+        self.assertEqual(
+            recover_public_address(b'message', signature),
+            pool.recover(b'message', signature, timeout=10)
+        )
+
+    def test_recover_raises_validation_error(self):
+        pool = RecoveryPool(1)
+        self.addCleanup(pool.shutdown)
+        signature = sign_message_with_static_key('message')
+
+        with self.assertRaises(ValidationError):
+            pool.recover(b'message', signature + b'1', timeout=10)
+
+    def test_restart_replaces_broken_workers(self):
+        pool = RecoveryPool(1)
+        self.addCleanup(pool.shutdown)
+        signature = sign_message_with_static_key('message')
+        pool.recover(b'message', signature, timeout=10)
+
+        for process in list(pool._executor._processes.values()):
+            process.kill()
+        with self.assertRaises(BrokenProcessPool):
+            pool.recover(b'message', signature, timeout=10)
+
+        pool.restart()
+        self.assertEqual(
+            recover_public_address(b'message', signature),
+            pool.recover(b'message', signature, timeout=10)
+        )
@@ -1,6 +1,9 @@
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy import text
 
+from api.leaderboard_response_cache import leaderboard_response_cache
+from api.statistics import format_session_cursor, parse_session_cursor
 from tests.test_case import TestCase
 from models import db, Session
 
@@ -44,6 +47,65 @@ class TestStatistics(TestCase):
 
         self.assertEqual({'error': 'Too many sessions requested'}, re.json)
 
+    def test_sessions_returns_pages(self):
+        created_at = datetime(2020, 5, 10, 12, 0)
+        self._create_session('s1', created_at - timedelta(minutes=1))
+        self._create_session('s2', created_at)
+        self._create_session('s3', created_at)
+
+        re = self._get('/v1/statistics/sessions', {'limit': 2})
+        self.assertEqual(
+            ['s3', 's2'],
+            [s['session_key'] for s in re.json['sessions']]
+        )
+
+        re = self._get('/v1/statistics/sessions', {
+            'limit': 2,
+            'cursor': re.json['next_cursor'],
+        })
+        self.assertEqual(
+            ['s1'],
+            [s['session_key'] for s in re.json['sessions']]
+        )
+        self.assertIsNone(re.json['next_cursor'])
+
+    def test_sessions_are_filtered(self):
+        self._create_session('s1', country='DE')
+        self._create_session('s2', country='LT')
+
+        re = self._get('/v1/statistics/sessions', {'country': 'LT'})
+        self.assertEqual(
+            ['s2'],
+            [s['session_key'] for s in re.json['sessions']]
+        )
+
+        re = self._get('/v1/statistics/sessions', {'service_type': 'dummy'})
+        self.assertEqual([], re.json['sessions'])
+
+    def test_sessions_returns_error_for_invalid_cursor(self):
+        re = self._get('/v1/statistics/sessions', {'cursor': 'x'})
+        self.assertEqual(400, re.status_code)
+        self.assertEqual({'error': 'Invalid cursor'}, re.json)
+
+        re = self._get(
+            '/v1/statistics/sessions',
+            {'cursor': '9' * 30 + ':s1'}
+        )
+        self.assertEqual(400, re.status_code)
+        self.assertEqual({'error': 'Invalid cursor'}, re.json)
+
+    def test_session_cursor_round_trips(self):
+        session = Session('s1', 'openvpn')
+        session.created_at = datetime(2020, 5, 10, 12, 0, 1, 5)
+        self.assertEqual(
+            (session.created_at, 's1'),
+            parse_session_cursor(format_session_cursor(session))
+        )
+
+    def test_session_cursor_out_of_range(self):
+        with self.assertRaises(OverflowError):
+            parse_session_cursor('9' * 30 + ':s1')
+
     def test_session_returns_session(self):
         self._create_session('test-session')
 
@@ -58,7 +120,84 @@ class TestStatistics(TestCase):
         self.assertEqual(404, re.status_code)
         self.assertEqual({'error': 'Session not found'}, re.json)
 
-    def _create_session(self, key):
+    def test_leaderboard_returns_pages(self):
+        self._clear_leaderboard()
+        try:
+            self._create_leaderboard_row('0x1', 10)
+            self._create_leaderboard_row('0x2', 20)
+            self._create_leaderboard_row('0x3', 10)
+
+            re = self._get('/v1/statistics/leaderboard', {'limit': 2})
+            self.assertEqual(200, re.status_code)
+            self.assertEqual('hours_available', re.json['ranking'])
+            self.assertEqual(
+                ['0x2', '0x1'],
+                [row[0] for row in re.json['rows']]
+            )
+            self.assertEqual('10:0x1', re.json['next_cursor'])
+
+            re = self._get('/v1/statistics/leaderboard', {
+                'limit': 2,
+                'cursor': re.json['next_cursor'],
+            })
+            self.assertEqual(
+                [['0x3', 'openvpn', 'DE', 10, 1, 2, 3, None]],
+                re.json['rows']
+            )
+            self.assertIsNone(re.json['next_cursor'])
+        finally:
+            self._clear_leaderboard()
+
+    def test_leaderboard_returns_not_modified_for_matching_etag(self):
+        self._clear_leaderboard()
+        try:
+            self._create_leaderboard_row('0x1', 10)
+
+            re = self._get('/v1/statistics/leaderboard')
+            etag = re.headers.get('Etag')
+            self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+            re = self._get(
+                '/v1/statistics/leaderboard',
+                headers={'If-None-Match': etag}
+            )
+            self.assertEqual(304, re.status_code)
+
+            re = self._get(
+                '/v1/statistics/leaderboard',
+                headers={'If-None-Match': '"other"'}
+            )
+            self.assertEqual(200, re.status_code)
+        finally:
+            self._clear_leaderboard()
+
+    def test_leaderboard_returns_error_for_invalid_cursor(self):
+        re = self._get('/v1/statistics/leaderboard', {'cursor': 'x'})
+        self.assertEqual(400, re.status_code)
+        self.assertEqual({'error': 'Invalid cursor'}, re.json)
+
+    def test_leaderboard_returns_error_for_unknown_leaderboard(self):
+        re = self._get('/v1/statistics/leaderboard', {'leaderboard': 'x'})
+        self.assertEqual(404, re.status_code)
+
+    def _create_leaderboard_row(self, provider_id, hours_available):
+        db.session.execute(text("""
+            INSERT INTO dwh_leaderboard(leaderboard, provider_id, service_type,
+                country, hours_available, unique_users, sessions, data_transferred)
+            VALUES ('monthly', :provider_id, 'openvpn', 'DE', :hours, 1, 2, 3)
+            """), {'provider_id': provider_id, 'hours': hours_available})
+        db.session.commit()
+
+    @staticmethod
+    def _clear_leaderboard():
+        db.session.execute(text('DELETE FROM dwh_leaderboard'))
+        db.session.commit()
+        leaderboard_response_cache.clear()
+
+    def _create_session(self, key, created_at=None, country=None):
         session = Session(key, 'openvpn')
+        if created_at is not None:
+            session.created_at = created_at
+        session.client_country = country
         session.client_updated_at = datetime.utcnow()
         db.session.add(session)
@@ -48,3 +48,11 @@ class setting():
 
     def __exit__(self, type, value, traceback):
         setattr(settings, self.key, self.initial_value)
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now